@@ -0,0 +1,194 @@
+import os
+import re
+import math
+
+import numpy as np
+import osmnx as ox
+import shapely
+
+from geocoding import normalize_address
+from graph_store import DEFAULT_STORE_DIR, write_npz, read_npz
+from snapping import local_xy
+
+INDEX_VERSION = 2
+DEFAULT_INDEX_DIR = os.path.join(DEFAULT_STORE_DIR, 'addresses')
+# Features do OSM baixadas para o índice: qualquer elemento com rua ou número de casa. As com
+# addr:street (mesmo sem número) entram na busca por rua; as com número, também na busca exata
+ADDRESS_TAGS = {'addr:street': True, 'addr:housenumber': True}
+# Lado da célula da grade espacial usada na busca reversa
+CELL_SIZE_M = 100.0
+# códigos de shapely.get_type_id
+_GEOM_TYPES = {0: 'Point', 1: 'LineString', 2: 'LinearRing', 3: 'Polygon', 4: 'MultiPoint',
+               5: 'MultiLineString', 6: 'MultiPolygon', 7: 'GeometryCollection'}
+
+
+def normalize_housenumber(housenumber):
+  """'89 A' -> '89a'; números de casa são comparados sem espaços nem caixa."""
+  return ''.join(str(housenumber).split()).casefold()
+
+
+def _slug(place):
+  return re.sub(r'[^0-9a-z]+', '_', normalize_address(place)).strip('_')
+
+
+class AddressIndex:
+  """Endereços (addr:street + addr:housenumber) de um lugar, com índice hash e grade espacial.
+
+  A busca direta é um acesso a dict por (rua, número) normalizados; a reversa procura o ponto
+  mais próximo nas células de uma grade em metros (projeção equirretangular local).
+  """
+
+  def __init__(self, streets, housenumbers, lat, lon, geom_types, place=None):
+    self.streets = list(streets)
+    self.housenumbers = list(housenumbers)
+    self.lat = np.asarray(lat, dtype=np.float64)
+    self.lon = np.asarray(lon, dtype=np.float64)
+    self.geom_types = list(geom_types)
+    self.place = place
+
+    self._by_address = {}
+    self._by_street = {}
+    for i, (street, number) in enumerate(zip(self.streets, self.housenumbers)):
+      if not street:
+        continue
+      s = normalize_address(street)
+      self._by_street.setdefault(s, []).append(i)
+      if number:
+        self._by_address.setdefault((s, normalize_housenumber(number)), []).append(i)
+
+    self._lat0 = float(np.mean(self.lat)) if len(self.lat) else 0.0
+    self._xy = self._project(self.lat, self.lon)
+    self._build_grid()
+
+  @property
+  def n_addresses(self):
+    return len(self.lat)
+
+  def _project(self, lat, lon):
+    return local_xy(lat, lon, self._lat0)
+
+  def _build_grid(self):
+    # pontos ordenados por célula; cada célula aponta para a sua fatia em _order
+    cells = np.floor(self._xy / CELL_SIZE_M).astype(np.int64)
+    self._order = np.lexsort((cells[:, 1], cells[:, 0]))
+    sorted_cells = cells[self._order]
+    self._grid = {}
+    if len(sorted_cells):
+      change = np.flatnonzero(np.any(np.diff(sorted_cells, axis=0) != 0, axis=1)) + 1
+      starts = np.concatenate(([0], change))
+      ends = np.concatenate((change, [len(sorted_cells)]))
+      for (cx, cy), a, b in zip(sorted_cells[starts].tolist(), starts.tolist(), ends.tolist()):
+        self._grid[(cx, cy)] = (a, b)
+      self._cell_min = sorted_cells.min(axis=0)
+      self._cell_max = sorted_cells.max(axis=0)
+
+  @classmethod
+  def from_features(cls, gdf, place=None):
+    """Índice a partir do GeoDataFrame de ox.features_from_place (sem iterrows)."""
+    if gdf is None or gdf.empty:
+      return cls([], [], [], [], [], place)
+    geoms = np.asarray(gdf.geometry.values)
+    valid = ~shapely.is_missing(geoms)
+    geoms = geoms[valid]
+    # pontos ficam como estão; polígonos/linhas usam o centróide (como o teste.py fazia)
+    centers = shapely.centroid(geoms)
+    lon = shapely.get_x(centers)
+    lat = shapely.get_y(centers)
+
+    def column(name):
+      if name not in gdf.columns:
+        return [None] * len(geoms)
+      return [v if isinstance(v, str) else None for v in gdf[name].values[valid]]
+
+    # só addr:street: um POI sem rua cujo nome pareça o de uma rua não entra na busca por rua
+    return cls(column('addr:street'), column('addr:housenumber'), lat, lon,
+               shapely.get_type_id(geoms).tolist(), place)
+
+  @classmethod
+  def build(cls, place):
+    """Baixa (uma vez, via Overpass) as features com addr:* do lugar e monta o índice."""
+    gdf = ox.features_from_place(place, ADDRESS_TAGS)
+    return cls.from_features(gdf, place)
+
+  def _result(self, i, distance=None):
+    result = {
+      'lat': float(self.lat[i]),
+      'lon': float(self.lon[i]),
+      'housenumber': self.housenumbers[i],
+      'street': self.streets[i],
+      'geom_type': _GEOM_TYPES.get(self.geom_types[i], 'Unknown'),
+    }
+    if distance is not None:
+      result['distance'] = float(distance)
+    return result
+
+  def lookup(self, street, housenumber):
+    """Pontos com exatamente esta rua e número (lista vazia se não houver)."""
+    key = (normalize_address(street), normalize_housenumber(housenumber))
+    return [self._result(i) for i in self._by_address.get(key, [])]
+
+  def by_street(self, street):
+    """Todos os endereços cadastrados na rua."""
+    return [self._result(i) for i in self._by_street.get(normalize_address(street), [])]
+
+  def nearest(self, lat, lon, k=1, max_dist=None):
+    """Busca reversa: até k endereços mais próximos de (lat, lon), com 'distance' em metros."""
+    if not self._grid:
+      return []
+    p = self._project([lat], [lon])[0]
+    cx, cy = np.floor(p / CELL_SIZE_M).astype(np.int64).tolist()
+    # anéis de células em volta do ponto até que o k-ésimo candidato esteja mais perto
+    # que qualquer célula ainda não visitada
+    max_ring = int(max(abs(cx - self._cell_min[0]), abs(cx - self._cell_max[0]),
+                       abs(cy - self._cell_min[1]), abs(cy - self._cell_max[1])))
+    if max_dist is not None:
+      max_ring = min(max_ring, int(math.ceil(max_dist / CELL_SIZE_M)))
+    found = []
+    for ring in range(max_ring + 1):
+      for gx in range(cx - ring, cx + ring + 1):
+        for gy in (range(cy - ring, cy + ring + 1) if gx in (cx - ring, cx + ring) else (cy - ring, cy + ring)):
+          span = self._grid.get((gx, gy))
+          if span is not None:
+            found.append(self._order[span[0]:span[1]])
+      if found:
+        idx = np.concatenate(found)
+        d = np.hypot(*(self._xy[idx] - p).T)
+        if len(idx) >= k and np.partition(d, k - 1)[k - 1] <= ring * CELL_SIZE_M:
+          break
+    if not found:
+      return []
+    idx = np.concatenate(found)
+    d = np.hypot(*(self._xy[idx] - p).T)
+    best = np.argsort(d, kind='stable')[:k]
+    return [self._result(i, dist) for i, dist in zip(idx[best].tolist(), d[best].tolist())
+            if max_dist is None or dist <= max_dist]
+
+  def save(self, path):
+    header = {
+      'version': INDEX_VERSION, 'place': self.place,
+      'streets': self.streets, 'housenumbers': self.housenumbers,
+    }
+    write_npz(path, {'lat': self.lat, 'lon': self.lon,
+                     'geom_types': np.asarray(self.geom_types, dtype=np.int8)}, header)
+
+  @classmethod
+  def load(cls, path):
+    """Índice salvo em `path` (ou None se não existir ou for de outra versão)."""
+    if not os.path.exists(path):
+      return None
+    arrays, header = read_npz(path)
+    if header.get('version') != INDEX_VERSION:
+      return None
+    return cls(header['streets'], header['housenumbers'], arrays['lat'], arrays['lon'],
+               arrays['geom_types'].tolist(), header.get('place'))
+
+
+def address_index_for(place, directory=DEFAULT_INDEX_DIR):
+  """Índice de endereços do lugar: lido do disco se já existir, senão baixado uma vez e salvo."""
+  path = os.path.join(directory, f"{_slug(place)}.npz")
+  index = AddressIndex.load(path)
+  if index is None:
+    index = AddressIndex.build(place)
+    os.makedirs(directory, exist_ok=True)
+    index.save(path)
+  return index
@@ -0,0 +1,115 @@
+import math
+
+import numpy as np
+
+from edge_geometry import route_edges
+
+# Velocidade usada quando a rota não tem travel_time (40 km/h)
+DEFAULT_SPEED_MPS = 40 / 3.6
+# Distância à frente usada para orientar o veículo (suaviza as curvas curtas da geometria)
+HEADING_LOOKAHEAD_M = 75.0
+
+
+class RouteAnimation:
+  """Posição e orientação do veículo em qualquer instante, sem densificar a rota.
+
+  Guarda só os vértices da rota e dois arrays acumulados: distância (m) e tempo de viagem (s)
+  até cada vértice. Para um instante t a busca binária em cum_time acha o trecho e a posição é
+  interpolada nele; memória O(vértices) e velocidade independente do FPS. speed é o fator de
+  reprodução (1.0 = tempo real pelo travel_time).
+  """
+
+  def __init__(self, points, cum_time=None, speed=1.0, lookahead=HEADING_LOOKAHEAD_M):
+    self.points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    seg = np.hypot(*np.diff(self.points, axis=0).T)
+    self.cum_dist = np.concatenate(([0.0], np.cumsum(seg)))
+    if cum_time is None:
+      cum_time = self.cum_dist / DEFAULT_SPEED_MPS
+    self.cum_time = np.asarray(cum_time, dtype=np.float64)
+    self.speed = float(speed)
+    self.lookahead = float(lookahead)
+    # distância acumulada em cada nó da rota (preenchida por from_route)
+    self.node_dist = None
+
+  @classmethod
+  def from_route(cls, G, path, speed=1.0, lookahead=HEADING_LOOKAHEAD_M):
+    """Animação da rota em G (projetado), com o travel_time de cada aresta distribuído pela sua geometria."""
+    points = []
+    times = []
+    node_vertex = [0]
+    t0 = 0.0
+    for coords, data in route_edges(G, path):
+      c = np.asarray(coords, dtype=np.float64)
+      seg = np.hypot(*np.diff(c, axis=0).T)
+      total = seg.sum()
+      edge_time = data.get('travel_time')
+      if edge_time is None:
+        edge_time = data.get('length', total) / DEFAULT_SPEED_MPS
+      frac = np.cumsum(seg) / total if total > 0 else np.ones(len(seg))
+      if not points:
+        points.append(c[0])
+        times.append(t0)
+      points.extend(c[1:])
+      times.extend(t0 + frac * edge_time)
+      t0 += edge_time
+      node_vertex.append(len(points) - 1)
+    if not points:
+      n = path[0]
+      points, times = [(G.nodes[n]['x'], G.nodes[n]['y'])], [0.0]
+    anim = cls(points, times, speed, lookahead)
+    anim.node_dist = anim.cum_dist[node_vertex]
+    return anim
+
+  @property
+  def length(self):
+    return float(self.cum_dist[-1])
+
+  @property
+  def duration(self):
+    """Duração da reprodução em segundos de relógio (travel_time / speed)."""
+    return float(self.cum_time[-1]) / self.speed
+
+  def finished(self, t):
+    return t >= self.duration
+
+  def distance_at(self, t):
+    """Metros percorridos no instante t (segundos de reprodução)."""
+    if len(self.points) < 2:
+      return 0.0
+    sim = min(max(t * self.speed, 0.0), self.cum_time[-1])
+    i = int(np.searchsorted(self.cum_time, sim, side='right')) - 1
+    i = min(i, len(self.cum_time) - 2)
+    dt = self.cum_time[i + 1] - self.cum_time[i]
+    f = (sim - self.cum_time[i]) / dt if dt > 0 else 1.0
+    return float(self.cum_dist[i] + f * (self.cum_dist[i + 1] - self.cum_dist[i]))
+
+  def point_at_distance(self, s):
+    if len(self.points) < 2:
+      return float(self.points[0][0]), float(self.points[0][1])
+    s = min(max(s, 0.0), self.cum_dist[-1])
+    i = int(np.searchsorted(self.cum_dist, s, side='right')) - 1
+    i = min(i, len(self.cum_dist) - 2)
+    d = self.cum_dist[i + 1] - self.cum_dist[i]
+    f = (s - self.cum_dist[i]) / d if d > 0 else 0.0
+    x = self.points[i][0] + f * (self.points[i + 1][0] - self.points[i][0])
+    y = self.points[i][1] + f * (self.points[i + 1][1] - self.points[i][1])
+    return float(x), float(y)
+
+  def heading_at_distance(self, s):
+    """Ângulo (radianos, CRS projetado) de s até s + lookahead; None se a rota não tem extensão."""
+    x1, y1 = self.point_at_distance(min(s, self.length - 1e-6))
+    x2, y2 = self.point_at_distance(s + self.lookahead)
+    if abs(x2 - x1) < 1e-6 and abs(y2 - y1) < 1e-6:
+      return None
+    return math.atan2(y2 - y1, x2 - x1)
+
+  def next_node_index(self, s):
+    """Índice (no path de from_route) do primeiro nó da rota em s metros ou à frente."""
+    i = int(np.searchsorted(self.node_dist, s - 1e-6, side='left'))
+    return min(i, len(self.node_dist) - 1)
+
+  def state(self, t):
+    """(x, y, heading, metros percorridos) no instante t."""
+    s = self.distance_at(t)
+    x, y = self.point_at_distance(s)
+    return x, y, self.heading_at_distance(s), s
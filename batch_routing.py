@@ -0,0 +1,208 @@
+import os
+import csv
+import sys
+import json
+import argparse
+
+import osmnx as ox
+import networkx as nx
+
+from compiled_graph import astar_path
+from heuristics import compiled_for, great_circle_heuristic
+from parallel_routing import ParallelRouter
+from snapping import SnapIndex, snap_index_for
+from geocoding import GeocodingService
+from web_export import RouteCollection
+from route_metrics import metrics_for
+from instrumentation import enable, span, count
+from graph_store import GraphStore, get_graph, od_region, region_bbox, enclosing_region, RADIUS_MAX
+
+ox.settings.use_cache = True
+ox.settings.log_console = False
+
+# Maior "raio" aceito ao juntar pares numa mesma região (um grafo por grupo)
+GROUP_MAX_DIST = 2 * RADIUS_MAX
+
+
+def read_pairs(path):
+  """Lê pares O-D de um CSV ou JSONL.
+
+  Cada linha precisa de `id` (opcional) e de orig_lat/orig_lon/dest_lat/dest_lon
+  ou de orig_address/dest_address (geocodificados via geocoding.GeocodingService).
+  """
+  if path.endswith('.jsonl'):
+    with open(path, 'r', encoding='utf-8') as f:
+      rows = [json.loads(ln) for ln in f if ln.strip()]
+  else:
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+      rows = list(csv.DictReader(f))
+  for i, row in enumerate(rows):
+    row.setdefault('id', str(i))
+  return rows
+
+
+def resolve_points(rows, geocoder=None):
+  """Preenche orig_point/dest_point; endereços repetidos são geocodificados uma vez só.
+
+  Os endereços de todas as linhas vão num único lote para o GeocodingService (cache em disco
+  e fila com limite de taxa).
+  """
+  pending = []  # (linha, lado, endereço)
+  for row in rows:
+    for side in ('orig', 'dest'):
+      if row.get(f'{side}_lat') not in (None, '') and row.get(f'{side}_lon') not in (None, ''):
+        row[f'{side}_point'] = (float(row[f'{side}_lat']), float(row[f'{side}_lon']))
+        continue
+      address = row.get(f'{side}_address')
+      row[f'{side}_point'] = None
+      if address:
+        pending.append((row, side, address))
+  if pending:
+    own = geocoder is None
+    geocoder = geocoder or GeocodingService()
+    try:
+      points = geocoder.geocode_many([address for _, _, address in pending])
+    finally:
+      if own:
+        geocoder.close()
+    for (row, side, _), point in zip(pending, points):
+      row[f'{side}_point'] = point
+  return rows
+
+
+def group_by_region(rows, max_dist=GROUP_MAX_DIST):
+  """Agrupa os pares cujas áreas cabem num mesmo quadrado de até `max_dist` de raio."""
+  groups = []  # [bboxes, rows]
+  ordered = sorted(rows, key=lambda r: (r['orig_point'][0] + r['dest_point'][0], r['orig_point'][1] + r['dest_point'][1]))
+  for row in ordered:
+    bbox = region_bbox(*od_region(row['orig_point'], row['dest_point']))
+    for group in groups:
+      _, dist = enclosing_region(group[0] + [bbox])
+      if dist <= max_dist:
+        group[0].append(bbox)
+        group[1].append(row)
+        break
+    else:
+      groups.append([[bbox], [row]])
+  return [(enclosing_region(bboxes), members) for bboxes, members in groups]
+
+
+def _serial_paths(cg, pairs, weight):
+  heuristics = {}
+  for orig_node, dest_node in pairs:
+    if dest_node not in heuristics:
+      heuristics[dest_node] = great_circle_heuristic(cg, dest_node, weight=weight).value_list
+    try:
+      yield astar_path(cg, orig_node, dest_node, weight=weight, heuristic=heuristics[dest_node])
+    except nx.NetworkXNoPath:
+      yield None
+
+
+def solve_group(G, rows, weight='length', processes=1, snap_index=None):
+  """Resolve todos os pares de uma região sobre o mesmo grafo; gera um resultado por par."""
+  cg = compiled_for(G)
+  metrics = metrics_for(G)
+  snap_index = snap_index or SnapIndex.from_graph(G)
+  # snapping de todas as origens/destinos do grupo numa chamada só (na aresta mais próxima)
+  points = [r['orig_point'] for r in rows] + [r['dest_point'] for r in rows]
+  nodes = snap_index.snap_edges(points)['node'].tolist()
+  n = len(rows)
+  pairs = [(int(o), int(d)) for o, d in zip(nodes[:n], nodes[n:])]
+  if processes > 1 and n > 1:
+    with ParallelRouter(cg, processes=processes) as router:
+      paths = router.solve(pairs, weight=weight)
+  else:
+    paths = _serial_paths(cg, pairs, weight)
+  for row, (orig_node, dest_node), path in zip(rows, pairs, paths):
+    result = {'id': row['id'], 'orig_node': orig_node, 'dest_node': dest_node}
+    if path is None:
+      result['error'] = 'no_path'
+    else:
+      result['length_m'], result['travel_time_s'] = metrics.totals(path)
+      result['nodes'] = path
+    yield result
+
+
+class ResultWriter:
+  """Escreve resultados em JSONL ou CSV conforme a extensão, um por linha, à medida que saem."""
+
+  FIELDS = ('id', 'orig_node', 'dest_node', 'length_m', 'travel_time_s', 'nodes', 'error')
+
+  def __init__(self, path=None):
+    self._file = open(path, 'w', encoding='utf-8', newline='') if path else sys.stdout
+    self._csv = None
+    if path and path.endswith('.csv'):
+      self._csv = csv.DictWriter(self._file, fieldnames=self.FIELDS)
+      self._csv.writeheader()
+
+  def write(self, result):
+    if self._csv is not None:
+      row = dict(result)
+      row['nodes'] = ' '.join(str(n) for n in result.get('nodes', []))
+      self._csv.writerow(row)
+    else:
+      self._file.write(json.dumps(result) + '\n')
+
+  def flush(self):
+    self._file.flush()
+
+  def close(self):
+    if self._file is not sys.stdout:
+      self._file.close()
+
+
+def run_batch(input_path, output_path=None, weight='length', network_type='drive', store=None, processes=1,
+              web_output=None):
+  """web_output: se dado, grava também todas as rotas num único .html (Leaflet) ou .geojson."""
+  with span('batch.geocode'):
+    rows = resolve_points(read_pairs(input_path))
+  writer = ResultWriter(output_path)
+  web = RouteCollection() if web_output else None
+  valid = []
+  for row in rows:
+    if row['orig_point'] is None or row['dest_point'] is None:
+      writer.write({'id': row['id'], 'error': 'geocode_failed'})
+    else:
+      valid.append(row)
+  store = store or GraphStore()
+  try:
+    for (center, dist), members in group_by_region(valid):
+      # um grafo por região, reaproveitado por todos os pares do grupo
+      with span('batch.region', pairs=len(members)):
+        G, _ = get_graph(center, dist, network_type=network_type, store=store)
+        snap_index = snap_index_for(G, store, store.find(center, dist, network_type))
+        for result in solve_group(G, members, weight=weight, processes=processes, snap_index=snap_index):
+          count('batch.routes' if 'nodes' in result else 'batch.no_path')
+          writer.write(result)
+          if web is not None and 'nodes' in result:
+            web.add_path(G, result['nodes'], result['id'], length_m=result['length_m'],
+                         travel_time_s=result['travel_time_s'])
+        writer.flush()
+  finally:
+    writer.close()
+  if web is not None:
+    with span('batch.web_export'):
+      web.save(web_output)
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Calcula rotas em lote para pares origem-destino.")
+  parser.add_argument('input', help="CSV ou JSONL com os pares O-D")
+  parser.add_argument('-o', '--output', help="arquivo de saída (.jsonl ou .csv); padrão: stdout")
+  parser.add_argument('--weight', default='length', choices=('length', 'travel_time'))
+  parser.add_argument('--network-type', default='drive')
+  parser.add_argument('--store-dir', default='graph_cache')
+  parser.add_argument('--processes', type=int, default=1, help="processos para resolver as rotas de cada região")
+  parser.add_argument('--web', help="grava também todas as rotas num único mapa .html ou .geojson")
+  parser.add_argument('--trace', help="grava spans/contadores em .json (trace do Chrome) ou .jsonl")
+  args = parser.parse_args()
+  if not os.path.exists(args.input):
+    raise SystemExit(f"Erro: arquivo não encontrado: {args.input}")
+  if args.trace:
+    enable(args.trace)
+  run_batch(args.input, args.output, args.weight, args.network_type, GraphStore(args.store_dir), args.processes,
+            args.web)
+
+
+if __name__ == "__main__":
+  main()
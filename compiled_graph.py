@@ -0,0 +1,228 @@
+import math
+from heapq import heappush, heappop
+from itertools import count
+
+import numpy as np
+import networkx as nx
+
+EARTH_RADIUS_M = 6_371_009
+
+# Pesos compilados por padrão (mínimo entre arestas paralelas, como o networkx faz)
+DEFAULT_WEIGHTS = ('length', 'travel_time')
+
+
+class CompiledGraph:
+  """Grafo do osmnx convertido em arrays contíguos (CSR) para buscas rápidas.
+
+  Por padrão adjacency() copia o CSR para listas Python (indexação mais rápida no laço quente).
+  Com zero_copy=True devolve memoryviews somente leitura dos próprios arrays e, em vez do dict
+  id -> índice, busca binária em node_ids pela ordem id_order (argsort, que pode vir pronto e
+  compartilhado): nada do grafo é duplicado, ao custo de um laço quente um pouco mais lento
+  (usado pelos workers de parallel_routing, cujos arrays estão em memória compartilhada).
+  """
+
+  def __init__(self, node_ids, offsets, targets, weights, lat, lon, x=None, y=None, crs=None, zero_copy=False,
+               id_order=None):
+    self.node_ids = np.asarray(node_ids)
+    self.offsets = np.asarray(offsets, dtype=np.int64)
+    self.targets = np.asarray(targets, dtype=np.int64)
+    self.weights = {k: np.asarray(w, dtype=np.float64) for k, w in weights.items()}
+    self.lat = np.asarray(lat, dtype=np.float64)
+    self.lon = np.asarray(lon, dtype=np.float64)
+    self.x = None if x is None else np.asarray(x, dtype=np.float64)
+    self.y = None if y is None else np.asarray(y, dtype=np.float64)
+    self.crs = crs
+    self.zero_copy = zero_copy
+    self.id_order = None if id_order is None else np.asarray(id_order, dtype=np.int64)
+    self._index = None
+    self._id_list = None
+    self._lists = {}
+
+  @classmethod
+  def from_graph(cls, G, G_proj=None, weights=DEFAULT_WEIGHTS):
+    """Compila um MultiDiGraph (e opcionalmente sua versão projetada) uma única vez."""
+    node_ids = list(G.nodes)
+    index = {n: i for i, n in enumerate(node_ids)}
+    offsets = [0]
+    targets = []
+    cols = {k: [] for k in weights}
+    # segue a ordem de G._adj para reproduzir exatamente a ordem de expansão do nx.astar_path
+    for u in node_ids:
+      for v, keydict in G._adj[u].items():
+        targets.append(index[v])
+        for k in weights:
+          if G.is_multigraph():
+            cols[k].append(min(d.get(k, 1) for d in keydict.values()))
+          else:
+            cols[k].append(keydict.get(k, 1))
+      offsets.append(len(targets))
+
+    lat = [G.nodes[n]['y'] for n in node_ids]
+    lon = [G.nodes[n]['x'] for n in node_ids]
+    x = y = crs = None
+    if G_proj is not None:
+      x = [G_proj.nodes[n]['x'] for n in node_ids]
+      y = [G_proj.nodes[n]['y'] for n in node_ids]
+      crs = G_proj.graph.get('crs')
+    cg = cls(node_ids, offsets, targets, cols, lat, lon, x, y, crs)
+    cg._index = index
+    return cg
+
+  @property
+  def n_nodes(self):
+    return len(self.node_ids)
+
+  @property
+  def n_edges(self):
+    return len(self.targets)
+
+  def index_of(self, node):
+    if self.zero_copy:
+      # busca binária no array compartilhado em vez de um dict por processo
+      if self.id_order is None:
+        self.id_order = np.argsort(self.node_ids, kind='stable')
+      pos = int(np.searchsorted(self.node_ids, node, sorter=self.id_order))
+      if pos < self.n_nodes and self.node_ids[self.id_order[pos]] == node:
+        return int(self.id_order[pos])
+      raise nx.NodeNotFound(f"Node {node} is not in the compiled graph")
+    if self._index is None:
+      self._index = {n: i for i, n in enumerate(self.node_ids.tolist())}
+    try:
+      return self._index[node]
+    except KeyError:
+      raise nx.NodeNotFound(f"Node {node} is not in the compiled graph")
+
+  def to_nodes(self, idx_path):
+    if self.zero_copy:
+      return self.node_ids[np.asarray(idx_path, dtype=np.int64)].tolist()
+    if self._id_list is None:
+      self._id_list = self.node_ids.tolist()
+    ids = self._id_list
+    return [ids[i] for i in idx_path]
+
+  def adjacency(self, weight):
+    """Retorna (offsets, targets, pesos) como listas Python (ou memoryviews, com zero_copy) para o laço quente."""
+    if weight not in self.weights:
+      raise KeyError(f"Peso '{weight}' não foi compilado no grafo")
+    if weight not in self._lists:
+      arrays = (self.offsets, self.targets, self.weights[weight])
+      if self.zero_copy:
+        # indexar um memoryview devolve int/float do Python, como as listas, sem copiar o buffer
+        self._lists[weight] = tuple(memoryview(a).toreadonly() for a in arrays)
+      else:
+        self._lists[weight] = tuple(a.tolist() for a in arrays)
+    return self._lists[weight]
+
+  def reverse_adjacency(self, weight):
+    """CSR do grafo reverso: (offsets, origens, pesos) das arestas que chegam em cada nó."""
+    key = ('reverse', weight)
+    if key not in self._lists:
+      if weight not in self.weights:
+        raise KeyError(f"Peso '{weight}' não foi compilado no grafo")
+      sources = np.repeat(np.arange(self.n_nodes), np.diff(self.offsets))
+      order = np.argsort(self.targets, kind='stable')
+      roffsets = np.searchsorted(self.targets[order], np.arange(self.n_nodes + 1))
+      self._lists[key] = (roffsets.tolist(), sources[order].tolist(), self.weights[weight][order].tolist())
+    return self._lists[key]
+
+  def great_circle(self, u, v):
+    # mesma fórmula de ox.distance.great_circle, mas indexando os arrays
+    y1 = np.deg2rad(self.lat[u])
+    y2 = np.deg2rad(self.lat[v])
+    x1 = np.deg2rad(self.lon[u])
+    x2 = np.deg2rad(self.lon[v])
+    h = np.sin((y2 - y1) / 2) ** 2 + np.cos(y1) * np.cos(y2) * np.sin((x2 - x1) / 2) ** 2
+    h = np.minimum(1, h)
+    return 2 * np.arcsin(np.sqrt(h)) * EARTH_RADIUS_M
+
+
+def relaxed_edges(offsets, nodes):
+  """Arestas examinadas por uma busca: soma do grau de saída (no CSR `offsets`) dos nós expandidos."""
+  return sum(offsets[u + 1] - offsets[u] for u in nodes)
+
+
+def astar_indices(cg, source, target, weight='length', heuristic=None, stats=None):
+  """A* sobre os arrays CSR; recebe e devolve índices internos dos nós.
+
+  heuristic pode ser uma função (u, v) sobre índices ou uma tabela já calculada para o destino
+  (ver heuristics.py), lida direto por índice sem chamada Python por nó. Passe a lista
+  (DestinationHeuristic.value_list, convertida uma vez por destino): um ndarray é convertido aqui,
+  O(N) a cada consulta.
+  Se `stats` for um dict, recebe o número de nós assentados em stats['settled'] e de arestas
+  relaxadas (vizinhos examinados) em stats['relaxed'].
+  """
+  offsets, targets, wts = cg.adjacency(weight)
+  if heuristic is None:
+    heuristic = cg.great_circle
+  hvals = None
+  if not callable(heuristic):
+    hvals = heuristic.tolist() if isinstance(heuristic, np.ndarray) else heuristic
+
+  # mesma disciplina de fila/desempate do nx.astar_path
+  c = count()
+  queue = [(0, next(c), source, 0, -1)]
+  enqueued = {}
+  explored = {}
+  while queue:
+    _, __, curnode, dist, parent = heappop(queue)
+    if curnode == target:
+      if stats is not None:
+        stats['settled'] = len(explored) + 1
+        stats['relaxed'] = relaxed_edges(offsets, explored)
+        stats['cost'] = dist
+      path = [curnode]
+      node = parent
+      while node != -1:
+        path.append(node)
+        node = explored[node]
+      path.reverse()
+      return path
+    if curnode in explored:
+      if explored[curnode] == -1:
+        continue
+      qcost, h = enqueued[curnode]
+      if qcost < dist:
+        continue
+    explored[curnode] = parent
+    for e in range(offsets[curnode], offsets[curnode + 1]):
+      neighbor = targets[e]
+      ncost = dist + wts[e]
+      if neighbor in enqueued:
+        qcost, h = enqueued[neighbor]
+        if qcost <= ncost:
+          continue
+      elif hvals is not None:
+        h = hvals[neighbor]
+      else:
+        h = heuristic(neighbor, target)
+      enqueued[neighbor] = ncost, h
+      heappush(queue, (ncost + h, next(c), neighbor, ncost, curnode))
+  if stats is not None:
+    stats['settled'] = len(explored)
+    stats['relaxed'] = relaxed_edges(offsets, explored)
+  raise nx.NetworkXNoPath(f"Node {cg.node_ids[target]} not reachable from {cg.node_ids[source]}")
+
+
+def astar_path(cg, source, target, weight='length', heuristic=None, stats=None):
+  """Equivalente a nx.astar_path(G, source, target, weight=...) usando o grafo compilado."""
+  path = astar_indices(cg, cg.index_of(source), cg.index_of(target), weight, heuristic, stats)
+  return cg.to_nodes(path)
+
+
+def dijkstra_distances(cg, source, weight='length', reverse=False):
+  """Distâncias de `source` (índice) para todos os nós; com reverse=True, de todos até `source`."""
+  offsets, targets, wts = cg.reverse_adjacency(weight) if reverse else cg.adjacency(weight)
+  dist = [math.inf] * cg.n_nodes
+  dist[source] = 0.0
+  queue = [(0.0, source)]
+  while queue:
+    d, u = heappop(queue)
+    if d > dist[u]:
+      continue
+    for e in range(offsets[u], offsets[u + 1]):
+      v = targets[e]
+      nd = d + wts[e]
+      if nd < dist[v]:
+        dist[v] = nd
+        heappush(queue, (nd, v))
+  return np.asarray(dist, dtype=np.float64)
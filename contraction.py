@@ -0,0 +1,270 @@
+import math
+from heapq import heappush, heappop
+
+import numpy as np
+import networkx as nx
+
+# Limite de nós assentados na busca de testemunha; se estourar, o atalho é criado mesmo assim
+# (mais atalhos que o necessário, mas a hierarquia continua exata)
+WITNESS_SETTLE_LIMIT = 60
+
+
+def _witness_search(out_edges, source, skip, max_cost, limit):
+  # Dijkstra local a partir de `source` ignorando `skip` (nós contraídos já saíram das listas)
+  dist = {source: 0.0}
+  queue = [(0.0, source)]
+  settled = 0
+  while queue and settled < limit:
+    d, u = heappop(queue)
+    if d > dist[u]:
+      continue
+    if d > max_cost:
+      break
+    settled += 1
+    for v, (w, _) in out_edges[u].items():
+      if v == skip:
+        continue
+      nd = d + w
+      if nd < dist.get(v, math.inf):
+        dist[v] = nd
+        heappush(queue, (nd, v))
+  return dist
+
+
+def _shortcuts(out_edges, in_edges, v, limit):
+  """Atalhos (u, w, custo) necessários para contrair v sem perder caminhos mínimos."""
+  incoming = [(u, wu) for u, (wu, _) in in_edges[v].items()]
+  outgoing = [(w, ww) for w, (ww, _) in out_edges[v].items()]
+  if not incoming or not outgoing:
+    return []
+  max_out = max(ww for _, ww in outgoing)
+  result = []
+  for u, wu in incoming:
+    dist = _witness_search(out_edges, u, v, wu + max_out, limit)
+    for w, ww in outgoing:
+      if w == u:
+        continue
+      cost = wu + ww
+      if dist.get(w, math.inf) > cost:
+        result.append((u, w, cost))
+  return result
+
+
+def _build_csr(n, edges):
+  # edges: lista de (origem, destino, peso, meio) -> CSR ordenado pela origem
+  edges.sort(key=lambda e: e[0])
+  src = np.fromiter((e[0] for e in edges), dtype=np.int64, count=len(edges))
+  offsets = np.searchsorted(src, np.arange(n + 1))
+  dst = np.fromiter((e[1] for e in edges), dtype=np.int64, count=len(edges))
+  wts = np.fromiter((e[2] for e in edges), dtype=np.float64, count=len(edges))
+  mid = np.fromiter((e[3] for e in edges), dtype=np.int64, count=len(edges))
+  return offsets, dst, wts, mid
+
+
+class ContractionHierarchy:
+  """Hierarquia de contração sobre um CompiledGraph: ranks, arestas "para cima" e atalhos.
+
+  fwd_* guarda as arestas u -> v com rank[v] > rank[u] (busca a partir da origem) e bwd_* as
+  arestas v -> u do grafo original com rank[v] > rank[u], indexadas por u (busca reversa a
+  partir do destino). *_mid é o nó contraído de cada atalho (-1 para arestas originais).
+  """
+
+  def __init__(self, cg, weight, rank, fwd, bwd):
+    self.cg = cg
+    self.weight = weight
+    self.rank = np.asarray(rank, dtype=np.int64)
+    self.fwd_offsets, self.fwd_targets, self.fwd_weights, self.fwd_mid = fwd
+    self.bwd_offsets, self.bwd_sources, self.bwd_weights, self.bwd_mid = bwd
+    self._lists = None
+    self._mid_of = None
+
+  @classmethod
+  def build(cls, cg, weight='length', settle_limit=WITNESS_SETTLE_LIMIT):
+    """Contrai os nós em ordem de prioridade (diferença de arestas + vizinhos já contraídos)."""
+    n = cg.n_nodes
+    offsets, targets, wts = cg.adjacency(weight)
+    out_edges = [dict() for _ in range(n)]
+    in_edges = [dict() for _ in range(n)]
+    for u in range(n):
+      for e in range(offsets[u], offsets[u + 1]):
+        v = targets[e]
+        if v == u:
+          continue
+        out_edges[u][v] = (wts[e], -1)
+        in_edges[v][u] = (wts[e], -1)
+
+    deleted_neighbors = [0] * n
+
+    def priority(v):
+      shortcuts = _shortcuts(out_edges, in_edges, v, settle_limit)
+      return len(shortcuts) - len(out_edges[v]) - len(in_edges[v]) + deleted_neighbors[v], shortcuts
+
+    queue = [(priority(v)[0], v) for v in range(n)]
+    queue.sort()
+    rank = [0] * n
+    fwd = []
+    bwd = []
+    order = 0
+    while queue:
+      _, v = heappop(queue)
+      # atualização preguiçosa: recalcula e devolve à fila se outro nó ficou melhor
+      p, shortcuts = priority(v)
+      if queue and p > queue[0][0]:
+        heappush(queue, (p, v))
+        continue
+      for u, w, cost in shortcuts:
+        if cost < out_edges[u].get(w, (math.inf, -1))[0]:
+          out_edges[u][w] = (cost, v)
+          in_edges[w][u] = (cost, v)
+      rank[v] = order
+      order += 1
+      # as arestas restantes de v vão para nós de rank maior; depois v sai do grafo
+      for w, (cost, mid) in out_edges[v].items():
+        fwd.append((v, w, cost, mid))
+        deleted_neighbors[w] += 1
+        del in_edges[w][v]
+      for u, (cost, mid) in in_edges[v].items():
+        bwd.append((v, u, cost, mid))
+        deleted_neighbors[u] += 1
+        del out_edges[u][v]
+      out_edges[v] = {}
+      in_edges[v] = {}
+    return cls(cg, weight, rank, _build_csr(n, fwd), _build_csr(n, bwd))
+
+  def _adjacency(self):
+    if self._lists is None:
+      self._lists = (
+        self.fwd_offsets.tolist(), self.fwd_targets.tolist(), self.fwd_weights.tolist(),
+        self.bwd_offsets.tolist(), self.bwd_sources.tolist(), self.bwd_weights.tolist(),
+      )
+    return self._lists
+
+  def _mid(self, u, w):
+    if self._mid_of is None:
+      mid_of = {}
+      fo, ft, fm = self.fwd_offsets.tolist(), self.fwd_targets.tolist(), self.fwd_mid.tolist()
+      for a in range(len(fo) - 1):
+        for e in range(fo[a], fo[a + 1]):
+          mid_of[(a, ft[e])] = fm[e]
+      bo, bs, bm = self.bwd_offsets.tolist(), self.bwd_sources.tolist(), self.bwd_mid.tolist()
+      for b in range(len(bo) - 1):
+        for e in range(bo[b], bo[b + 1]):
+          mid_of[(bs[e], b)] = bm[e]
+      self._mid_of = mid_of
+    return self._mid_of[(u, w)]
+
+  def _unpack(self, u, w):
+    # expande o atalho u -> w recursivamente (com pilha explícita)
+    path = [u]
+    stack = [(u, w)]
+    while stack:
+      a, b = stack.pop()
+      mid = self._mid(a, b)
+      if mid == -1:
+        path.append(b)
+      else:
+        stack.append((mid, b))
+        stack.append((a, mid))
+    return path
+
+  def query_indices(self, source, target, stats=None):
+    """Dijkstra bidirecional só "para cima" na hierarquia; devolve o caminho já expandido."""
+    fo, ft, fw, bo, bs, bw = self._adjacency()
+    dist = ({source: 0.0}, {target: 0.0})
+    parent = ({source: -1}, {target: -1})
+    queues = ([(0.0, source)], [(0.0, target)])
+    adj = ((fo, ft, fw), (bo, bs, bw))
+    best = 0.0 if source == target else math.inf
+    meet = source if source == target else -1
+    settled = relaxed = 0
+    side = 0
+    while queues[0] or queues[1]:
+      # cada direção para quando o topo da fila já não melhora o melhor caminho
+      if not queues[side] or queues[side][0][0] >= best:
+        if not queues[1 - side] or queues[1 - side][0][0] >= best:
+          break
+        side = 1 - side
+      d, u = heappop(queues[side])
+      if d > dist[side][u]:
+        continue
+      settled += 1
+      other = dist[1 - side]
+      if u in other and d + other[u] < best:
+        best = d + other[u]
+        meet = u
+      offs, tgts, ws = adj[side]
+      relaxed += offs[u + 1] - offs[u]
+      for e in range(offs[u], offs[u + 1]):
+        v = tgts[e]
+        nd = d + ws[e]
+        if nd < dist[side].get(v, math.inf):
+          dist[side][v] = nd
+          parent[side][v] = u
+          heappush(queues[side], (nd, v))
+      side = 1 - side
+
+    if stats is not None:
+      stats['settled'] = settled
+      stats['relaxed'] = relaxed
+      stats['cost'] = best
+    if meet == -1:
+      raise nx.NetworkXNoPath(f"Node {self.cg.node_ids[target]} not reachable from {self.cg.node_ids[source]}")
+    # sobe da origem até o encontro e desce até o destino, expandindo os atalhos
+    up = [meet]
+    while parent[0][up[-1]] != -1:
+      up.append(parent[0][up[-1]])
+    up.reverse()
+    down = [meet]
+    while parent[1][down[-1]] != -1:
+      down.append(parent[1][down[-1]])
+    hops = list(zip(up[:-1], up[1:])) + list(zip(down[:-1], down[1:]))
+    path = [source]
+    for a, b in hops:
+      path.extend(self._unpack(a, b)[1:])
+    return path
+
+  def shortest_path(self, source, target, stats=None):
+    path = self.query_indices(self.cg.index_of(source), self.cg.index_of(target), stats)
+    return self.cg.to_nodes(path)
+
+  def nbytes(self):
+    return sum(a.nbytes for a in (
+      self.rank, self.fwd_offsets, self.fwd_targets, self.fwd_weights, self.fwd_mid,
+      self.bwd_offsets, self.bwd_sources, self.bwd_weights, self.bwd_mid,
+    ))
+
+  def to_arrays(self):
+    return {
+      'rank': self.rank,
+      'fwd_offsets': self.fwd_offsets, 'fwd_targets': self.fwd_targets,
+      'fwd_weights': self.fwd_weights, 'fwd_mid': self.fwd_mid,
+      'bwd_offsets': self.bwd_offsets, 'bwd_sources': self.bwd_sources,
+      'bwd_weights': self.bwd_weights, 'bwd_mid': self.bwd_mid,
+    }
+
+  def save(self, store, key):
+    store.save_extra(key, f'ch_{self.weight}', self.to_arrays(), {'weight': self.weight})
+
+  @classmethod
+  def load(cls, store, key, cg, weight='length'):
+    extra = store.load_extra(key, f'ch_{weight}')
+    if extra is None:
+      return None
+    a, _ = extra
+    if len(a['rank']) != cg.n_nodes:
+      return None
+    fwd = (a['fwd_offsets'], a['fwd_targets'], a['fwd_weights'], a['fwd_mid'])
+    bwd = (a['bwd_offsets'], a['bwd_sources'], a['bwd_weights'], a['bwd_mid'])
+    return cls(cg, weight, a['rank'], fwd, bwd)
+
+
+def hierarchy_for(cg, weight='length', store=None, key=None):
+  """Hierarquia do grafo: lida do snapshot (store, key) se existir, senão construída e salva junto."""
+  if store is not None and key is not None:
+    ch = ContractionHierarchy.load(store, key, cg, weight)
+    if ch is not None:
+      return ch
+  ch = ContractionHierarchy.build(cg, weight)
+  if store is not None and key is not None:
+    ch.save(store, key)
+  return ch
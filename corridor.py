@@ -0,0 +1,136 @@
+import math
+
+import numpy as np
+import networkx as nx
+import osmnx as ox
+import shapely
+
+from graph_store import GraphStore
+from speeds import add_speeds
+from snapping import EARTH_RADIUS_M, local_xy
+from instrumentation import span, count
+
+# Folga do corredor: quanto uma rota pode se desviar da linha O-D. A área é a elipse com focos
+# na origem e no destino em que d(p, O) + d(p, D) <= d(O, D) + 2 * folga
+CORRIDOR_SLACK_FACTOR = 0.15   # fração da distância O-D
+CORRIDOR_SLACK_MIN_M = 1000.0  # folga mínima (viagens curtas / O e D quase iguais)
+# Expansão automática: sem rota, ou com a rota passando a menos de BOUNDARY_M da borda, a folga
+# é multiplicada por CORRIDOR_GROWTH e o grafo do corredor maior é carregado
+CORRIDOR_GROWTH = 2.0
+CORRIDOR_MAX_STEPS = 4
+BOUNDARY_M = 100.0
+# Vértices do polígono da elipse
+ELLIPSE_SEGMENTS = 72
+
+
+def _lonlat(xy, lat0):
+  # inverso de snapping.local_xy
+  xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+  lat = np.degrees(xy[:, 1] / EARTH_RADIUS_M)
+  lon = np.degrees(xy[:, 0] / (EARTH_RADIUS_M * math.cos(math.radians(lat0))))
+  return np.column_stack((lon, lat))
+
+
+def initial_slack(orig_point, dest_point, factor=CORRIDOR_SLACK_FACTOR, min_slack=CORRIDOR_SLACK_MIN_M):
+  od_dist_m = ox.distance.great_circle(orig_point[0], orig_point[1], dest_point[0], dest_point[1])
+  return max(min_slack, float(od_dist_m) * factor)
+
+
+def corridor_polygon(orig_point, dest_point, slack_m):
+  """Elipse (polígono shapely em lon/lat) com focos em orig/dest (lat, lon) e folga slack_m em metros.
+
+  Contém todo ponto por onde passa um caminho de até d(O, D) + 2 * slack_m; O e D ficam a
+  slack_m da borda.
+  """
+  lat0 = (orig_point[0] + dest_point[0]) / 2
+  (ox_, oy), (dx, dy) = local_xy([orig_point[0], dest_point[0]], [orig_point[1], dest_point[1]], lat0)
+  c = math.hypot(dx - ox_, dy - oy) / 2
+  a = c + slack_m
+  b = math.sqrt(a * a - c * c)
+  theta = math.atan2(dy - oy, dx - ox_)
+  t = np.linspace(0, 2 * math.pi, ELLIPSE_SEGMENTS, endpoint=False)
+  ex, ey = a * np.cos(t), b * np.sin(t)
+  x = (ox_ + dx) / 2 + ex * math.cos(theta) - ey * math.sin(theta)
+  y = (oy + dy) / 2 + ex * math.sin(theta) + ey * math.cos(theta)
+  return shapely.Polygon(_lonlat(np.column_stack((x, y)), lat0))
+
+
+def touches_boundary(polygon, G, path, tolerance_m=BOUNDARY_M):
+  """True se algum nó da rota está fora do corredor ou a menos de tolerance_m da borda.
+
+  A rota pode sair do polígono: graph_from_polygon(truncate_by_edge=True) mantém as pontas de fora
+  das arestas que cruzam a borda, e o grafo pode vir de um snapshot maior que cobre o corredor.
+  """
+  lat = np.fromiter((G.nodes[n]['y'] for n in path), dtype=np.float64, count=len(path))
+  lon = np.fromiter((G.nodes[n]['x'] for n in path), dtype=np.float64, count=len(path))
+  if not shapely.contains_xy(polygon, lon, lat).all():
+    return True
+  lat0 = float(polygon.centroid.y)
+  boundary = np.asarray(polygon.exterior.coords)
+  ring = shapely.LinearRing(local_xy(boundary[:, 1], boundary[:, 0], lat0))
+  dist = shapely.distance(shapely.points(local_xy(lat, lon, lat0)), ring)
+  return bool(np.min(dist) < tolerance_m)
+
+
+def build_corridor_graph(polygon, network_type='drive'):
+  """Mesmo pipeline de graph_store.build_graph, baixando só a área do polígono."""
+  with span('graph.download', area='corridor'):
+    G = ox.graph_from_polygon(polygon, network_type=network_type, truncate_by_edge=True)
+  with span('graph.speeds'):
+    G = add_speeds(G)
+  with span('graph.project'):
+    G_proj = ox.project_graph(G)
+  return G, G_proj
+
+
+def get_corridor_graph(polygon, network_type='drive', store=None):
+  """(G, G_proj, chave do snapshot) do corredor: de um snapshot que o cobre, se houver, senão baixa e salva."""
+  if store is None:
+    store = GraphStore()
+  key = store.find_polygon(polygon, network_type)
+  if key is not None:
+    with span('graph.load', key=key):
+      graphs = store.load(key)
+    if graphs is not None:
+      count('graph_store.hit')
+      return graphs + (key,)
+  count('graph_store.miss')
+  G, G_proj = build_corridor_graph(polygon, network_type)
+  center = (float(polygon.centroid.y), float(polygon.centroid.x))
+  with span('graph.save'):
+    key = store.save(G, G_proj, center, None, network_type, polygon=polygon)
+  return G, G_proj, key
+
+
+def corridor_route(orig_point, dest_point, solve, network_type='drive', store=None, slack_m=None,
+                   growth=CORRIDOR_GROWTH, max_steps=CORRIDOR_MAX_STEPS, on_graph=None, on_expand=None):
+  """Rota dentro de um corredor O-D que cresce até a rota caber nele.
+
+  solve(G, G_proj, key) devolve a rota (ids dos nós) ou levanta nx.NetworkXNoPath; on_graph(G, G_proj),
+  se dado, é chamado a cada grafo carregado (ex.: para já desenhar as ruas). Sem rota, ou com a rota
+  encostando na borda (talvez houvesse caminho melhor fora), a folga cresce `growth` vezes, até
+  max_steps tentativas; on_expand(sem_rota, nova_folga_m), se dado, é avisado a cada ampliação.
+  Devolve (G, G_proj, key, path, polygon).
+  """
+  if slack_m is None:
+    slack_m = initial_slack(orig_point, dest_point)
+  for step in range(max_steps):
+    polygon = corridor_polygon(orig_point, dest_point, slack_m)
+    with span('corridor.graph', step=step, slack_m=slack_m):
+      G, G_proj, key = get_corridor_graph(polygon, network_type, store)
+    if on_graph is not None:
+      on_graph(G, G_proj)
+    try:
+      path = solve(G, G_proj, key)
+    except nx.NetworkXNoPath:
+      path = None
+    last_step = step == max_steps - 1
+    # na última tentativa a rota encontrada vale, mesmo rente à borda
+    if path is not None and (last_step or not touches_boundary(polygon, G, path)):
+      return G, G_proj, key, path, polygon
+    if not last_step:
+      count('corridor.expansions')
+      slack_m *= growth
+      if on_expand is not None:
+        on_expand(path is None, slack_m)
+  raise nx.NetworkXNoPath(f"Sem rota no corredor O-D mesmo com folga de {slack_m:.0f} m")
@@ -0,0 +1,83 @@
+import math
+from heapq import heappush, heappop
+
+import numpy as np
+
+from parallel_routing import ParallelRouter
+
+
+def _row(cg, task):
+  """Uma Dijkstra a partir de `source` que para assim que todos os alvos forem assentados.
+
+  Além do peso da busca, acumula os demais atributos compilados ao longo da árvore de
+  caminhos mínimos (ex.: travel_time da rota de menor length).
+  """
+  source, targets, weight, keep_paths = task
+  offsets, tgts, wts = cg.adjacency(weight)
+  others = [a for a in cg.weights if a != weight]
+  other_wts = [cg.adjacency(a)[2] for a in others]
+
+  remaining = set(targets)
+  dist = {source: 0.0}
+  acc = {source: (0.0,) * len(others)}
+  parent = {source: -1} if keep_paths else None
+  done = set()
+  queue = [(0.0, source)]
+  while queue and remaining:
+    d, u = heappop(queue)
+    if u in done:
+      continue
+    done.add(u)
+    remaining.discard(u)
+    au = acc[u]
+    for e in range(offsets[u], offsets[u + 1]):
+      v = tgts[e]
+      nd = d + wts[e]
+      if nd < dist.get(v, math.inf):
+        dist[v] = nd
+        acc[v] = tuple(a + ow[e] for a, ow in zip(au, other_wts))
+        if keep_paths:
+          parent[v] = u
+        heappush(queue, (nd, v))
+
+  row = {weight: [dist[t] if t in done else math.inf for t in targets]}
+  for i, a in enumerate(others):
+    row[a] = [acc[t][i] if t in done else math.inf for t in targets]
+  if keep_paths:
+    paths = []
+    for t in targets:
+      if t not in done:
+        paths.append(None)
+        continue
+      path = [t]
+      while parent[path[-1]] != -1:
+        path.append(parent[path[-1]])
+      path.reverse()
+      paths.append(path)
+    row['paths'] = paths
+  return row
+
+
+def distance_matrix(cg, sources, targets, weight='length', processes=1, return_paths=False):
+  """Matrizes N x M de custos entre `sources` e `targets` (ids de nós) com uma Dijkstra por origem.
+
+  Devolve um dict atributo -> np.ndarray (float64, inf quando não há rota) para cada peso
+  compilado no grafo (ex.: 'length' e 'travel_time'); a busca minimiza `weight`. Com
+  return_paths=True inclui 'paths', lista N x M com os nós de cada rota (ou None).
+  """
+  if weight not in cg.weights:
+    raise KeyError(f"Peso '{weight}' não foi compilado no grafo")
+  src_idx = [cg.index_of(s) for s in sources]
+  tgt_idx = [cg.index_of(t) for t in targets]
+  tasks = [(s, tgt_idx, weight, return_paths) for s in src_idx]
+  if processes > 1 and len(tasks) > 1:
+    with ParallelRouter(cg, processes=processes) as router:
+      rows = router.map(_row, tasks)
+  else:
+    rows = [_row(cg, task) for task in tasks]
+
+  result = {a: np.array([r[a] for r in rows], dtype=np.float64).reshape(len(src_idx), len(tgt_idx))
+            for a in cg.weights}
+  if return_paths:
+    result['paths'] = [[cg.to_nodes(p) if p is not None else None for p in r['paths']] for r in rows]
+  return result
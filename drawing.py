@@ -0,0 +1,127 @@
+import math
+
+import pygame
+
+from route_metrics import highway_of
+
+# ---------- UI Palette (Waze-like) ----------
+COL_BG = (26, 28, 32)          # fundo bem escuro
+COL_ROAD_CASING = (37, 39, 45) # contorno das vias
+COL_ROAD_INNER = (210, 213, 220)  # interior clarinho das vias
+COL_PRIMARY_INNER = (225, 230, 240)
+COL_ROUTE_OUTLINE = (245, 250, 255)
+COL_ROUTE = (70, 150, 255)     # azul da rota
+COL_TEXT = (230, 230, 235)
+COL_MUTED = (140, 145, 155)
+COL_START = (0, 210, 120)
+COL_END = (235, 70, 70)
+COL_VEHICLE = (100, 40, 150)
+COL_TRAFFIC = (235, 90, 60)    # trechos com trânsito
+
+
+def classify_edge(data):
+  hw = highway_of(data)
+  # largura base por tipo
+  if hw in ('motorway', 'trunk'):
+    return 6
+  if hw in ('primary', 'secondary'):
+    return 4
+  if hw in ('tertiary', 'residential', 'unclassified', 'living_street'):
+    return 2
+  return 2
+
+
+def edge_styles(G):
+  """Largura base e tipo de via de cada aresta, na ordem de G.edges(keys=True)."""
+  widths = []
+  highways = []
+  for _, _, _, data in G.edges(keys=True, data=True):
+    widths.append(classify_edge(data))
+    highways.append(highway_of(data))
+  return widths, highways
+
+
+def fmt_km(m):
+  return f"{m/1000:.1f} km" if m >= 1000 else f"{int(m)} m"
+
+
+def fmt_eta(s):
+  m = int(round(s/60))
+  if m < 60:
+    return f"{m} min"
+  h = m // 60
+  mm = m % 60
+  return f"{h} h {mm} min"
+
+
+def draw_rounded_rect(surface, rect, color, radius=12, border=0, border_color=(0,0,0)):
+  pygame.draw.rect(surface, border_color, rect, border_radius=radius) if border>0 else None
+  inner = pygame.Rect(rect)
+  if border>0:
+    inner.inflate_ip(-2*border, -2*border)
+  pygame.draw.rect(surface, color, inner, border_radius=max(0, radius- (border>0)))
+
+
+def draw_top_bar(surface, title, font):
+  # barra superior com efeito de translucidez
+  w = surface.get_width()
+  bar_h = 60
+  overlay = pygame.Surface((w, bar_h), pygame.SRCALPHA)
+  overlay.fill((20, 22, 26, 220))
+  surface.blit(overlay, (0, 0))
+  # pseudo search box
+  box = pygame.Rect(16, 12, w-32, 36)
+  draw_rounded_rect(surface, box, (40,43,50), radius=12)
+  txt = font.render(title, True, COL_TEXT)
+  surface.blit(txt, (box.x+12, box.y+8))
+
+
+def draw_bottom_sheet(surface, lines, font):
+  w, screen_h = surface.get_size()
+  h = 110
+  overlay = pygame.Surface((w, h), pygame.SRCALPHA)
+  overlay.fill((20, 22, 26, 220))
+  surface.blit(overlay, (0, screen_h-h))
+  box = pygame.Rect(12, screen_h-h+8, w-24, h-16)
+  draw_rounded_rect(surface, box, (40,43,50), radius=14)
+  y = box.y + 10
+  for ln in lines:
+    t = font.render(ln, True, COL_TEXT)
+    surface.blit(t, (box.x+12, y))
+    y += 26
+
+
+def draw_polyline_with_casing(surface, pts, width, inner_color, casing_color):
+  # pts já em pixels de tela (ver renderer.to_pixels)
+  if len(pts) < 2:
+    return
+  # casing (mais grosso)
+  pygame.draw.lines(surface, casing_color, False, pts, max(1, width+4))
+  # inner
+  pygame.draw.lines(surface, inner_color, False, pts, width)
+
+
+def draw_route(surface, pts, zoom):
+  # contorno claro + rota azul (espessura também escala levemente)
+  route_w = max(3, min(10, int(6 * zoom)))
+  draw_polyline_with_casing(surface, pts, route_w, COL_ROUTE, COL_ROUTE_OUTLINE)
+
+
+def draw_endpoints(surface, orig_scr, dest_scr):
+  pygame.draw.circle(surface, COL_ROUTE_OUTLINE, orig_scr, 9)
+  pygame.draw.circle(surface, COL_START, orig_scr, 7)
+  pygame.draw.circle(surface, COL_ROUTE_OUTLINE, dest_scr, 9)
+  pygame.draw.circle(surface, COL_END, dest_scr, 7)
+
+
+def draw_vehicle_marker(surface, ps, ang, angle_offset=0.0):
+  # ang em radianos no CRS projetado; na tela o eixo Y é invertido: ângulo de tela = -ang + offset
+  ang_screen = -ang + angle_offset
+  size = 12
+  pts = [
+    (ps[0] + math.cos(ang_screen)*size,     ps[1] + math.sin(ang_screen)*size),
+    (ps[0] + math.cos(ang_screen+2.5)*size*0.7, ps[1] + math.sin(ang_screen+2.5)*size*0.7),
+    (ps[0] + math.cos(ang_screen-2.5)*size*0.7, ps[1] + math.sin(ang_screen-2.5)*size*0.7),
+  ]
+  pygame.draw.polygon(surface, COL_VEHICLE, [(int(x), int(y)) for x,y in pts])
+  pygame.draw.polygon(surface, COL_ROUTE_OUTLINE, [(int(x), int(y)) for x,y in pts], 2)
@@ -0,0 +1,232 @@
+import math
+from heapq import heappush, heappop
+
+import numpy as np
+import networkx as nx
+import osmnx as ox
+
+from compiled_graph import EARTH_RADIUS_M
+from heuristics import compiled_for
+
+INF = math.inf
+
+
+class DStarLite:
+  """Busca incremental (D* Lite) sobre o grafo compilado, com pesos que mudam durante a viagem.
+
+  A busca parte do destino: g[s] é o custo de s até o destino. Mudanças de peso (update_edges)
+  e o avanço do veículo (move_to) só reabrem os nós cujo custo foi afetado; o resto da busca
+  anterior é reaproveitado em vez de refazer o A* do zero. Os pesos são uma cópia própria do
+  CSR (o grafo compilado não muda). A heurística é a geodésica dividida pela maior razão
+  geodésica/peso das arestas, consistente enquanto nenhuma aresta ficar mais "rápida" que isso;
+  se um lote de mudanças quebrar essa condição a busca é refeita do zero.
+  """
+
+  def __init__(self, graph, source, target, weight='travel_time'):
+    cg = compiled_for(graph)
+    self.cg = cg
+    self.weight = weight
+    self._offsets, self._targets, base = cg.adjacency(weight)
+    self._base = base
+    self._w = list(base)
+    # CSR reverso com o índice da aresta direta: predecessores de cada nó e o peso da aresta
+    sources = np.repeat(np.arange(cg.n_nodes), np.diff(cg.offsets))
+    order = np.argsort(cg.targets, kind='stable')
+    self._roffsets = np.searchsorted(cg.targets[order], np.arange(cg.n_nodes + 1)).tolist()
+    self._rsources = sources[order].tolist()
+    self._redges = order.tolist()
+    self._edge_dist = ox.distance.great_circle(cg.lat[sources], cg.lon[sources], cg.lat[cg.targets], cg.lon[cg.targets])
+    self._lat = np.radians(cg.lat).tolist()
+    self._lon = np.radians(cg.lon).tolist()
+    self._coslat = np.cos(np.radians(cg.lat)).tolist()
+    self.start = cg.index_of(source)
+    self.goal = cg.index_of(target)
+    self.stats = {'expanded': 0, 'resets': 0}
+    self._reset()
+
+  # ---------- heurística e chaves ----------
+
+  def _max_ratio(self):
+    # mesma regra de heuristics._max_ratio: peso nulo entre pontos distintos -> heurística zero
+    w = np.asarray(self._w)
+    mask = w > 0
+    if np.any(self._edge_dist[~mask] > 0):
+      return INF
+    return float(np.max(self._edge_dist[mask] / w[mask])) if mask.any() else 1.0
+
+  def _h(self, a, b):
+    # mesma fórmula de CompiledGraph.great_circle, escalar, dividida pela razão distância/peso
+    h = math.sin((self._lat[b] - self._lat[a]) / 2) ** 2 + \
+        self._coslat[a] * self._coslat[b] * math.sin((self._lon[b] - self._lon[a]) / 2) ** 2
+    return 2 * math.asin(math.sqrt(min(1.0, h))) * EARTH_RADIUS_M / self._ratio
+
+  def _key(self, s):
+    m = min(self.g[s], self.rhs[s])
+    return (m + self._h(self.start, s) + self.km, m)
+
+  def _reset(self):
+    n = self.cg.n_nodes
+    self._ratio = self._max_ratio()
+    self.g = [INF] * n
+    self.rhs = [INF] * n
+    self.rhs[self.goal] = 0.0
+    self.km = 0.0
+    self._last = self.start
+    self._queue = []
+    self._queued = {}
+    self._update_vertex(self.goal)
+    self.stats['resets'] += 1
+    self._compute()
+
+  # ---------- fila com remoção preguiçosa ----------
+
+  def _update_vertex(self, u):
+    if self.g[u] != self.rhs[u]:
+      key = self._key(u)
+      self._queued[u] = key
+      heappush(self._queue, (key[0], key[1], u))
+    else:
+      self._queued.pop(u, None)
+
+  def _top(self):
+    queue, queued = self._queue, self._queued
+    while queue and queued.get(queue[0][2]) != (queue[0][0], queue[0][1]):
+      heappop(queue)
+    return queue[0] if queue else None
+
+  def _best(self, u):
+    # rhs(u) = min sobre as arestas de saída de peso + g do vizinho
+    w, targets, g = self._w, self._targets, self.g
+    best = INF
+    for e in range(self._offsets[u], self._offsets[u + 1]):
+      c = w[e] + g[targets[e]]
+      if c < best:
+        best = c
+    return best
+
+  def _compute(self):
+    g, rhs, w = self.g, self.rhs, self._w
+    roffsets, rsources, redges = self._roffsets, self._rsources, self._redges
+    goal = self.goal
+    expanded = 0
+    while True:
+      top = self._top()
+      if top is None:
+        break
+      k_old = (top[0], top[1])
+      if not (k_old < self._key(self.start) or rhs[self.start] > g[self.start]):
+        break
+      u = top[2]
+      k_new = self._key(u)
+      if k_old < k_new:
+        self._queued[u] = k_new
+        heappush(self._queue, (k_new[0], k_new[1], u))
+        continue
+      heappop(self._queue)
+      del self._queued[u]
+      expanded += 1
+      if g[u] > rhs[u]:
+        g[u] = gu = rhs[u]
+        for i in range(roffsets[u], roffsets[u + 1]):
+          p = rsources[i]
+          c = w[redges[i]] + gu
+          if p != goal and c < rhs[p]:
+            rhs[p] = c
+            self._update_vertex(p)
+      else:
+        g_old = g[u]
+        g[u] = INF
+        if u != goal:
+          rhs[u] = self._best(u)
+        self._update_vertex(u)
+        for i in range(roffsets[u], roffsets[u + 1]):
+          p = rsources[i]
+          if p != goal and rhs[p] == w[redges[i]] + g_old:
+            rhs[p] = self._best(p)
+            self._update_vertex(p)
+    self.stats['expanded'] += expanded
+    return expanded
+
+  # ---------- API ----------
+
+  def _edge(self, u, v):
+    targets = self._targets
+    for e in range(self._offsets[u], self._offsets[u + 1]):
+      if targets[e] == v:
+        return e
+    raise KeyError(f"Não há aresta entre {self.cg.node_ids[u]} e {self.cg.node_ids[v]}")
+
+  def weight_of(self, u, v, base=False):
+    """Peso atual (ou original, base=True) da aresta u -> v (ids de nós)."""
+    e = self._edge(self.cg.index_of(u), self.cg.index_of(v))
+    return self._base[e] if base else self._w[e]
+
+  def move_to(self, node):
+    """Atualiza a posição do veículo (id do nó) e repara a busca a partir dela."""
+    self.start = self.cg.index_of(node)
+    self.km += self._h(self._last, self.start)
+    self._last = self.start
+    return self._compute()
+
+  def update_edges(self, changes):
+    """Aplica um lote de novos pesos {(u, v): peso} (ids de nós) e repara a busca uma vez só.
+
+    Devolve quantos nós foram expandidos no reparo.
+    """
+    changed = []
+    for (u, v), c_new in dict(changes).items():
+      ui = self.cg.index_of(u)
+      e = self._edge(ui, self.cg.index_of(v))
+      if c_new != self._w[e]:
+        changed.append((ui, e, self._w[e], float(c_new)))
+    if not changed:
+      return 0
+    before = self.stats['expanded']
+    if any(c_new * self._ratio < self._edge_dist[e] - 1e-9 for _, e, _, c_new in changed):
+      # aresta mais rápida que o limite da heurística: recomeça com a razão nova
+      for _, e, _, c_new in changed:
+        self._w[e] = c_new
+      self._reset()
+      return self.stats['expanded'] - before
+    self.km += self._h(self._last, self.start)
+    self._last = self.start
+    g, rhs = self.g, self.rhs
+    for u, e, c_old, c_new in changed:
+      self._w[e] = c_new
+      v = self._targets[e]
+      if u != self.goal:
+        if c_old > c_new:
+          rhs[u] = min(rhs[u], c_new + g[v])
+        elif rhs[u] == c_old + g[v]:
+          rhs[u] = self._best(u)
+      self._update_vertex(u)
+    self._compute()
+    return self.stats['expanded'] - before
+
+  def reset_edges(self, edges):
+    """Volta as arestas [(u, v), ...] aos pesos originais."""
+    return self.update_edges({(u, v): self.weight_of(u, v, base=True) for u, v in edges})
+
+  @property
+  def cost(self):
+    """Custo da rota atual do veículo até o destino (inf se não há caminho)."""
+    return self.rhs[self.start]
+
+  def path(self):
+    """Rota (ids de nós) da posição atual até o destino com os pesos atuais."""
+    if self.rhs[self.start] == INF:
+      raise nx.NetworkXNoPath(f"Node {self.cg.node_ids[self.goal]} not reachable from {self.cg.node_ids[self.start]}")
+    w, targets, g = self._w, self._targets, self.g
+    s = self.start
+    path = [s]
+    while s != self.goal:
+      best, nxt = INF, -1
+      for e in range(self._offsets[s], self._offsets[s + 1]):
+        c = w[e] + g[targets[e]]
+        if c < best:
+          best, nxt = c, targets[e]
+      if nxt == -1 or len(path) > self.cg.n_nodes:
+        raise nx.NetworkXNoPath(f"Node {self.cg.node_ids[self.goal]} not reachable from {self.cg.node_ids[self.start]}")
+      s = nxt
+      path.append(s)
+    return self.cg.to_nodes(path)
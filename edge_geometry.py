@@ -0,0 +1,118 @@
+import math
+
+import numpy as np
+import shapely
+
+# Tolerâncias (metros) do Douglas–Peucker de cada tier de LOD; o tier 0 é a geometria completa
+TIER_TOLERANCES_M = (0.0, 2.0, 8.0, 25.0)
+# Desvio máximo (em pixels de tela) aceito ao escolher o tier para um zoom
+MAX_ERROR_PX = 0.75
+
+
+def edge_coords(G, u, v, data):
+  # coordenadas (x, y) da aresta no sentido u -> v; sem 'geometry' é o segmento reto entre os nós
+  geom = data.get('geometry')
+  if geom is None:
+    return [(G.nodes[u]['x'], G.nodes[u]['y']), (G.nodes[v]['x'], G.nodes[v]['y'])]
+  coords = list(geom.coords)
+  ux, uy = G.nodes[u]['x'], G.nodes[u]['y']
+  if math.hypot(coords[-1][0] - ux, coords[-1][1] - uy) < math.hypot(coords[0][0] - ux, coords[0][1] - uy):
+    coords.reverse()
+  return coords
+
+
+def simplify_polylines(coords, offsets, tolerance):
+  # Douglas–Peucker vetorizado (GEOS) em todas as polylines de uma vez; as pontas são mantidas
+  counts = np.diff(offsets)
+  lines = shapely.linestrings(coords, indices=np.repeat(np.arange(len(counts)), counts))
+  simple = shapely.simplify(lines, tolerance, preserve_topology=False)
+  out, index = shapely.get_coordinates(simple, return_index=True)
+  new_offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+  np.cumsum(np.bincount(index, minlength=len(counts)), out=new_offsets[1:])
+  return out, new_offsets
+
+
+class EdgeGeometry:
+  """Polylines de todas as arestas num buffer contíguo (coords) + offsets, com tiers simplificados.
+
+  A aresta i ocupa coords[offsets[i]:offsets[i + 1]]; tiers[t] = (coords, offsets) com a
+  geometria simplificada pela tolerância TIER_TOLERANCES_M[t] (tier 0 = completa).
+  """
+
+  def __init__(self, coords, offsets, tolerances=TIER_TOLERANCES_M):
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    self.tolerances = tuple(tolerances)
+    self.tiers = [(coords, offsets)]
+    for tol in self.tolerances[1:]:
+      self.tiers.append(simplify_polylines(coords, offsets, tol) if len(coords) else (coords, offsets))
+
+  @classmethod
+  def from_graph(cls, G, tolerances=TIER_TOLERANCES_M):
+    """Geometria das arestas de G (na ordem de G.edges(keys=True)), no CRS do próprio grafo."""
+    coords = []
+    counts = []
+    for u, v, _, data in G.edges(keys=True, data=True):
+      c = edge_coords(G, u, v, data)
+      coords.extend(c)
+      counts.append(len(c))
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return cls(coords, offsets, tolerances)
+
+  @property
+  def n_edges(self):
+    return len(self.tiers[0][1]) - 1
+
+  def n_points(self, tier=0):
+    return len(self.tiers[tier][0])
+
+  def tier_for(self, k):
+    """Tier mais simplificado cujo desvio fica abaixo de MAX_ERROR_PX com k pixels por metro."""
+    best = 0
+    for t, tol in enumerate(self.tolerances):
+      if tol * k <= MAX_ERROR_PX:
+        best = t
+    return best
+
+  def polyline(self, i, tier=0):
+    coords, offsets = self.tiers[tier]
+    return coords[offsets[i]:offsets[i + 1]]
+
+  def gather(self, idx, tier=0):
+    """Pontos das arestas `idx` concatenados (um array só) + quantos pontos cada uma tem."""
+    coords, offsets = self.tiers[tier]
+    starts = offsets[idx]
+    counts = offsets[np.asarray(idx) + 1] - starts
+    flat = np.arange(int(counts.sum())) + np.repeat(starts - (np.cumsum(counts) - counts), counts)
+    return coords[flat], counts
+
+  def bounds(self):
+    """(x0, y0, x1, y1) de cada aresta, pela geometria completa."""
+    coords, offsets = self.tiers[0]
+    if self.n_edges == 0:
+      empty = np.empty(0, dtype=np.float64)
+      return empty, empty, empty, empty
+    starts = offsets[:-1]
+    return (np.minimum.reduceat(coords[:, 0], starts), np.minimum.reduceat(coords[:, 1], starts),
+            np.maximum.reduceat(coords[:, 0], starts), np.maximum.reduceat(coords[:, 1], starts))
+
+
+def route_edges(G, path):
+  """(coords no sentido u -> v, atributos) de cada aresta da rota (a paralela mais curta, como nas estatísticas)."""
+  result = []
+  for u, v in zip(path[:-1], path[1:]):
+    data = min(G.get_edge_data(u, v).values(), key=lambda d: d.get('length', 0))
+    result.append((edge_coords(G, u, v, data), data))
+  return result
+
+
+def route_polyline(G, path):
+  """Pontos (x, y) da rota seguindo a geometria das arestas."""
+  if len(path) == 1:
+    n = path[0]
+    return [(G.nodes[n]['x'], G.nodes[n]['y'])]
+  points = []
+  for coords, _ in route_edges(G, path):
+    points.extend(coords if not points else coords[1:])
+  return points
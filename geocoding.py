@@ -0,0 +1,190 @@
+import json
+import time
+import sqlite3
+import threading
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+
+from geopy.geocoders import Nominatim
+from geopy.exc import GeocoderRateLimited, GeocoderServiceError, GeocoderTimedOut, GeocoderUnavailable
+
+from instrumentation import span, count
+
+DEFAULT_CACHE_PATH = 'geocode_cache.sqlite'
+DEFAULT_TTL_S = 30 * 24 * 3600  # 30 dias
+USER_AGENT = "rota_pygame_app"
+
+
+def normalize_address(address):
+  """Chave canônica do endereço: unicode NFKC, minúsculas e espaços colapsados."""
+  text = unicodedata.normalize('NFKC', address).casefold()
+  parts = (' '.join(p.split()) for p in text.split(','))
+  return ', '.join(p for p in parts if p)
+
+
+def _candidate(location):
+  raw = getattr(location, 'raw', {}) or {}
+  return {
+    'lat': float(location.latitude),
+    'lon': float(location.longitude),
+    'display_name': raw.get('display_name') or str(location),
+    'raw': raw,
+  }
+
+
+class NominatimBackend:
+  """Backend real (geopy/Nominatim); a política pública pede no máximo 1 requisição por segundo."""
+
+  min_delay = 1.0
+
+  def __init__(self, user_agent=USER_AGENT, timeout=10):
+    self._geolocator = Nominatim(user_agent=user_agent)
+    self.timeout = timeout
+
+  def search(self, query, limit=1, **params):
+    results = self._geolocator.geocode(
+      query, exactly_one=False, limit=limit, addressdetails=True, timeout=self.timeout, **params
+    )
+    return [_candidate(r) for r in results or []]
+
+
+class FixtureBackend:
+  """Backend offline: candidatos lidos de um dict ou de um JSON {endereço: [candidatos]}."""
+
+  min_delay = 0.0
+
+  def __init__(self, fixtures):
+    if isinstance(fixtures, str):
+      with open(fixtures, 'r', encoding='utf-8') as f:
+        fixtures = json.load(f)
+    self._fixtures = {normalize_address(k): v for k, v in fixtures.items()}
+    self.calls = 0
+
+  def search(self, query, limit=1, **params):
+    self.calls += 1
+    return list(self._fixtures.get(normalize_address(query), []))[:limit]
+
+
+class GeocodingService:
+  """Geocodificação com cache persistente (com TTL), deduplicação em lote e fila com limite de taxa.
+
+  Endereços repetidos (inclusive buscas sem resultado) são respondidos pelo cache e nunca
+  voltam para a rede enquanto a entrada não expirar.
+  """
+
+  def __init__(self, backend=None, cache_path=DEFAULT_CACHE_PATH, ttl=DEFAULT_TTL_S, max_retries=2):
+    self.backend = backend or NominatimBackend()
+    self.ttl = ttl
+    self.max_retries = max_retries
+    self._rate_lock = threading.Lock()
+    self._db_lock = threading.Lock()
+    self._last_request = 0.0
+    self._memory = {}
+    self._db = None
+    if cache_path:
+      self._db = sqlite3.connect(cache_path, check_same_thread=False)
+      self._db.execute(
+        "CREATE TABLE IF NOT EXISTS geocode (key TEXT PRIMARY KEY, candidates TEXT NOT NULL, created REAL NOT NULL)"
+      )
+      self._db.commit()
+
+  def _key(self, address, limit, params):
+    return json.dumps([normalize_address(address), limit, params], sort_keys=True, ensure_ascii=False)
+
+  def _cached(self, key):
+    now = time.time()
+    hit = self._memory.get(key)
+    if hit is not None and now - hit[1] <= self.ttl:
+      return hit[0]
+    if self._db is None:
+      return None
+    with self._db_lock:
+      row = self._db.execute("SELECT candidates, created FROM geocode WHERE key = ?", (key,)).fetchone()
+    if row is None or now - row[1] > self.ttl:
+      return None
+    candidates = json.loads(row[0])
+    self._memory[key] = (candidates, row[1])
+    return candidates
+
+  def _store(self, key, candidates):
+    now = time.time()
+    self._memory[key] = (candidates, now)
+    if self._db is not None:
+      with self._db_lock:
+        self._db.execute(
+          "INSERT OR REPLACE INTO geocode (key, candidates, created) VALUES (?, ?, ?)",
+          (key, json.dumps(candidates, ensure_ascii=False, default=str), now),
+        )
+        self._db.commit()
+
+  def _request(self, address, limit, params):
+    # fila serializada: respeita o intervalo mínimo do backend entre requisições
+    delay = getattr(self.backend, 'min_delay', 0.0)
+    for attempt in range(self.max_retries + 1):
+      with self._rate_lock:
+        wait = self._last_request + delay - time.monotonic()
+        if wait > 0:
+          time.sleep(wait)
+        self._last_request = time.monotonic()
+      try:
+        return self.backend.search(address, limit=limit, **params)
+      except GeocoderRateLimited as e:
+        # 429: espera o Retry-After (ou um intervalo crescente) antes de tentar de novo
+        time.sleep(e.retry_after or delay * (2 ** attempt) or 1.0)
+      except (GeocoderTimedOut, GeocoderUnavailable, GeocoderServiceError) as e:
+        print(f"[geocoding] falha ao geocodificar '{address}' (tentativa {attempt + 1}): {e}")
+        time.sleep(max(delay, 1.0) * (2 ** attempt))
+    return None
+
+  def candidates(self, address, limit=1, **params):
+    """Lista de candidatos {'lat', 'lon', 'display_name', 'raw'} para o endereço."""
+    return self.candidates_many([address], limit=limit, **params)[0]
+
+  def _fetch(self, key, address, limit, params):
+    with span('geocode.request'):
+      found = self._request(address, limit, params)
+    if found is None:
+      # erro de rede: não guarda no cache para tentar de novo depois
+      return []
+    self._store(key, found)
+    return found
+
+  def candidates_many(self, addresses, limit=1, workers=1, **params):
+    """Candidatos para vários endereços; cada endereço distinto vai à rede no máximo uma vez.
+
+    Com workers > 1 as consultas que não estão no cache correm em paralelo: o início de cada uma
+    continua espaçado pelo min_delay do backend, mas a latência de uma se sobrepõe à espera da outra.
+    """
+    keys = [self._key(a, limit, params) for a in addresses]
+    resolved = {}
+    missing = {}
+    for address, key in zip(addresses, keys):
+      if key in resolved or key in missing:
+        continue
+      found = self._cached(key)
+      if found is not None:
+        count('geocode.cache_hit')
+        resolved[key] = found
+      else:
+        count('geocode.cache_miss')
+        missing[key] = address
+    if workers > 1 and len(missing) > 1:
+      with ThreadPoolExecutor(max_workers=min(workers, len(missing))) as pool:
+        futures = {k: pool.submit(self._fetch, k, a, limit, params) for k, a in missing.items()}
+        resolved.update((k, f.result()) for k, f in futures.items())
+    else:
+      resolved.update((k, self._fetch(k, a, limit, params)) for k, a in missing.items())
+    return [resolved[k] for k in keys]
+
+  def geocode(self, address, **params):
+    """(lat, lon) do melhor candidato, ou None."""
+    return self.geocode_many([address], **params)[0]
+
+  def geocode_many(self, addresses, workers=1, **params):
+    return [(c[0]['lat'], c[0]['lon']) if c else None
+            for c in self.candidates_many(addresses, limit=1, workers=workers, **params)]
+
+  def close(self):
+    if self._db is not None:
+      self._db.close()
+      self._db = None
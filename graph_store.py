@@ -0,0 +1,397 @@
+import os
+import json
+import math
+import time
+import hashlib
+
+import numpy as np
+import networkx as nx
+import osmnx as ox
+import shapely
+
+from compiled_graph import CompiledGraph
+from speeds import add_speeds
+from instrumentation import span, count
+
+# Formato dos snapshots; um snapshot de outra versão é descartado na carga e o grafo é refeito
+SNAPSHOT_VERSION = 2
+DEFAULT_STORE_DIR = 'graph_cache'
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3  # 2 GB
+
+# Dimensionamento da área circular a partir do par origem-destino (od_region), usado pelas rotas em
+# lote e pelas imagens sem janela; o main.py usa o corredor de corridor.py
+RADIUS_FACTOR = 0.5
+RADIUS_MARGIN_M = 1500.0
+RADIUS_MIN = 2000.0
+RADIUS_MAX = 15000.0
+
+# Atributos de aresta guardados no snapshot
+FLOAT_EDGE_ATTRS = ('length', 'speed_kph', 'travel_time')
+CATEGORY_EDGE_ATTRS = ('highway', 'name', 'maxspeed', 'oneway')
+
+
+def region_bbox(center, dist):
+  """Mesmo retângulo (north, south, east, west) que ox.graph_from_point usa com dist_type='bbox'."""
+  return tuple(float(c) for c in ox.utils_geo.bbox_from_point(center, dist=dist))
+
+
+def od_region(orig_point, dest_point, factor=RADIUS_FACTOR, margin=RADIUS_MARGIN_M,
+              min_radius=RADIUS_MIN, max_radius=RADIUS_MAX):
+  """(center, radius) do grafo para um par O-D: ponto médio e raio proporcional à distância, com clamp."""
+  center = ((orig_point[0] + dest_point[0]) / 2, (orig_point[1] + dest_point[1]) / 2)
+  od_dist_m = ox.distance.great_circle(orig_point[0], orig_point[1], dest_point[0], dest_point[1])
+  radius = max(min_radius, min(od_dist_m * factor + margin, max_radius))
+  return center, float(radius)
+
+
+def enclosing_region(bboxes):
+  """(center, dist) do menor quadrado de graph_from_point que cobre todos os bboxes."""
+  north = max(b[0] for b in bboxes)
+  south = min(b[1] for b in bboxes)
+  east = max(b[2] for b in bboxes)
+  west = min(b[3] for b in bboxes)
+  center = ((north + south) / 2, (east + west) / 2)
+  # inverso de ox.utils_geo.bbox_from_point
+  dist_ns = math.radians((north - south) / 2) * ox.distance.EARTH_RADIUS_M
+  dist_ew = math.radians((east - west) / 2) * ox.distance.EARTH_RADIUS_M * math.cos(math.radians(center[0]))
+  return center, max(dist_ns, dist_ew) + 1.0
+
+
+def bbox_contains(outer, inner):
+  n1, s1, e1, w1 = outer
+  n2, s2, e2, w2 = inner
+  return n2 <= n1 and s2 >= s1 and e2 <= e1 and w2 >= w1
+
+
+def polygon_bbox(polygon):
+  """(north, south, east, west) de um polígono em lon/lat, na mesma ordem de region_bbox."""
+  west, south, east, north = polygon.bounds
+  return (float(north), float(south), float(east), float(west))
+
+
+def _covers(meta, want_bbox, want_shape):
+  # snapshots de graph_from_point cobrem o bbox inteiro; os de corredor só o polígono salvo
+  if not bbox_contains(meta['bbox'], want_bbox):
+    return False
+  return 'polygon' not in meta or shapely.from_wkt(meta['polygon']).covers(want_shape)
+
+
+def build_graph(center, dist, network_type='drive'):
+  """Pipeline do main.py: download, velocidades, tempos de viagem e projeção."""
+  with span('graph.download', dist=dist):
+    G = ox.graph_from_point(center, dist=dist, network_type=network_type)
+  # velocidades (maxspeed / média por tipo de via) e tempos de viagem numa passada vetorizada
+  with span('graph.speeds'):
+    G = add_speeds(G)
+  with span('graph.project'):
+    G_proj = ox.project_graph(G)
+  return G, G_proj
+
+
+def _encode_category(values):
+  # valores arbitrários (str, listas, bool) viram códigos inteiros + tabela JSON
+  table = {}
+  codes = np.full(len(values), -1, dtype=np.int32)
+  for i, v in enumerate(values):
+    if v is None:
+      continue
+    key = json.dumps(v, sort_keys=True, default=str)
+    codes[i] = table.setdefault(key, len(table))
+  return codes, list(table)
+
+
+def _decode_category(codes, table):
+  decoded = [json.loads(t) for t in table]
+  return [decoded[c] if c >= 0 else None for c in codes.tolist()]
+
+
+def _flatten_geometry(geoms):
+  coords, index = shapely.get_coordinates(geoms, return_index=True)
+  offsets = np.zeros(len(geoms) + 1, dtype=np.int64)
+  np.cumsum(np.bincount(index, minlength=len(geoms)), out=offsets[1:])
+  return coords, offsets
+
+
+def _unflatten_geometry(coords, offsets):
+  # (índices das arestas com geometria, LineStrings correspondentes)
+  counts = np.diff(offsets)
+  has = np.flatnonzero(counts)
+  if not len(has):
+    return [], []
+  return has.tolist(), shapely.linestrings(coords, indices=np.repeat(np.arange(len(has)), counts[has]))
+
+
+def graph_to_arrays(G, G_proj):
+  """Converte (G, G_proj) em arrays + cabeçalho de metadados."""
+  node_ids = list(G.nodes)
+  index = {n: i for i, n in enumerate(node_ids)}
+  arrays = {
+    'node_ids': np.asarray(node_ids, dtype=np.int64),
+    'lat': np.fromiter((G.nodes[n]['y'] for n in node_ids), dtype=np.float64, count=len(node_ids)),
+    'lon': np.fromiter((G.nodes[n]['x'] for n in node_ids), dtype=np.float64, count=len(node_ids)),
+    'x': np.fromiter((G_proj.nodes[n]['x'] for n in node_ids), dtype=np.float64, count=len(node_ids)),
+    'y': np.fromiter((G_proj.nodes[n]['y'] for n in node_ids), dtype=np.float64, count=len(node_ids)),
+    'street_count': np.fromiter((G.nodes[n].get('street_count', -1) for n in node_ids), dtype=np.int32, count=len(node_ids)),
+  }
+  # mesma ordem de G.edges(keys=True): agrupada por u e, dentro dele, por v (ordem de G._adj)
+  edges = list(G.edges(keys=True, data=True))
+  arrays['edge_u'] = np.fromiter((index[u] for u, _, _, _ in edges), dtype=np.int32, count=len(edges))
+  arrays['edge_v'] = np.fromiter((index[v] for _, v, _, _ in edges), dtype=np.int32, count=len(edges))
+  arrays['edge_key'] = np.fromiter((k for _, _, k, _ in edges), dtype=np.int32, count=len(edges))
+  for attr in FLOAT_EDGE_ATTRS:
+    arrays[attr] = np.fromiter((d.get(attr, np.nan) for _, _, _, d in edges), dtype=np.float64, count=len(edges))
+  categories = {}
+  for attr in CATEGORY_EDGE_ATTRS:
+    arrays[attr], categories[attr] = _encode_category([d.get(attr) for _, _, _, d in edges])
+  # geometria das arestas (curvas), em lon/lat e projetada: buffer plano + offsets por aresta
+  # (o project_graph preenche geometria reta em todas as arestas, por isso offsets separados)
+  geoms = [d.get('geometry') for _, _, _, d in edges]
+  geoms_proj = [G_proj.edges[u, v, k].get('geometry') for u, v, k, _ in edges]
+  arrays['geom_lonlat'], arrays['geom_offsets'] = _flatten_geometry(geoms)
+  arrays['geom_xy'], arrays['geom_xy_offsets'] = _flatten_geometry(geoms_proj)
+  header = {
+    'version': SNAPSHOT_VERSION,
+    'crs': str(G.graph.get('crs')),
+    'crs_proj': str(G_proj.graph.get('crs')),
+    'categories': categories,
+  }
+  return arrays, header
+
+
+def write_npz(path, arrays, header):
+  """Grava arrays + cabeçalho JSON num .npz (via arquivo temporário, para não deixar snapshot pela metade)."""
+  tmp = path + '.tmp.npz'
+  payload = dict(arrays)
+  payload['header'] = np.frombuffer(json.dumps(header).encode('utf-8'), dtype=np.uint8)
+  np.savez(tmp, **payload)
+  os.replace(tmp, path)
+
+
+def read_npz(path):
+  """(arrays, cabeçalho) de um .npz gravado por write_npz."""
+  with np.load(path) as data:
+    arrays = {k: data[k] for k in data.files if k != 'header'}
+    header = json.loads(bytes(data['header']).decode('utf-8'))
+  return arrays, header
+
+
+def arrays_to_graphs(arrays, header):
+  """Reconstrói (G, G_proj) a partir de um snapshot."""
+  node_ids = arrays['node_ids'].tolist()
+  lat, lon = arrays['lat'].tolist(), arrays['lon'].tolist()
+  x, y = arrays['x'].tolist(), arrays['y'].tolist()
+  street_count = arrays['street_count'].tolist()
+
+  G = nx.MultiDiGraph(crs=header['crs'])
+  G_proj = nx.MultiDiGraph(crs=header['crs_proj'])
+  G.add_nodes_from((n, {'y': lat[i], 'x': lon[i]}) for i, n in enumerate(node_ids))
+  G_proj.add_nodes_from((n, {'y': y[i], 'x': x[i], 'lat': lat[i], 'lon': lon[i]}) for i, n in enumerate(node_ids))
+  for i, n in enumerate(node_ids):
+    if street_count[i] >= 0:
+      G.nodes[n]['street_count'] = G_proj.nodes[n]['street_count'] = street_count[i]
+
+  cols = {}
+  for attr in FLOAT_EDGE_ATTRS:
+    cols[attr] = arrays[attr].tolist()
+  for attr in CATEGORY_EDGE_ATTRS:
+    cols[attr] = _decode_category(arrays[attr], header['categories'][attr])
+  names = list(cols)
+  edge_u, edge_v, edge_key = arrays['edge_u'].tolist(), arrays['edge_v'].tolist(), arrays['edge_key'].tolist()
+  edges = [
+    # descarta atributos ausentes (None) ou NaN
+    (node_ids[u], node_ids[v], k, {a: val for a, val in zip(names, row) if val is not None and val == val})
+    for u, v, k, row in zip(edge_u, edge_v, edge_key, zip(*(cols[a] for a in names)))
+  ]
+  G.add_edges_from(edges)
+  G_proj.add_edges_from(edges)
+  # o snapshot já guarda speed_kph/travel_time: o enriquecimento não roda de novo
+  if len(edges) and not np.isnan(arrays['speed_kph']).all():
+    G.graph['speeds_imputed'] = G_proj.graph['speeds_imputed'] = True
+  if 'geom_offsets' in arrays:
+    _attach_geometry(G, G_proj, node_ids, edge_u, edge_v, edge_key, arrays)
+  return G, G_proj
+
+
+def _attach_geometry(G, G_proj, node_ids, edge_u, edge_v, edge_key, arrays):
+  # snapshots da versão 1 não têm geometria: as arestas continuam retas
+  for graph, coords, offsets in ((G, 'geom_lonlat', 'geom_offsets'), (G_proj, 'geom_xy', 'geom_xy_offsets')):
+    for i, line in zip(*_unflatten_geometry(arrays[coords], arrays[offsets])):
+      graph[node_ids[edge_u[i]]][node_ids[edge_v[i]]][edge_key[i]]['geometry'] = line
+
+
+def arrays_to_compiled(arrays, weights=('length', 'travel_time')):
+  """Monta o CompiledGraph direto dos arrays, sem passar pelo networkx."""
+  u = arrays['edge_u'].astype(np.int64)
+  v = arrays['edge_v'].astype(np.int64)
+  n = len(arrays['node_ids'])
+  # arestas paralelas são consecutivas: cada corrida (u, v) vira uma entrada do CSR
+  starts = np.flatnonzero(np.r_[True, (u[1:] != u[:-1]) | (v[1:] != v[:-1])]) if len(u) else np.zeros(0, dtype=np.int64)
+  cols = {}
+  for k in weights:
+    w = np.where(np.isnan(arrays[k]), 1.0, arrays[k])  # nx usa peso 1 quando o atributo falta
+    cols[k] = np.minimum.reduceat(w, starts) if len(starts) else w
+  offsets = np.searchsorted(u[starts], np.arange(n + 1), side='left')
+  return CompiledGraph(
+    arrays['node_ids'], offsets, v[starts], cols,
+    arrays['lat'], arrays['lon'], arrays['x'], arrays['y'],
+  )
+
+
+class GraphStore:
+  """Snapshots binários de grafos já enriquecidos e projetados, com despejo LRU por tamanho em disco."""
+
+  def __init__(self, directory=DEFAULT_STORE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+    self.directory = directory
+    self.max_bytes = max_bytes
+    os.makedirs(directory, exist_ok=True)
+    self._index_path = os.path.join(directory, 'index.json')
+    self._index = self._read_index()
+
+  def _read_index(self):
+    try:
+      with open(self._index_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+    except (OSError, ValueError):
+      return {}
+
+  def _write_index(self):
+    tmp = self._index_path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+      json.dump(self._index, f)
+    os.replace(tmp, self._index_path)
+
+  def _path(self, key, name='graph'):
+    return os.path.join(self.directory, f"{key}.{name}.npz")
+
+  def find(self, center, dist, network_type='drive'):
+    """Chave do menor snapshot cuja área contém a área pedida (ou None)."""
+    north, south, east, west = want = region_bbox(center, dist)
+    return self._find(want, shapely.box(west, south, east, north), network_type)
+
+  def find_polygon(self, polygon, network_type='drive'):
+    """Chave do menor snapshot que cobre o polígono (lon/lat), ex.: um corredor O-D."""
+    return self._find(polygon_bbox(polygon), polygon, network_type)
+
+  def _find(self, want_bbox, want_shape, network_type):
+    best = None
+    for key, meta in self._index.items():
+      if meta['network_type'] != network_type or not _covers(meta, want_bbox, want_shape):
+        continue
+      if not os.path.exists(self._path(key)):
+        continue
+      if best is None or meta['bytes'] < self._index[best]['bytes']:
+        best = key
+    return best
+
+  def _touch(self, key):
+    self._index[key]['last_used'] = time.time()
+    self._write_index()
+
+  def load_arrays(self, key):
+    """(arrays, cabeçalho) do snapshot, ou None se ele for de outra versão do formato (e é descartado)."""
+    arrays, header = read_npz(self._path(key))
+    if header.get('version') != SNAPSHOT_VERSION:
+      count('graph_store.stale')
+      self._discard(key)
+      self._write_index()
+      return None
+    self._touch(key)
+    return arrays, header
+
+  def load(self, key):
+    """(G, G_proj) do snapshot, ou None se ele estava num formato antigo (tratar como falta)."""
+    loaded = self.load_arrays(key)
+    return None if loaded is None else arrays_to_graphs(*loaded)
+
+  def load_compiled(self, key):
+    loaded = self.load_arrays(key)
+    return None if loaded is None else arrays_to_compiled(loaded[0])
+
+  def get(self, center, dist, network_type='drive'):
+    """(G, G_proj) de um snapshot que cobre a área, ou None se não houver."""
+    key = self.find(center, dist, network_type)
+    return None if key is None else self.load(key)
+
+  def save(self, G, G_proj, center, dist, network_type='drive', polygon=None):
+    """Salva o grafo de graph_from_point(center, dist) ou, com polygon, de graph_from_polygon (dist = None)."""
+    area = {}
+    if polygon is None:
+      bbox = region_bbox(center, dist)
+      ident = [network_type, [round(c, 6) for c in bbox]]
+    else:
+      bbox = polygon_bbox(polygon)
+      area['polygon'] = shapely.to_wkt(polygon, rounding_precision=-1)
+      ident = [network_type, area['polygon']]
+    key = hashlib.sha1(json.dumps(ident).encode()).hexdigest()[:16]
+    arrays, header = graph_to_arrays(G, G_proj)
+    header.update({'center': list(center), 'dist': dist, 'network_type': network_type, 'bbox': bbox, **area})
+    write_npz(self._path(key), arrays, header)
+    now = time.time()
+    self._index[key] = {
+      'center': list(center), 'dist': dist, 'network_type': network_type, 'bbox': bbox, **area,
+      'bytes': os.path.getsize(self._path(key)), 'created': now, 'last_used': now,
+    }
+    self._evict(keep=key)
+    self._write_index()
+    return key
+
+  def save_extra(self, key, name, arrays, header=None):
+    """Guarda arrays auxiliares (ex.: tabelas de landmarks) junto ao snapshot `key`."""
+    path = self._path(key, name)
+    write_npz(path, arrays, header or {})
+    meta = self._index[key]
+    meta.setdefault('extras', {})[name] = os.path.getsize(path)
+    self._evict(keep=key)
+    self._write_index()
+
+  def load_extra(self, key, name):
+    """Arrays auxiliares do snapshot `key` (ou None se ainda não foram salvos)."""
+    path = self._path(key, name)
+    if key not in self._index or not os.path.exists(path):
+      return None
+    return read_npz(path)
+
+  def _entry_bytes(self, meta):
+    return meta['bytes'] + sum(meta.get('extras', {}).values())
+
+  def total_bytes(self):
+    return sum(self._entry_bytes(m) for m in self._index.values())
+
+  def _evict(self, keep=None):
+    # remove os snapshots usados há mais tempo até caber no limite
+    by_age = sorted(self._index, key=lambda k: self._index[k]['last_used'])
+    total = self.total_bytes()
+    for key in by_age:
+      if total <= self.max_bytes:
+        break
+      if key == keep:
+        continue
+      total -= self._entry_bytes(self._discard(key))
+
+  def _discard(self, key):
+    # tira o snapshot (e os extras) do índice e do disco; devolve a entrada removida
+    meta = self._index.pop(key)
+    for name in ['graph'] + list(meta.get('extras', {})):
+      try:
+        os.remove(self._path(key, name))
+      except OSError:
+        pass
+    return meta
+
+
+def get_graph(center, dist, network_type='drive', store=None):
+  """(G, G_proj) enriquecidos e projetados: do snapshot em disco se houver, senão baixa e salva."""
+  if store is None:
+    store = GraphStore()
+  key = store.find(center, dist, network_type)
+  if key is not None:
+    with span('graph.load', key=key):
+      graphs = store.load(key)
+    if graphs is not None:
+      count('graph_store.hit')
+      return graphs
+  count('graph_store.miss')
+  G, G_proj = build_graph(center, dist, network_type)
+  with span('graph.save'):
+    store.save(G, G_proj, center, dist, network_type)
+  return G, G_proj
@@ -0,0 +1,178 @@
+import os
+import math
+import argparse
+
+# sem display: o SDL desenha em memória (precisa vir antes do import do pygame)
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import numpy as np
+import pygame
+
+from renderer import StreetRenderer, LayerCache, to_pixels
+from edge_geometry import EdgeGeometry, route_polyline
+from animation import RouteAnimation
+from drawing import (
+  COL_BG, COL_ROAD_CASING, COL_ROAD_INNER,
+  edge_styles, fmt_km, fmt_eta, draw_top_bar, draw_bottom_sheet, draw_route, draw_endpoints,
+  draw_vehicle_marker,
+)
+from graph_store import GraphStore, get_graph
+from snapping import snap_index_for
+from batch_routing import read_pairs, resolve_points, group_by_region, solve_group
+from route_metrics import metrics_for
+from instrumentation import enable, span
+
+# O enquadramento de cada rota é arredondado para um nível de zoom em passos de ZOOM_STEP; rotas no
+# mesmo nível reaproveitam os tiles já desenhados (o LayerCache é alinhado ao mundo, não à rota)
+ZOOM_STEP = math.sqrt(2)
+MAX_ZOOM_LEVEL = 10
+MAX_TILES = 2048
+TOP_BAR_H = 60
+BOTTOM_SHEET_H = 110
+
+
+class HeadlessRenderer:
+  """Desenha rotas de um grafo projetado numa Surface fora da tela (PNG ou sequência de quadros).
+
+  Fontes, geometria das ruas e o cache de tiles são criados uma vez por grafo e servem a
+  todas as rotas renderizadas com a mesma instância.
+  """
+
+  def __init__(self, G_proj, size=(1000, 700), margin=40, max_tiles=MAX_TILES):
+    pygame.init()
+    self.G_proj = G_proj
+    self.size = (int(size[0]), int(size[1]))
+    self.margin = margin
+    self.font = pygame.font.SysFont(None, 22)
+    widths, highways = edge_styles(G_proj)
+    self.street_renderer = StreetRenderer(EdgeGeometry.from_graph(G_proj), widths, highways)
+    self.street_layer = LayerCache(self.street_renderer, COL_BG, COL_ROAD_INNER, COL_ROAD_CASING,
+                                   max_tiles=max_tiles, max_zoom_levels=MAX_ZOOM_LEVEL + 1)
+    # escala em que o grafo inteiro cabe na imagem (zoom 1.0, como no main.py)
+    xs = [d['x'] for _, d in G_proj.nodes(data=True)]
+    ys = [d['y'] for _, d in G_proj.nodes(data=True)]
+    w, h = self.size
+    sx = (w - 2 * margin) / (max(xs) - min(xs)) if max(xs) > min(xs) else 1.0
+    sy = (h - 2 * margin) / (max(ys) - min(ys)) if max(ys) > min(ys) else 1.0
+    self.base_scale = min(sx, sy)
+
+  def frame_for(self, route_xy):
+    """(k, zoom, ox, oy) que enquadram a rota entre a barra superior e o painel inferior."""
+    w, h = self.size
+    pts = np.asarray(route_xy, dtype=np.float64).reshape(-1, 2)
+    (x0, y0), (x1, y1) = pts.min(axis=0), pts.max(axis=0)
+    avail_w = w - 2 * self.margin
+    avail_h = h - TOP_BAR_H - BOTTOM_SHEET_H - 2 * self.margin
+    fit = min(avail_w / (x1 - x0) if x1 > x0 else math.inf, avail_h / (y1 - y0) if y1 > y0 else math.inf)
+    level = 0 if math.isinf(fit) else int(math.floor(math.log(fit / self.base_scale, ZOOM_STEP)))
+    level = min(max(level, 0), MAX_ZOOM_LEVEL)
+    zoom = ZOOM_STEP ** level
+    k = self.base_scale * zoom
+    cx, cy = (x0 + x1) / 2, (y0 + y1) / 2
+    ox = math.floor(w / 2 - cx * k)
+    oy = math.floor(TOP_BAR_H + (h - TOP_BAR_H - BOTTOM_SHEET_H) / 2 + cy * k)
+    return k, zoom, ox, oy
+
+  def _stats(self, path, total_len, total_time, travelled=None):
+    lines = [f"{fmt_eta(total_time)} • {fmt_km(total_len)}"]
+    if travelled is None:
+      lines.append(f"Nós da rota: {len(path)}")
+    else:
+      lines.append(f"Nós da rota: {len(path)}  •  Percorrido: {fmt_km(travelled)}")
+    return lines
+
+  def _base(self, path, title, G=None):
+    # ruas + rota + marcadores + barra superior: a parte que não muda entre quadros
+    route_xy = route_polyline(self.G_proj, path)
+    k, zoom, ox, oy = self.frame_for(route_xy)
+    surface = pygame.Surface(self.size)
+    surface.fill(COL_BG)
+    self.street_layer.draw(surface, k, zoom, ox, oy)
+    route_scr = to_pixels(route_xy, k, ox, oy).tolist()
+    draw_route(surface, route_scr, zoom)
+    draw_endpoints(surface, route_scr[0], route_scr[-1])
+    if title:
+      draw_top_bar(surface, title, self.font)
+    totals = metrics_for(G if G is not None else self.G_proj).totals(path)
+    return surface, (k, ox, oy), totals
+
+  def render(self, path, title=None, G=None):
+    """Imagem estática da rota (Surface). G (não projetado) é usado nas estatísticas, se dado."""
+    surface, _, (total_len, total_time) = self._base(path, title, G)
+    draw_bottom_sheet(surface, self._stats(path, total_len, total_time), self.font)
+    return surface
+
+  def save_png(self, path, filename, title=None, G=None):
+    pygame.image.save(self.render(path, title, G), filename)
+    return filename
+
+  def save_frames(self, path, directory, fps=30, speed=20.0, title=None, G=None):
+    """Quadros frame_00000.png, ... da animação do veículo (tempo de viagem / speed); devolve quantos."""
+    os.makedirs(directory, exist_ok=True)
+    base, (k, ox, oy), (total_len, total_time) = self._base(path, title, G)
+    anim = RouteAnimation.from_route(self.G_proj, path, speed=speed)
+    n_frames = max(1, int(math.ceil(anim.duration * fps)) + 1)
+    frame = pygame.Surface(self.size)
+    heading = 0.0
+    for i in range(n_frames):
+      x, y, target, travelled = anim.state(i / fps)
+      heading = target if target is not None else heading
+      frame.blit(base, (0, 0))
+      draw_vehicle_marker(frame, to_pixels((x, y), k, ox, oy)[0].tolist(), heading)
+      draw_bottom_sheet(frame, self._stats(path, total_len, total_time, travelled), self.font)
+      pygame.image.save(frame, os.path.join(directory, f"frame_{i:05d}.png"))
+    return n_frames
+
+
+def _size(text):
+  w, _, h = text.lower().partition('x')
+  return int(w), int(h)
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Renderiza rotas em lote (PNG ou quadros) sem abrir janela.")
+  parser.add_argument('input', help="CSV ou JSONL com os pares O-D (mesmo formato do batch_routing.py)")
+  parser.add_argument('-o', '--output-dir', default='renders')
+  parser.add_argument('--frames', action='store_true', help="grava a animação quadro a quadro em vez de um PNG")
+  parser.add_argument('--fps', type=int, default=30)
+  parser.add_argument('--speed', type=float, default=20.0, help="fator de reprodução da animação")
+  parser.add_argument('--size', type=_size, default=(1000, 700), help="LARGURAxALTURA em pixels")
+  parser.add_argument('--weight', default='length', choices=('length', 'travel_time'))
+  parser.add_argument('--network-type', default='drive')
+  parser.add_argument('--store-dir', default='graph_cache')
+  parser.add_argument('--trace', help="grava spans/contadores em .json (trace do Chrome) ou .jsonl")
+  args = parser.parse_args()
+  if not os.path.exists(args.input):
+    raise SystemExit(f"Erro: arquivo não encontrado: {args.input}")
+  if args.trace:
+    enable(args.trace)
+
+  os.makedirs(args.output_dir, exist_ok=True)
+  store = GraphStore(args.store_dir)
+  rows = [r for r in resolve_points(read_pairs(args.input)) if r['orig_point'] and r['dest_point']]
+  done = 0
+  for (center, dist), members in group_by_region(rows):
+    # um grafo e um renderer (tiles, fontes) por região, para todas as rotas do grupo
+    G, G_proj = get_graph(center, dist, network_type=args.network_type, store=store)
+    snap_index = snap_index_for(G, store, store.find(center, dist, args.network_type))
+    renderer = HeadlessRenderer(G_proj, size=args.size)
+    by_id = {r['id']: r for r in members}
+    for result in solve_group(G, members, weight=args.weight, snap_index=snap_index):
+      if 'nodes' not in result:
+        print(f"[headless] {result['id']}: sem rota")
+        continue
+      row = by_id[result['id']]
+      title = f"Rota: {row.get('orig_address') or row['orig_point']} -> {row.get('dest_address') or row['dest_point']}"
+      out = os.path.join(args.output_dir, str(result['id']))
+      with span('render', id=result['id']):
+        if args.frames:
+          renderer.save_frames(result['nodes'], out, fps=args.fps, speed=args.speed, title=title, G=G)
+        else:
+          renderer.save_png(result['nodes'], out + '.png', title=title, G=G)
+      done += 1
+  print(f"[headless] {done} rotas renderizadas em {args.output_dir}")
+  pygame.quit()
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,102 @@
+import math
+import weakref
+
+import numpy as np
+import osmnx as ox
+
+from compiled_graph import CompiledGraph
+
+# Grafos networkx já compilados (evita recompilar a cada destino)
+_compiled_cache = weakref.WeakKeyDictionary()
+# Razões distância/peso por grafo compilado, calculadas uma vez por (tipo, peso)
+_ratio_cache = weakref.WeakKeyDictionary()
+
+
+class DestinationHeuristic:
+  """Heurística pré-calculada para um destino fixo (values[i] = estimativa do nó i até o destino).
+
+  value_list é a mesma tabela como lista Python, convertida uma vez por destino: é o que o laço
+  quente do A* lê (passe heuristic=h.value_list para não converter o array a cada consulta).
+  """
+
+  def __init__(self, cg, target, values):
+    self.cg = cg
+    self.target = target
+    self.values = values
+    self.value_list = values.tolist()
+
+  def __call__(self, u, v):
+    # drop-in para o argumento heuristic= do nx.astar_path (recebe ids de nós)
+    if v != self.target:
+      raise ValueError(f"Heurística calculada para o destino {self.target}, não para {v}")
+    return self.value_list[self.cg.index_of(u)]
+
+
+def compiled_for(graph, G_proj=None):
+  """Aceita um CompiledGraph ou um grafo networkx (compilado uma vez e mantido em cache)."""
+  if isinstance(graph, CompiledGraph):
+    return graph
+  cg = _compiled_cache.get(graph)
+  if cg is None or (G_proj is not None and cg.x is None):
+    cg = CompiledGraph.from_graph(graph, G_proj)
+    _compiled_cache[graph] = cg
+  return cg
+
+
+def _edge_sources(cg):
+  return np.repeat(np.arange(cg.n_nodes), np.diff(cg.offsets))
+
+
+def _max_ratio(cg, kind, weight):
+  # maior razão distância/peso entre as arestas. Uma aresta de peso nulo (ou negativo) entre pontos
+  # distintos não tem razão finita: nesse caso a razão é infinita e a heurística vira zero (Dijkstra),
+  # que continua admissível; arestas de peso nulo sem deslocamento não limitam nada e são ignoradas
+  ratios = _ratio_cache.setdefault(cg, {})
+  if (kind, weight) in ratios:
+    return ratios[(kind, weight)]
+  src = _edge_sources(cg)
+  dst = cg.targets
+  if kind == 'projected':
+    edge_dist = np.hypot(cg.x[dst] - cg.x[src], cg.y[dst] - cg.y[src])
+  else:
+    edge_dist = ox.distance.great_circle(cg.lat[src], cg.lon[src], cg.lat[dst], cg.lon[dst])
+  w = cg.weights[weight]
+  mask = w > 0
+  if np.any(edge_dist[~mask] > 0):
+    ratio = math.inf
+  else:
+    ratio = float(np.max(edge_dist[mask] / w[mask])) if mask.any() else 1.0
+  ratios[(kind, weight)] = ratio
+  return ratio
+
+
+def great_circle_heuristic(graph, target, weight='length'):
+  """Distância geodésica até o destino para todos os nós em uma única passada NumPy.
+
+  Com weight='length' é a mesma heurística do main.py. Para outros pesos (ex.: travel_time)
+  a distância é dividida pela maior razão geodésica/peso das arestas, o que a mantém admissível.
+  """
+  cg = compiled_for(graph)
+  t = cg.index_of(target)
+  values = ox.distance.great_circle(cg.lat, cg.lon, cg.lat[t], cg.lon[t])
+  if weight != 'length':
+    values = values / _max_ratio(cg, 'great_circle', weight)
+  return DestinationHeuristic(cg, target, values)
+
+
+def projected_heuristic(graph, target, weight='length', G_proj=None):
+  """Distância euclidiana no CRS projetado (G_proj), mais barata que a geodésica.
+
+  Admissível por construção: se r = max(euclid(u, v) / peso(u, v)) sobre as arestas, então
+  para qualquer caminho P de u até t, peso(P) >= soma(euclid(e)) / r >= euclid(u, t) / r
+  (desigualdade triangular no plano). Por isso dividimos a distância euclidiana por r.
+  """
+  cg = compiled_for(graph, G_proj)
+  if cg.x is None:
+    raise ValueError("projected_heuristic precisa das coordenadas projetadas (passe G_proj)")
+  t = cg.index_of(target)
+  values = np.hypot(cg.x - cg.x[t], cg.y - cg.y[t])
+  ratio = _max_ratio(cg, 'projected', weight)
+  if ratio > 0:
+    values = values / ratio
+  return DestinationHeuristic(cg, target, values)
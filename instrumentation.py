@@ -0,0 +1,172 @@
+import os
+import json
+import math
+import time
+import atexit
+import threading
+from contextlib import nullcontext
+
+# Variável de ambiente que liga a instrumentação: caminho do arquivo de saída
+# (.json = trace do Chrome/Perfetto, qualquer outra extensão = JSON lines)
+ENV_VAR = 'ROTA_TRACE'
+
+# Tracer ativo; None = desligado (span/count/observe viram praticamente no-op)
+_tracer = None
+_NULL_SPAN = nullcontext()
+
+
+class Histogram:
+  """Contagem por faixas de potência de 2 (faixa k = valores em (2^(k-1), 2^k]), mais soma/mín/máx."""
+
+  def __init__(self):
+    self.buckets = {}
+    self.n = 0
+    self.total = 0.0
+    self.min = math.inf
+    self.max = -math.inf
+
+  def add(self, value):
+    k = math.ceil(math.log2(value)) if value > 0 else None
+    self.buckets[k] = self.buckets.get(k, 0) + 1
+    self.n += 1
+    self.total += value
+    self.min = min(self.min, value)
+    self.max = max(self.max, value)
+
+  def quantile(self, q):
+    """Limite superior da faixa que contém o quantil q (estimativa por cima)."""
+    target = q * self.n
+    seen = 0
+    for k in sorted(self.buckets, key=lambda b: -math.inf if b is None else b):
+      seen += self.buckets[k]
+      if seen >= target:
+        return 0.0 if k is None else min(2.0 ** k, self.max)
+    return self.max
+
+  def summary(self):
+    if not self.n:
+      return {'n': 0}
+    return {
+      'n': self.n, 'mean': self.total / self.n, 'min': self.min, 'max': self.max,
+      'p50': self.quantile(0.5), 'p95': self.quantile(0.95), 'p99': self.quantile(0.99),
+      'buckets': {('0' if k is None else f"<={2.0 ** k:g}"): c
+                  for k, c in sorted(self.buckets.items(), key=lambda kv: -math.inf if kv[0] is None else kv[0])},
+    }
+
+
+class _Span:
+  __slots__ = ('tracer', 'name', 'args', 't0')
+
+  def __init__(self, tracer, name, args):
+    self.tracer = tracer
+    self.name = name
+    self.args = args
+
+  def __enter__(self):
+    self.t0 = time.perf_counter()
+    return self
+
+  def __exit__(self, *exc):
+    self.tracer._add_span(self.name, self.t0, time.perf_counter(), self.args)
+    return False
+
+
+class Tracer:
+  """Guarda spans, contadores e histogramas em memória e grava tudo em close()."""
+
+  def __init__(self, path):
+    self.path = path
+    self.chrome = path.endswith('.json')
+    self.pid = os.getpid()
+    self.t0 = time.perf_counter()
+    self.spans = []
+    self.counters = {}
+    self.histograms = {}
+    self._lock = threading.Lock()
+
+  def _us(self, t):
+    return (t - self.t0) * 1e6
+
+  def _add_span(self, name, t0, t1, args):
+    event = {'name': name, 'ts': self._us(t0), 'dur': self._us(t1) - self._us(t0), 'tid': threading.get_ident()}
+    if args:
+      event['args'] = args
+    with self._lock:
+      self.spans.append(event)
+
+  def span(self, name, **args):
+    return _Span(self, name, args)
+
+  def count(self, name, n=1):
+    with self._lock:
+      self.counters[name] = self.counters.get(name, 0) + n
+
+  def observe(self, name, value):
+    with self._lock:
+      hist = self.histograms.get(name)
+      if hist is None:
+        hist = self.histograms[name] = Histogram()
+      hist.add(value)
+
+  def close(self):
+    with self._lock:
+      end = self._us(time.perf_counter())
+      histograms = {k: h.summary() for k, h in self.histograms.items()}
+      with open(self.path, 'w', encoding='utf-8') as f:
+        if self.chrome:
+          events = [dict(e, ph='X', pid=self.pid, cat='stage') for e in self.spans]
+          events.extend({'name': k, 'ph': 'C', 'ts': end, 'pid': self.pid, 'args': {'value': v}}
+                        for k, v in self.counters.items())
+          json.dump({'traceEvents': events, 'displayTimeUnit': 'ms',
+                     'otherData': {'counters': self.counters, 'histograms': histograms}}, f)
+        else:
+          for e in self.spans:
+            f.write(json.dumps(dict(e, type='span', dur_ms=e['dur'] / 1000)) + '\n')
+          for k, v in self.counters.items():
+            f.write(json.dumps({'type': 'counter', 'name': k, 'value': v}) + '\n')
+          for k, h in histograms.items():
+            f.write(json.dumps(dict(h, type='histogram', name=k)) + '\n')
+
+
+def enable(path):
+  """Liga a instrumentação gravando em `path` na saída do processo (ou em disable())."""
+  global _tracer
+  if _tracer is not None:
+    disable()
+  _tracer = Tracer(path)
+  atexit.register(disable)
+  return _tracer
+
+
+def enable_from_env():
+  path = os.environ.get(ENV_VAR)
+  return enable(path) if path else None
+
+
+def disable():
+  """Grava o arquivo e desliga."""
+  global _tracer
+  tracer, _tracer = _tracer, None
+  if tracer is not None:
+    tracer.close()
+
+
+def enabled():
+  return _tracer is not None
+
+
+def span(name, **args):
+  """Context manager que mede um estágio: `with span('graph.load'): ...`."""
+  if _tracer is None:
+    return _NULL_SPAN
+  return _tracer.span(name, **args)
+
+
+def count(name, n=1):
+  if _tracer is not None:
+    _tracer.count(name, n)
+
+
+def observe(name, value):
+  if _tracer is not None:
+    _tracer.observe(name, value)
@@ -0,0 +1,79 @@
+import numpy as np
+
+from compiled_graph import dijkstra_distances
+
+DEFAULT_LANDMARKS = 8
+
+
+class Landmarks:
+  """Tabelas de distância de/para k landmarks, usadas como heurística ALT (A*, Landmarks, desigualdade triangular)."""
+
+  def __init__(self, nodes, from_landmark, to_landmark, weight='length'):
+    self.nodes = np.asarray(nodes, dtype=np.int64)
+    self.from_landmark = np.asarray(from_landmark, dtype=np.float64)  # (k, n): d(L, v)
+    self.to_landmark = np.asarray(to_landmark, dtype=np.float64)      # (k, n): d(v, L)
+    self.weight = weight
+
+  @classmethod
+  def compute(cls, cg, k=DEFAULT_LANDMARKS, weight='length', seed=0):
+    """Escolhe landmarks pela estratégia "mais distante" e roda uma Dijkstra de ida e outra de volta por landmark."""
+    k = min(k, cg.n_nodes)
+    rng = np.random.default_rng(seed)
+    start = int(rng.integers(cg.n_nodes))
+    # o primeiro landmark é o nó mais distante de um nó aleatório
+    d0 = dijkstra_distances(cg, start, weight)
+    nodes, rows_from, rows_to = [], [], []
+    closest = np.full(cg.n_nodes, np.inf)
+    candidate = _farthest(d0, start)
+    for _ in range(k):
+      if candidate in nodes:
+        break
+      nodes.append(candidate)
+      rows_from.append(dijkstra_distances(cg, candidate, weight))
+      rows_to.append(dijkstra_distances(cg, candidate, weight, reverse=True))
+      closest = np.minimum(closest, rows_from[-1])
+      closest[nodes] = -1.0
+      candidate = _farthest(closest, candidate)
+    return cls(nodes, np.vstack(rows_from), np.vstack(rows_to), weight)
+
+  def heuristic(self, target):
+    """Limite inferior de d(v, target) para todos os nós v (target é índice interno)."""
+    # d(v, t) >= d(v, L) - d(t, L)   e   d(v, t) >= d(L, t) - d(L, v)
+    with np.errstate(invalid='ignore'):
+      a = self.to_landmark - self.to_landmark[:, target:target + 1]
+      b = self.from_landmark[:, target:target + 1] - self.from_landmark
+    # inf - inf (ambos inalcançáveis) não informa nada
+    bound = np.fmax(np.nan_to_num(a, nan=0.0, posinf=np.inf), np.nan_to_num(b, nan=0.0, posinf=np.inf)).max(axis=0)
+    return np.maximum(bound, 0.0)
+
+  def to_arrays(self):
+    return {'nodes': self.nodes, 'from_landmark': self.from_landmark, 'to_landmark': self.to_landmark}
+
+  def save(self, store, key):
+    store.save_extra(key, f'landmarks_{self.weight}', self.to_arrays(), {'weight': self.weight})
+
+  @classmethod
+  def load(cls, store, key, weight='length'):
+    extra = store.load_extra(key, f'landmarks_{weight}')
+    if extra is None:
+      return None
+    arrays, header = extra
+    return cls(arrays['nodes'], arrays['from_landmark'], arrays['to_landmark'], header.get('weight', weight))
+
+
+def _farthest(dist, fallback):
+  finite = np.where(np.isfinite(dist), dist, -1.0)
+  best = int(np.argmax(finite))
+  return best if finite[best] > 0 else fallback
+
+
+def landmarks_for(cg, weight='length', store=None, key=None, k=DEFAULT_LANDMARKS):
+  """Landmarks do grafo: lidos do snapshot (store, key) se já existirem, senão calculados e salvos junto."""
+  if store is not None and key is not None:
+    lm = Landmarks.load(store, key, weight)
+    if lm is not None and lm.from_landmark.shape[1] == cg.n_nodes:
+      return lm
+  lm = Landmarks.compute(cg, k=k, weight=weight)
+  if store is not None and key is not None:
+    lm.save(store, key)
+  return lm
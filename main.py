@@ -1,27 +1,66 @@
 import os
 import math
+import time
+import threading
+from concurrent.futures import Future
+import numpy as np
 import osmnx as ox
 import networkx as nx
-from geopy.geocoders import Nominatim
 import pygame
 from pygame.locals import (
   QUIT, KEYDOWN, K_ESCAPE, K_PLUS, K_MINUS, K_EQUALS, K_a, K_d, K_w, K_s,
   K_LEFT, K_RIGHT, K_UP, K_DOWN, K_c,
   MOUSEBUTTONDOWN, MOUSEBUTTONUP, MOUSEMOTION
 )
+from heuristics import great_circle_heuristic, projected_heuristic
+from graph_store import GraphStore
+from corridor import corridor_route
+from landmarks import landmarks_for
+from contraction import hierarchy_for
+from search import shortest_path
+from geocoding import GeocodingService
+from snapping import snap_index_for
+from renderer import StreetRenderer, LayerCache, to_pixels
+from edge_geometry import EdgeGeometry, route_polyline
+from animation import RouteAnimation
+from route_metrics import metrics_for
+from dynamic_routing import DStarLite
+from instrumentation import ENV_VAR, enable, span, count, observe
+from drawing import (
+  COL_BG, COL_ROAD_CASING, COL_ROAD_INNER, COL_MUTED, COL_ROUTE_OUTLINE, COL_TRAFFIC,
+  edge_styles, fmt_km, fmt_eta, draw_top_bar, draw_bottom_sheet, draw_route, draw_endpoints,
+  draw_vehicle_marker, draw_polyline_with_casing,
+)
 
 ox.config(use_cache=True, log_console=False)
 
-# Parâmetros do raio do grafo (área do mapa)
-# Ajuste aqui conforme preferir: fator proporcional, margem fixa e limites para performance
-RADIUS_FACTOR = 0.5       # fração da distância O-D usada no raio 
-RADIUS_MARGIN_M = 1500.0  # margem extra em metros 
-RADIUS_MIN = 2000.0       # raio mínimo 
-RADIUS_MAX = 15000.0      # raio máximo 
+# Usa o grafo compilado (arrays CSR) no A* em vez de consultar os dicts do networkx
+USE_COMPILED_GRAPH = True
+# Heurística do A*, pré-calculada para todos os nós de uma vez: 'great_circle' ou 'projected' (euclidiana em G_proj)
+HEURISTIC = 'great_circle'
+# Algoritmo de busca no grafo compilado: 'astar', 'bidirectional', 'alt' ou 'ch'
+# ('alt' e 'ch' usam pré-processamento salvo junto do grafo em graph_cache/)
+SEARCH_ALGORITHM = 'astar'
+# Velocidade da animação do veículo: 1.0 = tempo real (travel_time da rota), N = N vezes mais rápido
+PLAYBACK_SPEED = 20.0
+# Trânsito simulado (tecla T): multiplica o travel_time dos próximos trechos da rota e replaneja
+# incrementalmente (D* Lite) a partir do próximo nó do veículo, minimizando o tempo de viagem
+CONGESTION_FACTOR = 8.0
+CONGESTION_HOPS = 4
+# Tiles novos das ruas desenhados por quadro (o resto fica para os seguintes): o mapa aparece aos
+# poucos ao abrir ou trocar de zoom, sem travar a janela
+TILES_PER_FRAME = 6
+# Instrumentação: com ROTA_TRACE=arquivo.json (trace do Chrome/Perfetto) ou arquivo.jsonl, grava a
+# duração de cada estágio, contadores (nós expandidos, arestas relaxadas/desenhadas, acertos de cache)
+# e histogramas do tempo de quadro ao sair; sem a variável nada é medido
+TRACE_PATH = os.environ.get(ENV_VAR)
+if TRACE_PATH:
+  enable(TRACE_PATH)
 
 #* Geocoding
-# Utiliza o Nominatim (OpenStreetMap) do geopy para converter endereços em coordenadas (lat, lon)
-geolocator = Nominatim(user_agent="rota_pygame_app")
+# Utiliza o Nominatim (OpenStreetMap) do geopy para converter endereços em coordenadas (lat, lon),
+# com cache em disco (geocode_cache.sqlite): endereços já consultados não voltam para a rede
+geocoder = GeocodingService()
 
 #? Debug 1 - Endereços dos Estados Unidos
 # orig_address = "4100 George J. Bean Pkwy, Tampa, FL 33607"
@@ -35,74 +74,10 @@ os.system('cls') # Limpa o terminal para o usuário inserir os endereços
 orig_address = input("Endereço de origem: ")
 dest_address = input("Endereço de destino: ")
 
-# O  geolocator funciona via requests HTTP, então cuidado com limites de uso
-# (veja https://nominatim.org/release-docs/latest/api/Overview/)
-loc_o = geolocator.geocode(orig_address)
-loc_d = geolocator.geocode(dest_address)
-
-# Verifica se geocoding foi bem-sucedido
-if not loc_o or not loc_d:
-  raise SystemExit("Erro: não foi possível geocodar os endereços.")
-
-# coordenadas (lat, lon) da origem e destinos
-orig_point = (loc_o.latitude, loc_o.longitude)
-dest_point = (loc_d.latitude, loc_d.longitude)
-
-#* Grafo e rota
-# Centraliza o grafo no ponto médio entre origem e destino
-center = ((orig_point[0] + dest_point[0]) / 2, (orig_point[1] + dest_point[1]) / 2)
-
-# calcula distância (em metros) entre origem e destino e usa isso para dimensionar o raio
-od_dist_m = ox.distance.great_circle(orig_point[0], orig_point[1], dest_point[0], dest_point[1])
-
-# raio proporcional + margem e clamp entre mínimos/máximos
-base_radius = od_dist_m * RADIUS_FACTOR + RADIUS_MARGIN_M
-radius = max(RADIUS_MIN, min(base_radius, RADIUS_MAX))
-
-G = ox.graph_from_point(center, dist=radius, network_type='drive')
-G = ox.add_edge_speeds(G)
-G = ox.add_edge_travel_times(G)
-
-orig_node = ox.distance.nearest_nodes(G, orig_point[1], orig_point[0])
-dest_node = ox.distance.nearest_nodes(G, dest_point[1], dest_point[0])
-
-# heuristic admissible: great-circle (meters)
-def heuristic(u, v):
-  y1, x1 = G.nodes[u]['y'], G.nodes[u]['x']
-  y2, x2 = G.nodes[v]['y'], G.nodes[v]['x']
-  return ox.distance.great_circle(y1, x1, y2, x2)
-
-path = nx.astar_path(G, orig_node, dest_node, heuristic=heuristic, weight='length')
-
-# ---------- 3) Project graph to metric CRS (so coords are in meters/x,y) ----------
-G_proj = ox.project_graph(G)
-# get route nodes coords in projected CRS
-route_xy = [(G_proj.nodes[n]['x'], G_proj.nodes[n]['y']) for n in path]
-
-# For a nicer display, also extract a subset of edges to draw (the whole graph in area)
-# get nodes and edges bounding box
-xs = [d['x'] for _, d in G_proj.nodes(data=True)]
-ys = [d['y'] for _, d in G_proj.nodes(data=True)]
-minx, maxx = min(xs), max(xs)
-miny, maxy = min(ys), max(ys)
-
-# ---------- 4) Transform projected coords -> screen coords ----------
+# ---------- Transform projected coords -> screen coords ----------
 SCREEN_W, SCREEN_H = 1000, 700
 MARGIN = 40
 
-# ---------- UI Palette (Waze-like) ----------
-COL_BG = (26, 28, 32)          # fundo bem escuro
-COL_ROAD_CASING = (37, 39, 45) # contorno das vias
-COL_ROAD_INNER = (210, 213, 220)  # interior clarinho das vias
-COL_PRIMARY_INNER = (225, 230, 240)
-COL_ROUTE_OUTLINE = (245, 250, 255)
-COL_ROUTE = (70, 150, 255)     # azul da rota
-COL_TEXT = (230, 230, 235)
-COL_MUTED = (140, 145, 155)
-COL_START = (0, 210, 120)
-COL_END = (235, 70, 70)
-COL_VEHICLE = (100, 40, 150)
-
 def compute_transform(minx, maxx, miny, maxy, screen_w, screen_h, margin):
   width = maxx - minx
   height = maxy - miny
@@ -118,46 +93,147 @@ def compute_transform(minx, maxx, miny, maxy, screen_w, screen_h, margin):
     return float(screen_x), float(screen_y)
   return proj, s
 
-proj_fn, scale = compute_transform(minx, maxx, miny, maxy, SCREEN_W, SCREEN_H, MARGIN)
+def in_background(fn, *args):
+  # roda fn numa thread daemon (fechar a janela no meio do download não espera por ela);
+  # o Future devolve o resultado ou relança a exceção no laço principal
+  future = Future()
+  def run():
+    try:
+      future.set_result(fn(*args))
+    except BaseException as e:
+      future.set_exception(e)
+  threading.Thread(target=run, daemon=True).start()
+  return future
+
+#* Inicialização concorrente
+# A janela abre logo após os endereços; geocoding, grafo, snapping e busca correm em threads e
+# cada parte aparece assim que fica pronta: as ruas (tiles desenhados aos poucos) e depois a rota.
+# Até lá o painel inferior mostra a etapa atual
+graph_store = GraphStore()
+loading_status = "Geocodificando endereços..."
+G = G_proj = dest_node = None
+search_info = None  # (algoritmo, nós assentados) da busca inicial, mostrado no canto da tela
+orig_point = dest_point = None
+proj_fn = None
+minx = maxx = miny = maxy = 0.0
+scale = 1.0
+streets_future = None
+
+def load_streets(G_proj):
+  # geometria completa das arestas num buffer só + versões simplificadas (Douglas-Peucker) por zoom
+  with span('edge_geometry'):
+    edge_geometry = EdgeGeometry.from_graph(G_proj)
+    edge_widths, edge_highways = edge_styles(G_proj)
+  # Ruas numa grade espacial, pré-desenhadas em tiles por nível de zoom: pan só desloca os tiles
+  with span('street_grid'):
+    return StreetRenderer(edge_geometry, edge_widths, edge_highways)
+
+def show_graph(graph, graph_proj):
+  # publica o grafo (ou o corredor ampliado) para a janela: enquadramento e ruas em outra thread
+  global G, G_proj, proj_fn, scale, minx, maxx, miny, maxy, streets_future
+  # bounding box dos nós: enquadramento da tela, já disponível para desenhar as ruas
+  xs = [d['x'] for _, d in graph_proj.nodes(data=True)]
+  ys = [d['y'] for _, d in graph_proj.nodes(data=True)]
+  minx, maxx = min(xs), max(xs)
+  miny, maxy = min(ys), max(ys)
+  proj_fn, scale = compute_transform(minx, maxx, miny, maxy, SCREEN_W, SCREEN_H, MARGIN)
+  G, G_proj = graph, graph_proj
+  # ruas em paralelo com snapping e busca
+  streets_future = in_background(load_streets, G_proj)
+
+def search_route(graph, graph_proj, graph_key):
+  global loading_status, dest_node, search_info
+  loading_status = "Calculando a rota..."
+  # Snapping na aresta mais próxima (não no nó mais próximo): endereços no meio de quarteirões
+  # longos caem na rua certa; a busca começa/termina na ponta mais próxima dessa aresta.
+  # O índice espacial é montado uma vez e salvo junto do snapshot do grafo
+  with span('snap'):
+    snap_index = snap_index_for(graph, store=graph_store, key=graph_key)
+    orig_node, dest_node = snap_index.snap_edges([orig_point, dest_point])['node'].tolist()
+
+  # heuristic admissible: great-circle (meters), calculada para todos os nós numa passada só
+  with span('heuristic', kind=HEURISTIC):
+    if HEURISTIC == 'projected':
+      heuristic = projected_heuristic(graph, dest_node, weight='length', G_proj=graph_proj)
+    else:
+      heuristic = great_circle_heuristic(graph, dest_node, weight='length')
+
+  if USE_COMPILED_GRAPH:
+    # mesma rota do nx.astar_path, mas expandindo sobre arrays contíguos
+    landmarks = hierarchy = None
+    with span('preprocess', algorithm=SEARCH_ALGORITHM):
+      if SEARCH_ALGORITHM == 'alt':
+        landmarks = landmarks_for(heuristic.cg, weight='length', store=graph_store, key=graph_key)
+      elif SEARCH_ALGORITHM == 'ch':
+        hierarchy = hierarchy_for(heuristic.cg, weight='length', store=graph_store, key=graph_key)
+    path, search_stats = shortest_path(heuristic.cg, orig_node, dest_node, weight='length',
+                                       algorithm=SEARCH_ALGORITHM, heuristic=heuristic.value_list,
+                                       landmarks=landmarks, hierarchy=hierarchy)
+    # (contadores search.settled/relaxed também vão para o trace, ver instrumentation.py)
+    search_info = (search_stats['algorithm'], search_stats['settled'])
+    return path
+  with span('search', algorithm='networkx'):
+    return nx.astar_path(graph, orig_node, dest_node, heuristic=heuristic, weight='length')
+
+def expand_corridor(no_path, slack_m):
+  global loading_status
+  loading_status = f"{'Sem rota' if no_path else 'Rota na borda'}: ampliando o mapa ({slack_m / 1000:.1f} km de folga)..."
+
+def load_route():
+  global loading_status, orig_point, dest_point
+  #* Geocoding
+  # O Nominatim funciona via requests HTTP, então cuidado com limites de uso
+  # (veja https://nominatim.org/release-docs/latest/api/Overview/); o serviço espaça o início
+  # das requisições em 1 s e respeita o Retry-After de respostas 429. As duas consultas correm
+  # em paralelo: a resposta da origem chega enquanto a do destino espera a sua vez
+  with span('geocode'):
+    orig_point, dest_point = geocoder.geocode_many([orig_address, dest_address], workers=2)
+
+  # Verifica se geocoding foi bem-sucedido
+  if not orig_point or not dest_point:
+    raise SystemExit("Erro: não foi possível geocodar os endereços.")
+
+  #* Grafo e rota
+  # Só o corredor entre origem e destino: grafo já enriquecido (velocidades/tempos) e projetado,
+  # do snapshot em disco (graph_cache/) quando algum salvo cobre o corredor; senão baixa, processa
+  # e salva. Se a busca falha ou a rota encosta na borda, o corredor cresce e a busca é refeita
+  loading_status = "Carregando o mapa..."
+  # (folga inicial e crescimento: constantes CORRIDOR_* de corridor.py)
+  _, _, _, path, _ = corridor_route(orig_point, dest_point, search_route, network_type='drive', store=graph_store,
+                                    on_graph=show_graph, on_expand=expand_corridor)
+
+  # geometria, animação e estatísticas da rota (ver set_route) ainda fora do laço da janela
+  with span('route_state'):
+    return route_state(path)
+
+def route_state(path):
+  # get route coords in projected CRS, seguindo as curvas (geometry) de cada aresta
+  route_xy_arr = np.asarray(route_polyline(G_proj, path), dtype=np.float64)
+  # Animation along the route: posição por tempo (não por quadro), interpolada sobre os vértices
+  # da rota com busca binária nas distâncias/tempos acumulados
+  route_anim = RouteAnimation.from_route(G_proj, path, speed=PLAYBACK_SPEED)
+  # Route stats: comprimento, tempo, trechos por tipo de via e conversões numa passada só
+  route_stats = metrics_for(G).metrics(path)
+  return path, route_xy_arr, route_anim, route_stats
 
 # Camera state (zoom/pan)
 cam_zoom = 1.0
 cam_off_x = 0.0
 cam_off_y = 0.0
 
-def apply_camera(px, py):
+def camera_affine():
+  # proj_fn + câmera (zoom em torno do centro da tela + offset) como uma afim só:
+  # pixels = to_pixels(xy, k, tx, ty) = (floor(x * k) + tx, floor(-y * k) + ty)
   cx, cy = SCREEN_W * 0.5, SCREEN_H * 0.5
-  vx = (px - cx) * cam_zoom + cx + cam_off_x
-  vy = (py - cy) * cam_zoom + cy + cam_off_y
-  return int(vx), int(vy)
-
-# Precompute edges as projected pairs and classify width
-def classify_edge(data):
-  hw = data.get('highway', 'residential')
-  if isinstance(hw, list):
-    hw = hw[0] if hw else 'residential'
-  # largura base por tipo
-  if hw in ('motorway', 'trunk'):
-    return 6
-  if hw in ('primary', 'secondary'):
-    return 4
-  if hw in ('tertiary', 'residential', 'unclassified', 'living_street'):
-    return 2
-  return 2
-
-edges_proj = []  # (uxy, vxy, width, highway)
-for u, v, key, data in G_proj.edges(keys=True, data=True):
-  uxy = (G_proj.nodes[u]['x'], G_proj.nodes[u]['y'])
-  vxy = (G_proj.nodes[v]['x'], G_proj.nodes[v]['y'])
-  w = classify_edge(data)
-  hw = data.get('highway', 'residential')
-  if isinstance(hw, list):
-    hw = hw[0] if hw else 'residential'
-  edges_proj.append((uxy, vxy, w, hw))
-
-route_screen_base = [proj_fn(pt) for pt in route_xy]
-
-# ---------- 5) Pygame visualization + simple animation ----------
+  k = scale * cam_zoom
+  tx = (MARGIN - minx * scale - cx) * cam_zoom + cx + cam_off_x
+  ty = (SCREEN_H - MARGIN + miny * scale - cy) * cam_zoom + cy + cam_off_y
+  return k, math.floor(tx), math.floor(ty)
+
+startup_t0 = time.perf_counter()
+route_future = in_background(load_route)
+
+# ---------- Pygame visualization + simple animation ----------
 pygame.init()
 screen = pygame.display.set_mode((SCREEN_W, SCREEN_H))
 pygame.display.set_caption("Rota (A*)")
@@ -165,118 +241,70 @@ clock = pygame.time.Clock()
 font_small = pygame.font.SysFont(None, 18)
 font = pygame.font.SysFont(None, 22)
 font_bold = pygame.font.SysFont(None, 26)
-
-# Animation along the route: parametric interpolation between consecutive nodes
-# Build a list of points denser than nodes for smooth movement
-def densify(points, step_m=5.0, proj_scale=scale):
-  # points in projected coords (meters), but we transformed earlier to screen pixels.
-  # to densify, operate in projected space then project to screen
-  dens = []
-  for i in range(len(points) - 1):
-    x1, y1 = points[i]
-    x2, y2 = points[i + 1]
-    dx = x2 - x1
-    dy = y2 - y1
-    dist = math.hypot(dx, dy)
-    nsteps = max(1, int(dist / step_m))
-    for k in range(nsteps):
-      t = k / nsteps
-      dens.append((x1 + dx * t, y1 + dy * t))
-  dens.append(points[-1])
-  return dens
-
-route_densified_proj = densify(route_xy, step_m=5.0)
-route_densified_screen_base = [proj_fn(pt) for pt in route_densified_proj]
-
-# Route stats
-def compute_route_stats(G, path):
-  total_len = 0.0
-  total_time = 0.0
-  for u, v in zip(path[:-1], path[1:]):
-    data = min(G.get_edge_data(u, v).values(), key=lambda d: d.get('length', 0))
-    total_len += data.get('length', 0.0)
-    total_time += data.get('travel_time', 0.0)
-  return total_len, total_time
-
-total_len_m, total_time_s = compute_route_stats(G, path)
-def fmt_km(m):
-  return f"{m/1000:.1f} km" if m >= 1000 else f"{int(m)} m"
-
-def fmt_eta(s):
-  m = int(round(s/60))
-  if m < 60:
-    return f"{m} min"
-  h = m // 60
-  mm = m % 60
-  return f"{h} h {mm} min"
-
-def draw_rounded_rect(surface, rect, color, radius=12, border=0, border_color=(0,0,0)):
-  pygame.draw.rect(surface, border_color, rect, border_radius=radius) if border>0 else None
-  inner = pygame.Rect(rect)
-  if border>0:
-    inner.inflate_ip(-2*border, -2*border)
-  pygame.draw.rect(surface, color, inner, border_radius=max(0, radius- (border>0)))
-
-def draw_top_bar(surface, title):
-  # barra superior com efeito de translucidez
-  bar_h = 60
-  overlay = pygame.Surface((SCREEN_W, bar_h), pygame.SRCALPHA)
-  overlay.fill((20, 22, 26, 220))
-  surface.blit(overlay, (0, 0))
-  # pseudo search box
-  box = pygame.Rect(16, 12, SCREEN_W-32, 36)
-  draw_rounded_rect(surface, box, (40,43,50), radius=12)
-  txt = font.render(title, True, COL_TEXT)
-  surface.blit(txt, (box.x+12, box.y+8))
-
-def draw_bottom_sheet(surface, lines):
-  h = 110
-  overlay = pygame.Surface((SCREEN_W, h), pygame.SRCALPHA)
-  overlay.fill((20, 22, 26, 220))
-  surface.blit(overlay, (0, SCREEN_H-h))
-  box = pygame.Rect(12, SCREEN_H-h+8, SCREEN_W-24, h-16)
-  draw_rounded_rect(surface, box, (40,43,50), radius=14)
-  y = box.y + 10
-  for ln in lines:
-    surface.blit(font, (0,0)) if False else None
-    t = font.render(ln, True, COL_TEXT)
-    surface.blit(t, (box.x+12, y))
-    y += 26
-
-def draw_polyline_with_casing(surface, pts_proj, width, inner_color, casing_color):
-  # map pontos projetados -> base screen -> camera
-  pts = [apply_camera(*proj_fn(p)) for p in pts_proj]
-  if len(pts) < 2:
+street_layer = None  # LayerCache das ruas, criado quando a geometria fica pronta
+shown_streets = None  # streets_future que gerou street_layer
+
+# Rota atual (preenchida por set_route quando a busca termina)
+path = route_xy_arr = route_anim = route_stats = None
+total_len_m = total_time_s = 0.0
+total_turns = 0
+
+# Replanejamento ao vivo: a busca incremental guarda o estado entre um lote de pesos e o próximo
+rerouter = None
+congested = []       # arestas (u, v) com trânsito
+congested_xy = []    # geometria projetada de cada uma, para desenhar
+reroute_info = None  # (nós expandidos, ms) do último replanejamento
+
+def set_route(state):
+  # troca a rota (route_state) mantendo o trecho já percorrido: a animação continua do mesmo ponto
+  global path, route_xy_arr, route_anim, route_stats, total_len_m, total_time_s, total_turns
+  path, route_xy_arr, route_anim, route_stats = state
+  total_len_m, total_time_s = route_stats['length_m'], route_stats['travel_time_s']
+  total_turns = sum(route_stats['turns'].values())
+
+def replan(changes):
+  # aplica um lote de pesos {(u, v): travel_time} e refaz a rota a partir do próximo nó do veículo
+  global rerouter, reroute_info
+  i = route_anim.next_node_index(route_anim.distance_at(anim_time))
+  t0 = time.perf_counter()
+  with span('replan', edges=len(changes)):
+    if rerouter is None:
+      rerouter = DStarLite(G, path[i], dest_node, weight='travel_time')
+    else:
+      rerouter.move_to(path[i])
+    expanded = rerouter.update_edges(changes)
+    set_route(route_state(path[:i] + rerouter.path()))
+  count('replan.expanded', expanded)
+  reroute_info = (expanded, (time.perf_counter() - t0) * 1000)
+
+def add_congestion():
+  global rerouter
+  if route_anim is None:
     return
-  # casing (mais grosso)
-  pygame.draw.lines(surface, casing_color, False, pts, max(1, width+4))
-  # inner
-  pygame.draw.lines(surface, inner_color, False, pts, width)
-
-def draw_segment_with_casing(surface, p1_proj, p2_proj, width, inner_color, casing_color):
-  a = apply_camera(*proj_fn(p1_proj))
-  b = apply_camera(*proj_fn(p2_proj))
-  pygame.draw.line(surface, casing_color, a, b, max(1, width+4))
-  pygame.draw.line(surface, inner_color, a, b, width)
+  i = route_anim.next_node_index(route_anim.distance_at(anim_time))
+  hops = list(zip(path[i + 1:], path[i + 2:]))[:CONGESTION_HOPS]
+  if not hops:
+    return
+  if rerouter is None:
+    rerouter = DStarLite(G, path[i], dest_node, weight='travel_time')
+  weights = {(u, v): rerouter.weight_of(u, v, base=True) * CONGESTION_FACTOR for u, v in hops}
+  congested.extend(hops)
+  congested_xy.extend(np.asarray(route_polyline(G_proj, [u, v]), dtype=np.float64) for u, v in hops)
+  replan(weights)
+
+def clear_congestion():
+  if rerouter is None or not congested:
+    return
+  changes = {(u, v): rerouter.weight_of(u, v, base=True) for u, v in congested}
+  congested.clear()
+  congested_xy.clear()
+  replan(changes)
 
 curr_heading = None
-HEADING_LOOKAHEAD = 15
-HEADING_ALPHA = 0.15  # suavização (0-1)
+HEADING_ALPHA = 0.15  # suavização (0-1) por quadro a 60 FPS; convertida pelo dt real do quadro
 # Offset opcional para calibrar o triângulo do veículo (radianos). Ajuste para +-math.pi/2 se notar rotação de 90°.
 ANGLE_OFFSET = 0.0
 
-def get_target_heading(idx):
-  if len(route_densified_proj) < 2:
-    return 0.0
-  i0 = max(0, min(idx, len(route_densified_proj)-1))
-  i1 = max(0, min(idx + HEADING_LOOKAHEAD, len(route_densified_proj)-1))
-  x1, y1 = route_densified_proj[i0]
-  x2, y2 = route_densified_proj[i1]
-  dx, dy = x2 - x1, y2 - y1
-  if abs(dx) < 1e-6 and abs(dy) < 1e-6:
-    return None
-  return math.atan2(dy, dx)
-
 def angle_lerp(current, target, alpha):
   # interpola levando em conta wrap de -pi a pi
   if current is None:
@@ -286,33 +314,39 @@ def angle_lerp(current, target, alpha):
   delta = (target - current + math.pi) % (2*math.pi) - math.pi
   return current + alpha * delta
 
-def draw_vehicle(surface, pos_idx):
+def draw_vehicle(surface, t, dt, k, tx, ty):
   global curr_heading
-  if pos_idx >= len(route_densified_proj):
-    pos_idx = len(route_densified_proj)-1
+  x, y, target, _ = route_anim.state(t)
   # posição na tela
-  ps = apply_camera(*proj_fn(route_densified_proj[pos_idx]))
-  # orientação suavizada
-  target = get_target_heading(pos_idx)
-  curr_heading = angle_lerp(curr_heading, target, HEADING_ALPHA)
+  ps = to_pixels((x, y), k, tx, ty)[0].tolist()
+  # orientação suavizada (mesma suavização por segundo, qualquer que seja o FPS)
+  alpha = 1.0 - (1.0 - HEADING_ALPHA) ** (dt * 60)
+  curr_heading = angle_lerp(curr_heading, target, alpha)
   ang = curr_heading if curr_heading is not None else (target or 0.0)
-  # Ajuste para sistema de tela (eixo Y invertido): ângulo de tela = -ang + offset
-  ang_screen = -ang + ANGLE_OFFSET
-  size = 12
-  pts = [
-    (ps[0] + math.cos(ang_screen)*size,     ps[1] + math.sin(ang_screen)*size),
-    (ps[0] + math.cos(ang_screen+2.5)*size*0.7, ps[1] + math.sin(ang_screen+2.5)*size*0.7),
-    (ps[0] + math.cos(ang_screen-2.5)*size*0.7, ps[1] + math.sin(ang_screen-2.5)*size*0.7),
-  ]
-  pygame.draw.polygon(surface, COL_VEHICLE, [(int(x), int(y)) for x,y in pts])
-  pygame.draw.polygon(surface, COL_ROUTE_OUTLINE, [(int(x), int(y)) for x,y in pts], 2)
-
-pos_index = 0
+  draw_vehicle_marker(surface, ps, ang, ANGLE_OFFSET)
+
+anim_time = 0.0  # segundos de reprodução
+frame_dt = 1 / 60
 running = True
 dragging = False
 last_mouse = (0, 0)
+first_frame = True
 
 while running:
+  frame_start = time.perf_counter()
+  # partes da inicialização que ficaram prontas desde o último quadro
+  # (um corredor ampliado troca o grafo: as ruas novas substituem as antigas quando ficam prontas)
+  if streets_future is not shown_streets and streets_future.done():
+    if street_layer is None:
+      observe('startup.streets_ms', (time.perf_counter() - startup_t0) * 1000)
+    shown_streets = streets_future
+    street_layer = LayerCache(shown_streets.result(), COL_BG, COL_ROAD_INNER, COL_ROAD_CASING)
+  if route_anim is None and route_future.done():
+    if route_future.exception() is not None:
+      pygame.quit()
+      raise route_future.exception()
+    set_route(route_future.result())
+    observe('startup.route_ms', (time.perf_counter() - startup_t0) * 1000)
   for event in pygame.event.get():
     if event.type == QUIT:
       running = False
@@ -325,19 +359,21 @@ while running:
       if event.key == K_MINUS:
         cam_zoom = max(0.5, cam_zoom / 1.15)
       # Center on vehicle
-      if event.key == K_c:
+      if event.key == K_c and route_anim is not None:
         # centraliza no veículo atual
-        if pos_index < len(route_densified_proj):
-          vx, vy = proj_fn(route_densified_proj[pos_index])
-        else:
-          vx, vy = proj_fn(route_densified_proj[-1])
+        vx, vy = proj_fn(route_anim.state(anim_time)[:2])
         cx, cy = SCREEN_W*0.5, SCREEN_H*0.5
-        # resolver offset para que apply_camera(vx,vy) == (cx,cy)
+        # resolver offset para que a câmera leve (vx,vy) ao centro da tela
         cam_off_x = cx - (vx - cx) * cam_zoom - cx
         cam_off_y = cy - (vy - cy) * cam_zoom - cy
+      # Trânsito nos próximos trechos (T) / limpar trânsito (Y): replanejamento incremental
+      if event.key == pygame.K_t:
+        add_congestion()
+      if event.key == pygame.K_y:
+        clear_congestion()
       # Reiniciar animação (replay)
       if event.key == pygame.K_r:
-        pos_index = 0
+        anim_time = 0.0
         curr_heading = None
     # Mouse drag pan
     if event.type == MOUSEBUTTONDOWN and event.button == 1:
@@ -382,48 +418,71 @@ while running:
 
   screen.fill(COL_BG)  # dark background
 
-  # draw all streets (LOD + thickness dependente do zoom)
-  for (pa, pb, w, hw) in edges_proj:
-    # filtra ruas menores quando afastado para evitar poluição visual
-    if cam_zoom < 0.8 and hw in ('residential', 'living_street', 'service', 'unclassified', 'tertiary'):
-      continue
-    if cam_zoom < 0.65 and hw in ('secondary',):
-      continue
-    width_px = max(1, min(12, int(w * cam_zoom)))
-    draw_segment_with_casing(screen, pa, pb, width_px, COL_ROAD_INNER, COL_ROAD_CASING)
-
-  # draw route as thicker line
-  if len(route_xy) >= 2:
-    # contorno claro + rota azul (espessura também escala levemente)
-    route_w = max(3, min(10, int(6 * cam_zoom)))
-    draw_polyline_with_casing(screen, route_xy, route_w, COL_ROUTE, COL_ROUTE_OUTLINE)
-
-  # draw moving vehicle
-  if pos_index < len(route_densified_screen_base):
-    draw_vehicle(screen, pos_index)
-    pos_index += 1  # speed: 1 step per frame; ajuste se quiser mais rápido
-  else:
-    # stay at destination
-    draw_vehicle(screen, len(route_densified_screen_base)-1)
+  # draw streets: tiles em cache (só são redesenhados quando o zoom muda; LOD e espessura dependem dele)
+  k, tx, ty = camera_affine()
+  if street_layer is not None:
+    street_layer.draw(screen, k, cam_zoom, tx, ty, max_new=TILES_PER_FRAME)
+
+  if route_anim is not None:
+    # rota em pixels de tela numa operação vetorizada só
+    route_scr = to_pixels(route_xy_arr, k, tx, ty).tolist()
+
+    # draw route as thicker line
+    if len(route_scr) >= 2:
+      draw_route(screen, route_scr, cam_zoom)
 
-  # draw origin/destination markers
-  orig_scr = apply_camera(*proj_fn(route_xy[0]))
-  dest_scr = apply_camera(*proj_fn(route_xy[-1]))
-  pygame.draw.circle(screen, COL_ROUTE_OUTLINE, orig_scr, 9)
-  pygame.draw.circle(screen, COL_START, orig_scr, 7)
-  pygame.draw.circle(screen, COL_ROUTE_OUTLINE, dest_scr, 9)
-  pygame.draw.circle(screen, COL_END, dest_scr, 7)
+    # trechos com trânsito simulado (em vermelho, por cima da rota antiga/nova)
+    for xy in congested_xy:
+      draw_polyline_with_casing(screen, to_pixels(xy, k, tx, ty).tolist(), max(3, min(10, int(6 * cam_zoom))),
+                                COL_TRAFFIC, COL_ROUTE_OUTLINE)
+
+    # draw moving vehicle (ao fim da rota fica parado no destino)
+    draw_vehicle(screen, anim_time, frame_dt, k, tx, ty)
+
+    # draw origin/destination markers
+    orig_scr = route_scr[0]
+    dest_scr = route_scr[-1]
+    draw_endpoints(screen, orig_scr, dest_scr)
 
   # HUD: simple text
-  draw_top_bar(screen, f"Rota: {orig_address} -> {dest_address}")
-  stats = [
-    f"{fmt_eta(total_time_s)} • {fmt_km(total_len_m)}",
-    f"Nós da rota: {len(path)}  •  Passos: {pos_index}/{len(route_densified_screen_base)}",
-    "Controles: +/- zoom  •  Setas/WASD pan  •  C centralizar  •  R reiniciar"
-  ]
-  draw_bottom_sheet(screen, stats)
+  draw_top_bar(screen, f"Rota: {orig_address} -> {dest_address}", font)
+  controls = "Controles: +/- zoom  •  Setas/WASD pan  •  C centralizar  •  R reiniciar  •  T/Y trânsito"
+  if route_anim is not None:
+    stats = [
+      f"{fmt_eta(total_time_s)} • {fmt_km(total_len_m)} • {total_turns} conversões",
+      f"Nós da rota: {len(path)}  •  Percorrido: {fmt_km(route_anim.distance_at(anim_time))} ({PLAYBACK_SPEED:g}x)",
+      controls,
+    ]
+  else:
+    stats = [f"{loading_status} ({time.perf_counter() - startup_t0:.1f} s)", controls]
+  draw_bottom_sheet(screen, stats, font)
+  if street_layer is not None:
+    pending = f" / {street_layer.last_pending} na fila" if street_layer.last_pending else ""
+    cull_txt = font_small.render(
+      f"Tiles: {street_layer.last_blitted} na tela / {street_layer.last_rendered} redesenhados{pending} / {len(street_layer)} em cache",
+      True, COL_MUTED)
+    screen.blit(cull_txt, (SCREEN_W - cull_txt.get_width() - 16, 66))
+  if search_info is not None and route_anim is not None:
+    search_txt = font_small.render(f"Busca ({search_info[0]}): {search_info[1]} nós assentados", True, COL_MUTED)
+    screen.blit(search_txt, (SCREEN_W - search_txt.get_width() - 16, 84))
+  if reroute_info is not None:
+    reroute_txt = font_small.render(
+      f"Replanejado: {reroute_info[0]} nós em {reroute_info[1]:.1f} ms  •  restante com trânsito: {fmt_eta(rerouter.cost)}",
+      True, COL_MUTED)
+    screen.blit(reroute_txt, (SCREEN_W - reroute_txt.get_width() - 16, 102))
 
   pygame.display.flip()
-  clock.tick(60)  # FPS
+  # tempo de trabalho do quadro (sem a espera do clock) e o que foi desenhado nele
+  observe('frame.work_ms', (time.perf_counter() - frame_start) * 1000)
+  if street_layer is not None:
+    observe('frame.tiles_rendered', street_layer.last_rendered)
+    observe('frame.edges_drawn', street_layer.last_edges_drawn)
+  if first_frame:
+    observe('startup.first_frame_ms', (time.perf_counter() - startup_t0) * 1000)
+    first_frame = False
+  frame_dt = clock.tick(60) / 1000.0  # FPS
+  observe('frame.ms', frame_dt * 1000)
+  if route_anim is not None:
+    anim_time = min(anim_time + frame_dt, route_anim.duration)
 
 pygame.quit()
\ No newline at end of file
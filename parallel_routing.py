@@ -0,0 +1,136 @@
+import os
+from multiprocessing import Pool, shared_memory
+
+import numpy as np
+import networkx as nx
+
+from compiled_graph import CompiledGraph, astar_path
+from heuristics import great_circle_heuristic
+
+# Arrays do CompiledGraph publicados em memória compartilhada
+SHARED_FIELDS = ('node_ids', 'offsets', 'targets', 'lat', 'lon')
+
+# Estado de cada processo worker (preenchido em _init_worker)
+_worker_cg = None
+_worker_shm = []
+_worker_heuristics = {}
+# Limite do cache de heurísticas de cada worker: uma tabela é uma lista Python de n floats
+# (~32 bytes por nó), então o número de destinos guardados diminui em grafos maiores
+WORKER_HEURISTIC_CACHE_BYTES = 64 * 1024 ** 2
+HEURISTIC_BYTES_PER_NODE = 32
+
+
+def _publish(arrays):
+  """Copia os arrays para blocos de shared_memory; devolve (blocos, descrição serializável)."""
+  blocks = []
+  spec = {}
+  for name, arr in arrays.items():
+    arr = np.ascontiguousarray(arr)
+    shm = shared_memory.SharedMemory(create=True, size=max(1, arr.nbytes))
+    np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+    blocks.append(shm)
+    spec[name] = (shm.name, arr.shape, arr.dtype.str)
+  return blocks, spec
+
+
+def _attach(spec):
+  blocks = []
+  arrays = {}
+  for name, (shm_name, shape, dtype) in spec.items():
+    shm = shared_memory.SharedMemory(name=shm_name)
+    blocks.append(shm)
+    arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+  return blocks, arrays
+
+
+def _init_worker(spec, weights):
+  global _worker_cg, _worker_shm
+  _worker_shm, arrays = _attach(spec)
+  _worker_cg = CompiledGraph(
+    arrays['node_ids'], arrays['offsets'], arrays['targets'],
+    {k: arrays[f'w_{k}'] for k in weights}, arrays['lat'], arrays['lon'], zero_copy=True,
+    id_order=arrays['id_order'],
+  )
+
+
+def _call(job):
+  # executa func(grafo compartilhado, tarefa) dentro do worker
+  func, task = job
+  return func(_worker_cg, task)
+
+
+def _solve(cg, task):
+  orig, dest, weight = task
+  # a heurística depende só do destino: reaproveita entre consultas do mesmo worker
+  key = (dest, weight)
+  h = _worker_heuristics.get(key)
+  if h is None:
+    max_entries = max(1, WORKER_HEURISTIC_CACHE_BYTES // (cg.n_nodes * HEURISTIC_BYTES_PER_NODE))
+    while len(_worker_heuristics) >= max_entries:
+      _worker_heuristics.pop(next(iter(_worker_heuristics)))
+    h = _worker_heuristics[key] = great_circle_heuristic(cg, dest, weight=weight).value_list
+  try:
+    return astar_path(cg, orig, dest, weight=weight, heuristic=h)
+  except nx.NetworkXNoPath:
+    return None
+
+
+class ParallelRouter:
+  """Pool de processos que resolve consultas A* sobre um CompiledGraph em memória compartilhada.
+
+  Os arrays do grafo são publicados uma vez; os workers só recebem os nomes dos blocos,
+  sem serializar o MultiDiGraph. Os caminhos são idênticos aos do astar_path serial.
+
+  Os workers buscam direto sobre os arrays compartilhados (CompiledGraph com zero_copy): o grafo
+  não é copiado em cada processo, mas o laço quente lê memoryviews em vez de listas Python,
+  cerca de 1,5x mais lento por aresta. O que é privado de cada worker é o cache de heurísticas
+  por destino, limitado a WORKER_HEURISTIC_CACHE_BYTES: a memória total cresce com o número de
+  processos em até esse valor por worker.
+  """
+
+  def __init__(self, cg, processes=None):
+    self.weights = tuple(cg.weights)
+    arrays = {name: getattr(cg, name) for name in SHARED_FIELDS}
+    for k, w in cg.weights.items():
+      arrays[f'w_{k}'] = w
+    # ordem dos ids para a busca binária do index_of, calculada uma vez para todos os workers
+    arrays['id_order'] = np.argsort(cg.node_ids, kind='stable')
+    self._blocks, spec = _publish(arrays)
+    self.processes = processes or os.cpu_count() or 1
+    self._pool = Pool(self.processes, initializer=_init_worker, initargs=(spec, self.weights))
+
+  def solve(self, pairs, weight='length', chunksize=None):
+    """Lista de caminhos (ids de nós, ou None sem rota) na mesma ordem de `pairs`."""
+    if weight not in self.weights:
+      raise KeyError(f"Peso '{weight}' não foi compilado no grafo")
+    pairs = list(pairs)
+    # ordena por destino para que cada chunk reaproveite a heurística no worker
+    order = sorted(range(len(pairs)), key=lambda i: pairs[i][1])
+    tasks = [(pairs[i][0], pairs[i][1], weight) for i in order]
+    results = [None] * len(pairs)
+    for i, path in zip(order, self.map(_solve, tasks, chunksize)):
+      results[i] = path
+    return results
+
+  def map(self, func, tasks, chunksize=None):
+    """Aplica func(cg, tarefa) nos workers; func precisa ser uma função de módulo (serializável)."""
+    jobs = [(func, task) for task in tasks]
+    if chunksize is None:
+      chunksize = max(1, len(jobs) // (self.processes * 4))
+    return self._pool.map(_call, jobs, chunksize=chunksize)
+
+  def close(self):
+    if self._pool is not None:
+      self._pool.close()
+      self._pool.join()
+      self._pool = None
+    for shm in self._blocks:
+      shm.close()
+      shm.unlink()
+    self._blocks = []
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
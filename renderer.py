@@ -0,0 +1,210 @@
+import math
+from collections import OrderedDict
+
+import numpy as np
+import pygame
+
+from instrumentation import count
+
+# Lado (em metros do CRS projetado) das células da grade espacial das ruas
+CELL_SIZE_M = 250.0
+# Zoom mínimo para desenhar cada tipo de via (LOD): ruas menores somem quando afastado
+MIN_ZOOM_BY_HIGHWAY = {
+  'residential': 0.8, 'living_street': 0.8, 'service': 0.8, 'unclassified': 0.8, 'tertiary': 0.8,
+  'secondary': 0.65,
+}
+MAX_WIDTH_PX = 12
+# Tiles pré-desenhados das ruas: lado em pixels, limite de tiles em memória e de níveis de zoom
+TILE_PX = 256
+MAX_TILES = 192
+MAX_ZOOM_LEVELS = 3
+
+
+def to_pixels(xy, k, ox=0, oy=0):
+  """Pontos projetados (N, 2) -> pixels inteiros (N, 2): (floor(x * k) + ox, floor(-y * k) + oy).
+
+  Uma única operação afim vetorizada; ruas (tiles), rota e marcadores passam todos por aqui,
+  então ficam alinhados no mesmo pixel.
+  """
+  px = np.floor(np.asarray(xy, dtype=np.float64).reshape(-1, 2) * (k, -k)).astype(np.int64)
+  px += (ox, oy)
+  return px
+
+
+class StreetRenderer:
+  """Ruas numa grade espacial (coordenadas projetadas) para desenhar só o que cai na tela.
+
+  Cada aresta entra em todas as células que o seu retângulo envolvente toca; a cada quadro só
+  as células que cruzam a viewport são consultadas, e um teste vetorizado de retângulos
+  descarta o resto. As polylines vêm de um EdgeGeometry, no tier de simplificação adequado
+  ao zoom. last_drawn/last_culled guardam as contagens do último quadro.
+  """
+
+  def __init__(self, geometry, widths, highways, cell_size=CELL_SIZE_M):
+    # geometry: EdgeGeometry (CRS projetado); widths/highways: largura base e tipo de cada aresta
+    self.cell_size = float(cell_size)
+    self.geometry = geometry
+    n = geometry.n_edges
+    self.width = np.asarray(widths, dtype=np.int64).reshape(n)
+    self.highway = list(highways)
+    self.min_zoom = np.fromiter((MIN_ZOOM_BY_HIGHWAY.get(hw, 0.0) for hw in self.highway), dtype=np.float64, count=n)
+    self.x0, self.y0, self.x1, self.y1 = geometry.bounds()
+    self._build_grid()
+    self.last_drawn = 0
+    self.last_culled = 0
+
+  @property
+  def n_edges(self):
+    return len(self.width)
+
+  def _cell(self, v):
+    return np.floor(v / self.cell_size).astype(np.int64)
+
+  def _build_grid(self):
+    # pares (célula, aresta) ordenados por célula -> CSR: célula -> fatia de self._cell_edges
+    cx0, cx1 = self._cell(self.x0), self._cell(self.x1)
+    cy0, cy1 = self._cell(self.y0), self._cell(self.y1)
+    nx_ = cx1 - cx0 + 1
+    ny_ = cy1 - cy0 + 1
+    n_cells = nx_ * ny_
+    edge = np.repeat(np.arange(self.n_edges), n_cells)
+    k = np.arange(len(edge)) - np.repeat(np.cumsum(n_cells) - n_cells, n_cells)
+    gx = cx0[edge] + k // ny_[edge]
+    gy = cy0[edge] + k % ny_[edge]
+    order = np.lexsort((edge, gy, gx))
+    gx, gy, self._cell_edges = gx[order], gy[order], edge[order]
+    self._cells = {}
+    if len(edge):
+      change = np.flatnonzero((np.diff(gx) != 0) | (np.diff(gy) != 0)) + 1
+      starts = np.concatenate(([0], change))
+      ends = np.concatenate((change, [len(edge)]))
+      for x, y, a, b in zip(gx[starts].tolist(), gy[starts].tolist(), starts.tolist(), ends.tolist()):
+        self._cells[(x, y)] = (a, b)
+
+  def visible(self, view, zoom):
+    """Índices das arestas que cruzam view=(minx, miny, maxx, maxy) e aparecem neste zoom."""
+    minx, miny, maxx, maxy = view
+    cx0, cx1 = int(np.floor(minx / self.cell_size)), int(np.floor(maxx / self.cell_size))
+    cy0, cy1 = int(np.floor(miny / self.cell_size)), int(np.floor(maxy / self.cell_size))
+    if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(self._cells):
+      # viewport maior que o mapa: mais barato percorrer as células existentes
+      spans = [s for (x, y), s in self._cells.items() if cx0 <= x <= cx1 and cy0 <= y <= cy1]
+    else:
+      spans = [self._cells[c] for c in ((x, y) for x in range(cx0, cx1 + 1) for y in range(cy0, cy1 + 1))
+               if c in self._cells]
+    if not spans:
+      return np.empty(0, dtype=np.int64)
+    idx = np.unique(np.concatenate([self._cell_edges[a:b] for a, b in spans]))
+    keep = ((self.x1[idx] >= minx) & (self.x0[idx] <= maxx) & (self.y1[idx] >= miny) & (self.y0[idx] <= maxy)
+            & (self.min_zoom[idx] <= zoom))
+    return idx[keep]
+
+  def draw(self, surface, view, zoom, k, ox, oy, inner_color, casing_color):
+    """Desenha (casing + interior) só as ruas visíveis, com pixels = to_pixels(xy, k, ox, oy)."""
+    idx = self.visible(view, zoom)
+    widths = np.clip((self.width[idx] * zoom).astype(np.int64), 1, MAX_WIDTH_PX).tolist()
+    # todos os vértices visíveis (no tier de LOD deste zoom) transformados numa chamada só
+    points, counts = self.geometry.gather(idx, self.geometry.tier_for(k))
+    pts = to_pixels(points, k, ox, oy).tolist()
+    lines = pygame.draw.lines
+    pos = 0
+    for c, w in zip(counts.tolist(), widths):
+      poly = pts[pos:pos + c]
+      pos += c
+      if c < 2:
+        continue
+      lines(surface, casing_color, False, poly, max(1, w + 4))
+      lines(surface, inner_color, False, poly, w)
+    self.last_drawn = len(widths)
+    self.last_culled = self.n_edges - self.last_drawn
+    return self.last_drawn
+
+
+class LayerCache:
+  """Camada estática das ruas pré-desenhada em tiles, reaproveitados enquanto o zoom não muda.
+
+  Os tiles ficam num espaço de pixels alinhado ao mundo (px = x * k, py = -y * k, com k em
+  pixels por metro), então pan só muda o deslocamento do blit. Trocar o zoom cria tiles novos;
+  os níveis de zoom mais antigos e os tiles menos usados saem do cache (LRU).
+  """
+
+  def __init__(self, renderer, background, inner_color, casing_color, tile_px=TILE_PX,
+               max_tiles=MAX_TILES, max_zoom_levels=MAX_ZOOM_LEVELS):
+    self.renderer = renderer
+    self.background = background
+    self.inner_color = inner_color
+    self.casing_color = casing_color
+    self.tile_px = tile_px
+    self.max_tiles = max_tiles
+    self.max_zoom_levels = max_zoom_levels
+    self._tiles = OrderedDict()  # (zoom, i, j) -> Surface
+    self._zooms = OrderedDict()  # níveis de zoom em cache, do mais antigo ao mais recente
+    self.last_blitted = 0
+    self.last_rendered = 0
+    self.last_edges_drawn = 0  # arestas desenhadas nos tiles novos do último draw
+    self.last_pending = 0      # tiles visíveis que ficaram para o próximo draw (max_new)
+
+  def __len__(self):
+    return len(self._tiles)
+
+  def clear(self):
+    self._tiles.clear()
+    self._zooms.clear()
+
+  def _render(self, k, zoom, i, j):
+    t = self.tile_px
+    tile = pygame.Surface((t, t))
+    if pygame.display.get_surface() is not None:
+      tile = tile.convert()
+    tile.fill(self.background)
+    # retângulo do tile no mundo, com folga da largura máxima das vias
+    pad = MAX_WIDTH_PX + 4
+    view = ((i * t - pad) / k, -((j + 1) * t + pad) / k, ((i + 1) * t + pad) / k, -(j * t - pad) / k)
+    self.last_edges_drawn += self.renderer.draw(tile, view, zoom, k, -i * t, -j * t, self.inner_color,
+                                                self.casing_color)
+    return tile
+
+  def _use_zoom(self, zkey):
+    if zkey in self._zooms:
+      self._zooms.move_to_end(zkey)
+      return
+    self._zooms[zkey] = True
+    while len(self._zooms) > self.max_zoom_levels:
+      old, _ = self._zooms.popitem(last=False)
+      for key in [key for key in self._tiles if key[0] == old]:
+        del self._tiles[key]
+
+  def draw(self, surface, k, zoom, tx, ty, max_new=None):
+    """Blita os tiles que cobrem a tela; pixels = to_pixels(xy, k, floor(tx), floor(ty)).
+
+    max_new limita quantos tiles novos são desenhados nesta chamada: os que faltam ficam para
+    as próximas (last_pending), e a camada aparece aos poucos sem travar o quadro.
+    """
+    zkey = round(k, 9)
+    self._use_zoom(zkey)
+    t = self.tile_px
+    w, h = surface.get_size()
+    ox, oy = math.floor(tx), math.floor(ty)
+    self.last_blitted = 0
+    self.last_rendered = 0
+    self.last_edges_drawn = 0
+    self.last_pending = 0
+    for i in range((-ox) // t, (w - 1 - ox) // t + 1):
+      for j in range((-oy) // t, (h - 1 - oy) // t + 1):
+        key = (zkey, i, j)
+        tile = self._tiles.get(key)
+        if tile is None:
+          if max_new is not None and self.last_rendered >= max_new:
+            self.last_pending += 1
+            continue
+          tile = self._tiles[key] = self._render(k, zoom, i, j)
+          self.last_rendered += 1
+        else:
+          self._tiles.move_to_end(key)
+        surface.blit(tile, (i * t + ox, j * t + oy))
+        self.last_blitted += 1
+    while len(self._tiles) > max(self.max_tiles, self.last_blitted):
+      self._tiles.popitem(last=False)
+    count('tiles.miss', self.last_rendered)
+    count('tiles.hit', self.last_blitted - self.last_rendered)
+    return self.last_blitted
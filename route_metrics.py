@@ -0,0 +1,171 @@
+import weakref
+
+import numpy as np
+
+from edge_geometry import edge_coords
+
+# Limiares (graus) da mudança de direção entre duas arestas seguidas da rota
+TURN_MIN_DEG = 30.0
+SHARP_TURN_DEG = 120.0
+U_TURN_DEG = 165.0
+TURN_KINDS = ('left', 'right', 'sharp_left', 'sharp_right', 'u_turn')
+
+# Índices já montados por grafo (o HUD e o lote consultam o mesmo grafo muitas vezes)
+_metrics_cache = weakref.WeakKeyDictionary()
+
+
+def highway_of(data):
+  hw = data.get('highway', 'residential')
+  if isinstance(hw, list):
+    hw = hw[0] if hw else 'residential'
+  return hw
+
+
+def _bearing(x0, y0, x1, y1):
+  # direção (graus, anti-horário a partir do leste) de (x0, y0) -> (x1, y1) em lon/lat
+  dx = (np.asarray(x1) - x0) * np.cos(np.radians((np.asarray(y0) + y1) / 2))
+  return np.degrees(np.arctan2(np.asarray(y1) - y0, dx))
+
+
+class RouteMetrics:
+  """Estatísticas de rotas a partir de arrays, sem get_edge_data por trecho.
+
+  Para cada par (u, v) guarda só a "melhor" aresta paralela (a de menor length, a mesma que
+  as estatísticas sempre usaram): comprimento, tempo, tipo de via e a direção de saída e de
+  chegada. Os pares ficam ordenados pela chave u * n + v, então os trechos de muitas rotas
+  são achados numa busca binária vetorizada só.
+  """
+
+  def __init__(self, node_ids, pair_key, length, travel_time, highway, highway_table, bearing_out, bearing_in):
+    self.node_ids = np.asarray(node_ids, dtype=np.int64)
+    self._order = np.argsort(self.node_ids, kind='stable')
+    self._sorted_ids = self.node_ids[self._order]
+    self.pair_key = np.asarray(pair_key, dtype=np.int64)
+    self.length = np.asarray(length, dtype=np.float64)
+    self.travel_time = np.asarray(travel_time, dtype=np.float64)
+    self.highway = np.asarray(highway, dtype=np.int64)
+    self.highway_table = list(highway_table)
+    self.bearing_out = np.asarray(bearing_out, dtype=np.float64)
+    self.bearing_in = np.asarray(bearing_in, dtype=np.float64)
+
+  @classmethod
+  def from_graph(cls, G):
+    """Índice da melhor aresta paralela de cada par (u, v) de G (não projetado, lon/lat)."""
+    node_ids = list(G.nodes)
+    index = {n: i for i, n in enumerate(node_ids)}
+    n = len(node_ids)
+    keys, length, travel_time, highway, start, end = [], [], [], [], [], []
+    table = {}
+    for u, nbrs in G._adj.items():
+      for v, keydict in nbrs.items():
+        data = min(keydict.values(), key=lambda d: d.get('length', 0))
+        keys.append(index[u] * n + index[v])
+        length.append(data.get('length', 0.0))
+        travel_time.append(data.get('travel_time', 0.0))
+        highway.append(table.setdefault(highway_of(data), len(table)))
+        # direção no começo e no fim da aresta (pela geometria, se houver)
+        c = edge_coords(G, u, v, data)
+        start.append((c[0][0], c[0][1], c[1][0], c[1][1]))
+        end.append((c[-2][0], c[-2][1], c[-1][0], c[-1][1]))
+    start = np.asarray(start, dtype=np.float64).reshape(-1, 4)
+    end = np.asarray(end, dtype=np.float64).reshape(-1, 4)
+    keys = np.asarray(keys, dtype=np.int64)
+    order = np.argsort(keys, kind='stable')
+    return cls(
+      node_ids, keys[order], np.asarray(length)[order], np.asarray(travel_time)[order],
+      np.asarray(highway, dtype=np.int64)[order], list(table),
+      _bearing(*start.T)[order], _bearing(*end.T)[order],
+    )
+
+  @property
+  def n_nodes(self):
+    return len(self.node_ids)
+
+  def _node_index(self, nodes):
+    nodes = np.asarray(nodes, dtype=np.int64)
+    pos = np.searchsorted(self._sorted_ids, nodes)
+    pos = np.minimum(pos, len(self._sorted_ids) - 1)
+    bad = self._sorted_ids[pos] != nodes
+    if bad.any():
+      raise KeyError(f"Nó {int(nodes[np.argmax(bad)])} não está no grafo")
+    return self._order[pos]
+
+  def edge_index(self, paths):
+    """(índice da melhor aresta de cada trecho, rota de cada trecho) de todas as rotas juntas."""
+    sizes = np.fromiter((len(p) for p in paths), dtype=np.int64, count=len(paths))
+    nodes = np.fromiter((n for p in paths for n in p), dtype=np.int64, count=int(sizes.sum()))
+    route = np.repeat(np.arange(len(paths)), sizes)
+    idx = self._node_index(nodes)
+    # trecho = nó seguido do próximo nó da mesma rota
+    hop = route[:-1] == route[1:]
+    keys = idx[:-1][hop] * self.n_nodes + idx[1:][hop]
+    edge = np.searchsorted(self.pair_key, keys)
+    edge = np.minimum(edge, max(len(self.pair_key) - 1, 0))
+    missing = self.pair_key[edge] != keys if len(self.pair_key) else np.ones(len(keys), dtype=bool)
+    if missing.any():
+      i = int(np.argmax(missing))
+      u, v = divmod(int(keys[i]), self.n_nodes)
+      raise KeyError(f"Não há aresta entre {self.node_ids[u]} e {self.node_ids[v]}")
+    return edge, route[:-1][hop]
+
+  def metrics_many(self, paths):
+    """Métricas de várias rotas numa passada vetorizada.
+
+    Devolve um dict de arrays (uma linha por rota): length_m, travel_time_s, edges,
+    highway_length_m / highway_time_s (colunas na ordem de highway_table) e turns
+    (colunas na ordem de TURN_KINDS).
+    """
+    n = len(paths)
+    edge, route = self.edge_index(paths)
+    n_hw = len(self.highway_table)
+    cell = route * n_hw + self.highway[edge]
+    result = {
+      'length_m': np.bincount(route, weights=self.length[edge], minlength=n),
+      'travel_time_s': np.bincount(route, weights=self.travel_time[edge], minlength=n),
+      'edges': np.bincount(route, minlength=n),
+      'highway_length_m': np.bincount(cell, weights=self.length[edge], minlength=n * n_hw).reshape(n, n_hw),
+      'highway_time_s': np.bincount(cell, weights=self.travel_time[edge], minlength=n * n_hw).reshape(n, n_hw),
+    }
+    # conversões: mudança de direção entre a chegada de um trecho e a saída do seguinte
+    same = route[:-1] == route[1:]
+    delta = (self.bearing_out[edge[1:]] - self.bearing_in[edge[:-1]] + 180.0) % 360.0 - 180.0
+    delta, owner = delta[same], route[:-1][same]
+    mag = np.abs(delta)
+    kind = np.full(len(delta), -1, dtype=np.int64)
+    kind[(mag >= TURN_MIN_DEG) & (delta > 0)] = 0
+    kind[(mag >= TURN_MIN_DEG) & (delta < 0)] = 1
+    kind[(mag >= SHARP_TURN_DEG) & (delta > 0)] = 2
+    kind[(mag >= SHARP_TURN_DEG) & (delta < 0)] = 3
+    kind[mag >= U_TURN_DEG] = 4
+    turn = kind >= 0
+    result['turns'] = np.bincount(owner[turn] * len(TURN_KINDS) + kind[turn],
+                                  minlength=n * len(TURN_KINDS)).reshape(n, len(TURN_KINDS))
+    return result
+
+  def metrics(self, path):
+    """Métricas de uma rota: length_m, travel_time_s, edges, by_highway {tipo: (m, s)}, turns {tipo: n}."""
+    m = self.metrics_many([path])
+    by_highway = {
+      hw: (float(m['highway_length_m'][0, i]), float(m['highway_time_s'][0, i]))
+      for i, hw in enumerate(self.highway_table) if m['highway_length_m'][0, i] > 0 or m['highway_time_s'][0, i] > 0
+    }
+    return {
+      'length_m': float(m['length_m'][0]),
+      'travel_time_s': float(m['travel_time_s'][0]),
+      'edges': int(m['edges'][0]),
+      'by_highway': by_highway,
+      'turns': dict(zip(TURN_KINDS, m['turns'][0].tolist())),
+    }
+
+  def totals(self, path):
+    """(comprimento, tempo) da rota."""
+    m = self.metrics_many([path])
+    return float(m['length_m'][0]), float(m['travel_time_s'][0])
+
+
+def metrics_for(G):
+  """RouteMetrics de G, montado uma vez por grafo e mantido em cache."""
+  rm = _metrics_cache.get(G)
+  if rm is None:
+    rm = _metrics_cache[G] = RouteMetrics.from_graph(G)
+  return rm
@@ -0,0 +1,134 @@
+import math
+from heapq import heappush, heappop
+
+import numpy as np
+import networkx as nx
+
+from compiled_graph import astar_indices, relaxed_edges
+from heuristics import great_circle_heuristic
+from instrumentation import span, count
+
+# Algoritmos selecionáveis ao lado de weight='length'/'travel_time'
+ALGORITHMS = ('astar', 'bidirectional', 'alt', 'ch')
+
+
+def bidirectional_astar_indices(cg, source, target, weight='length', to_target=None, from_source=None, stats=None):
+  """A* bidirecional com potenciais médios p(v) = (h_t(v) - h_s(v)) / 2.
+
+  to_target[v] estima d(v, target) e from_source[v] estima d(source, v); ambas precisam ser
+  consistentes (como a geodésica). Com os potenciais médios os custos reduzidos ficam não
+  negativos nas duas direções e vale o critério de parada da Dijkstra bidirecional:
+  topo_frente + topo_trás >= melhor caminho encontrado.
+  """
+  offsets, targets, wts = cg.adjacency(weight)
+  roffsets, rsources, rwts = cg.reverse_adjacency(weight)
+  pot = ((np.asarray(to_target) - np.asarray(from_source)) * 0.5).tolist()
+
+  dist_f = {source: 0.0}
+  dist_r = {target: 0.0}
+  parent_f = {source: -1}
+  parent_r = {target: -1}
+  settled_f = set()
+  settled_r = set()
+  queue_f = [(pot[source], source)]
+  queue_r = [(-pot[target], target)]
+  best = math.inf
+  meet = -1
+  if source == target:
+    best, meet = 0.0, source
+
+  while queue_f and queue_r:
+    if queue_f[0][0] + queue_r[0][0] >= best:
+      break
+    # expande o lado com a menor fila
+    if len(queue_f) <= len(queue_r):
+      _, u = heappop(queue_f)
+      if u in settled_f:
+        continue
+      settled_f.add(u)
+      g = dist_f[u]
+      for e in range(offsets[u], offsets[u + 1]):
+        v = targets[e]
+        ng = g + wts[e]
+        if ng < dist_f.get(v, math.inf):
+          dist_f[v] = ng
+          parent_f[v] = u
+          heappush(queue_f, (ng + pot[v], v))
+        if v in dist_r and ng + dist_r[v] < best:
+          best = ng + dist_r[v]
+          meet = v
+    else:
+      _, u = heappop(queue_r)
+      if u in settled_r:
+        continue
+      settled_r.add(u)
+      g = dist_r[u]
+      for e in range(roffsets[u], roffsets[u + 1]):
+        v = rsources[e]
+        ng = g + rwts[e]
+        if ng < dist_r.get(v, math.inf):
+          dist_r[v] = ng
+          parent_r[v] = u
+          heappush(queue_r, (ng - pot[v], v))
+        if v in dist_f and ng + dist_f[v] < best:
+          best = ng + dist_f[v]
+          meet = v
+
+  if stats is not None:
+    stats['settled'] = len(settled_f) + len(settled_r)
+    stats['relaxed'] = relaxed_edges(offsets, settled_f) + relaxed_edges(roffsets, settled_r)
+    stats['cost'] = best
+  if meet == -1:
+    raise nx.NetworkXNoPath(f"Node {cg.node_ids[target]} not reachable from {cg.node_ids[source]}")
+  path = []
+  node = meet
+  while node != -1:
+    path.append(node)
+    node = parent_f[node]
+  path.reverse()
+  node = parent_r[meet]
+  while node != -1:
+    path.append(node)
+    node = parent_r[node]
+  return path
+
+
+def shortest_path(cg, source, target, weight='length', algorithm='astar', heuristic=None, landmarks=None,
+                  hierarchy=None):
+  """Rota entre dois nós (ids) com o algoritmo escolhido; devolve (nós, stats).
+
+  stats traz 'algorithm', 'settled' (nós assentados, para comparar a poda), 'relaxed' (arestas
+  examinadas) e 'cost'.
+  heuristic (lista ou array pré-calculado para o destino; prefira DestinationHeuristic.value_list) só é usado pelo 'astar'; 'alt' precisa de landmarks
+  e 'ch' da hierarquia de contração (ver contraction.hierarchy_for).
+  """
+  if algorithm not in ALGORITHMS:
+    raise ValueError(f"Algoritmo desconhecido: {algorithm} (use um de {ALGORITHMS})")
+  s = cg.index_of(source)
+  t = cg.index_of(target)
+  stats = {'algorithm': algorithm}
+  with span('search', algorithm=algorithm):
+    if algorithm == 'ch':
+      if hierarchy is None:
+        raise ValueError("algorithm='ch' precisa da hierarquia de contração (ver contraction.hierarchy_for)")
+      if hierarchy.weight != weight:
+        raise ValueError(f"Hierarquia calculada para '{hierarchy.weight}', não para '{weight}'")
+      path = hierarchy.query_indices(s, t, stats)
+    elif algorithm == 'bidirectional':
+      to_target = great_circle_heuristic(cg, target, weight=weight).values
+      from_source = great_circle_heuristic(cg, source, weight=weight).values
+      path = bidirectional_astar_indices(cg, s, t, weight, to_target, from_source, stats)
+    else:
+      if algorithm == 'alt':
+        if landmarks is None:
+          raise ValueError("algorithm='alt' precisa das tabelas de landmarks (ver landmarks.landmarks_for)")
+        if landmarks.weight != weight:
+          raise ValueError(f"Landmarks calculados para '{landmarks.weight}', não para '{weight}'")
+        # max de dois limites inferiores continua admissível
+        heuristic = np.maximum(landmarks.heuristic(t), great_circle_heuristic(cg, target, weight=weight).values)
+      elif heuristic is None:
+        heuristic = great_circle_heuristic(cg, target, weight=weight).value_list
+      path = astar_indices(cg, s, t, weight, heuristic, stats)
+  count('search.settled', stats.get('settled', 0))
+  count('search.relaxed', stats.get('relaxed', 0))
+  return cg.to_nodes(path), stats
@@ -0,0 +1,223 @@
+import math
+
+import numpy as np
+
+try:
+  from scipy.spatial import cKDTree
+except ImportError:  # pragma: no cover
+  cKDTree = None
+
+from instrumentation import span, count
+
+EARTH_RADIUS_M = 6_371_009
+# Trechos mais longos que isso são divididos; limita o raio extra da busca exata por aresta
+MAX_SEGMENT_M = 50.0
+# Vizinhos (pontos médios de trechos) consultados na primeira passada do snapping em arestas
+FIRST_PASS_K = 8
+
+
+def local_xy(lat, lon, lat0):
+  """Projeção equirretangular em torno de lat0, em metros (erro desprezível na escala de uma cidade)."""
+  lat = np.radians(np.asarray(lat, dtype=np.float64))
+  lon = np.radians(np.asarray(lon, dtype=np.float64))
+  return np.column_stack((EARTH_RADIUS_M * lon * math.cos(math.radians(lat0)), EARTH_RADIUS_M * lat))
+
+
+def _points(points):
+  pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+  return pts[:, 0], pts[:, 1]
+
+
+def _segment_distance(px, py, ax, ay, bx, by):
+  # distância ponto-segmento (vetorizada) e parâmetro t da projeção em [0, 1]
+  dx = bx - ax
+  dy = by - ay
+  den = dx * dx + dy * dy
+  with np.errstate(invalid='ignore', divide='ignore'):
+    t = np.where(den > 0, ((px - ax) * dx + (py - ay) * dy) / den, 0.0)
+  t = np.clip(t, 0.0, 1.0)
+  qx = ax + t * dx
+  qy = ay + t * dy
+  return np.hypot(px - qx, py - qy), t
+
+
+class SnapIndex:
+  """Índice espacial para "encaixar" pontos (lat, lon) no grafo.
+
+  Guarda uma KD-tree dos nós e outra dos pontos médios dos trechos das arestas (geometria do
+  OSM quando houver, quebrada em trechos de até MAX_SEGMENT_M). A busca por aresta é exata:
+  com o melhor trecho entre os FIRST_PASS_K vizinhos como limite D, qualquer trecho mais
+  perto tem o ponto médio a menos de D + meio trecho máximo.
+  """
+
+  def __init__(self, node_ids, node_lat, node_lon, edge_u, edge_v, edge_key, seg_edge, seg_offset,
+               seg_a, seg_b, edge_length, lat0):
+    self.node_ids = np.asarray(node_ids, dtype=np.int64)
+    self.node_lat = np.asarray(node_lat, dtype=np.float64)
+    self.node_lon = np.asarray(node_lon, dtype=np.float64)
+    self.edge_u = np.asarray(edge_u, dtype=np.int64)
+    self.edge_v = np.asarray(edge_v, dtype=np.int64)
+    self.edge_key = np.asarray(edge_key, dtype=np.int64)
+    self.edge_length = np.asarray(edge_length, dtype=np.float64)
+    self.seg_edge = np.asarray(seg_edge, dtype=np.int64)
+    self.seg_offset = np.asarray(seg_offset, dtype=np.float64)
+    self.seg_a = np.asarray(seg_a, dtype=np.float64)
+    self.seg_b = np.asarray(seg_b, dtype=np.float64)
+    self.lat0 = float(lat0)
+    if cKDTree is None:
+      raise ImportError("scipy é necessário para o SnapIndex (pip install scipy)")
+    self._node_tree = cKDTree(local_xy(self.node_lat, self.node_lon, self.lat0))
+    self._seg_len = np.hypot(*(self.seg_b - self.seg_a).T)
+    self._half = float(self._seg_len.max()) / 2 if len(self._seg_len) else 0.0
+    self._seg_tree = cKDTree((self.seg_a + self.seg_b) / 2) if len(self.seg_a) else None
+
+  @classmethod
+  def from_graph(cls, G, max_segment_m=MAX_SEGMENT_M):
+    """Monta o índice a partir de um grafo osmnx não projetado (lat/lon)."""
+    node_ids = list(G.nodes)
+    node_lat = np.fromiter((G.nodes[n]['y'] for n in node_ids), dtype=np.float64, count=len(node_ids))
+    node_lon = np.fromiter((G.nodes[n]['x'] for n in node_ids), dtype=np.float64, count=len(node_ids))
+    lat0 = float(node_lat.mean()) if len(node_ids) else 0.0
+
+    # vértices de todas as arestas num buffer só; edge_of diz a que aresta cada vértice pertence
+    edges = list(G.edges(keys=True, data=True))
+    xs, ys, counts = [], [], []
+    for u, v, _, d in edges:
+      geom = d.get('geometry')
+      if geom is not None:
+        cx, cy = geom.xy
+        xs.extend(cx)
+        ys.extend(cy)
+        counts.append(len(cx))
+      else:
+        xs.extend((G.nodes[u]['x'], G.nodes[v]['x']))
+        ys.extend((G.nodes[u]['y'], G.nodes[v]['y']))
+        counts.append(2)
+    counts = np.asarray(counts, dtype=np.int64)
+    xy = local_xy(ys, xs, lat0)
+    edge_of = np.repeat(np.arange(len(edges)), counts)
+
+    # trechos = pares de vértices consecutivos da mesma aresta
+    same = edge_of[:-1] == edge_of[1:]
+    a = xy[:-1][same]
+    b = xy[1:][same]
+    seg_edge = edge_of[:-1][same]
+    seg_len = np.hypot(*(b - a).T)
+    # distância acumulada desde o início da aresta até o começo de cada trecho
+    cum = np.cumsum(seg_len)
+    first = np.searchsorted(seg_edge, seg_edge, side='left')
+    seg_offset = cum - seg_len - (cum[first] - seg_len[first])
+    edge_length = np.bincount(seg_edge, weights=seg_len, minlength=len(edges))
+
+    # quebra os trechos longos em pedaços iguais de até max_segment_m
+    pieces = np.maximum(1, np.ceil(seg_len / max_segment_m)).astype(np.int64)
+    rep = np.repeat(np.arange(len(seg_len)), pieces)
+    k = np.arange(len(rep)) - np.repeat(np.cumsum(pieces) - pieces, pieces)
+    t0 = (k / pieces[rep])[:, None]
+    t1 = ((k + 1) / pieces[rep])[:, None]
+    d = b[rep] - a[rep]
+    index = {n: i for i, n in enumerate(node_ids)}
+    return cls(
+      node_ids, node_lat, node_lon,
+      [index[u] for u, _, _, _ in edges], [index[v] for _, v, _, _ in edges], [k for _, _, k, _ in edges],
+      seg_edge[rep], seg_offset[rep] + t0[:, 0] * seg_len[rep], a[rep] + t0 * d, a[rep] + t1 * d,
+      edge_length, lat0,
+    )
+
+  @property
+  def n_segments(self):
+    return len(self.seg_a)
+
+  def snap_nodes(self, points):
+    """Nó mais próximo de cada ponto (lat, lon): (ids dos nós, distâncias em metros)."""
+    lat, lon = _points(points)
+    dist, idx = self._node_tree.query(local_xy(lat, lon, self.lat0))
+    return self.node_ids[idx], dist
+
+  def nearest_node(self, point):
+    nodes, _ = self.snap_nodes([point])
+    return int(nodes[0])
+
+  def snap_edges(self, points):
+    """Aresta mais próxima de cada ponto (lat, lon), numa chamada vetorizada para o lote todo.
+
+    Devolve um dict de arrays: u, v, key (aresta), lat/lon do ponto projetado sobre ela, dist
+    (metros até a aresta), offset (metros desde u ao longo da aresta), length (metros) e node,
+    a ponta da aresta mais próxima do ponto projetado (para começar/terminar a busca).
+    """
+    if self._seg_tree is None:
+      raise ValueError("grafo sem arestas")
+    lat, lon = _points(points)
+    p = local_xy(lat, lon, self.lat0)
+    n = len(p)
+    # 1ª passada: melhor trecho entre os k pontos médios mais próximos -> limite superior D
+    k = min(FIRST_PASS_K, self.n_segments)
+    _, near = self._seg_tree.query(p, k=k)
+    near = near.reshape(n, k)
+    d, _ = _segment_distance(p[:, :1], p[:, 1:], self.seg_a[near, 0], self.seg_a[near, 1],
+                             self.seg_b[near, 0], self.seg_b[near, 1])
+    bound = d.min(axis=1) + self._half + 1e-9
+    # 2ª passada: todos os trechos cujo ponto médio cabe no raio D + meio trecho
+    lists = self._seg_tree.query_ball_point(p, bound)
+    sizes = np.fromiter((len(c) for c in lists), dtype=np.int64, count=n)
+    cand = np.fromiter((s for c in lists for s in c), dtype=np.int64, count=int(sizes.sum()))
+    owner = np.repeat(np.arange(n), sizes)
+    d, t = _segment_distance(p[owner, 0], p[owner, 1], self.seg_a[cand, 0], self.seg_a[cand, 1],
+                             self.seg_b[cand, 0], self.seg_b[cand, 1])
+    # menor distância por ponto (empate: trecho de menor índice)
+    order = np.lexsort((cand, d, owner))
+    best = order[np.searchsorted(owner[order], np.arange(n))]
+    seg = cand[best]
+    t = t[best]
+    q = self.seg_a[seg] + t[:, None] * (self.seg_b[seg] - self.seg_a[seg])
+    edge = self.seg_edge[seg]
+    offset = self.seg_offset[seg] + t * self._seg_len[seg]
+    length = self.edge_length[edge]
+    u = self.edge_u[edge]
+    v = self.edge_v[edge]
+    coslat = math.cos(math.radians(self.lat0))
+    return {
+      'u': self.node_ids[u], 'v': self.node_ids[v], 'key': self.edge_key[edge],
+      'lat': np.degrees(q[:, 1] / EARTH_RADIUS_M), 'lon': np.degrees(q[:, 0] / (EARTH_RADIUS_M * coslat)),
+      'dist': d[best], 'offset': offset, 'length': length,
+      'node': self.node_ids[np.where(offset * 2 <= length, u, v)],
+    }
+
+  def nearest_edge(self, point):
+    """Mesmo que snap_edges para um único ponto, com valores escalares."""
+    snap = self.snap_edges([point])
+    return {k: v[0].item() for k, v in snap.items()}
+
+  def to_arrays(self):
+    return {
+      'node_ids': self.node_ids, 'node_lat': self.node_lat, 'node_lon': self.node_lon,
+      'edge_u': self.edge_u, 'edge_v': self.edge_v, 'edge_key': self.edge_key, 'edge_length': self.edge_length,
+      'seg_edge': self.seg_edge, 'seg_offset': self.seg_offset, 'seg_a': self.seg_a, 'seg_b': self.seg_b,
+    }
+
+  def save(self, store, key):
+    store.save_extra(key, 'snap', self.to_arrays(), {'lat0': self.lat0})
+
+  @classmethod
+  def load(cls, store, key):
+    extra = store.load_extra(key, 'snap')
+    if extra is None:
+      return None
+    a, header = extra
+    return cls(a['node_ids'], a['node_lat'], a['node_lon'], a['edge_u'], a['edge_v'], a['edge_key'],
+               a['seg_edge'], a['seg_offset'], a['seg_a'], a['seg_b'], a['edge_length'], header['lat0'])
+
+
+def snap_index_for(G, store=None, key=None):
+  """Índice de snapping do grafo: lido do snapshot (store, key) se existir, senão construído e salvo."""
+  if store is not None and key is not None:
+    index = SnapIndex.load(store, key)
+    if index is not None and len(index.node_ids) == G.number_of_nodes():
+      count('snap_index.hit')
+      return index
+  count('snap_index.miss')
+  with span('snap_index.build'):
+    index = SnapIndex.from_graph(G)
+  if store is not None and key is not None:
+    index.save(store, key)
+  return index
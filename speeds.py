@@ -0,0 +1,101 @@
+import re
+import math
+from functools import lru_cache
+
+import numpy as np
+
+MILES_TO_KM = 1.60934
+# Último recurso quando nenhuma aresta tem maxspeed (nem hwy_speeds/fallback foram dados)
+DEFAULT_KPH = 30.0
+# Mesmo padrão do osmnx (adaptado da wiki do OSM): "50", "50 km/h", "30 mph", "60,5"...
+_MAXSPEED_RE = re.compile(r"^([0-9][\.,0-9]+?)(?:[ ]?(?:km/h|kmh|kph|mph|knots))?$")
+
+
+@lru_cache(maxsize=None)
+def parse_maxspeed(value):
+  """km/h de um valor (str) de maxspeed do OSM, ou None se inválido. Velocidades por faixa ("50|30") viram a média."""
+  speeds = []
+  for part in value.split('|'):
+    m = _MAXSPEED_RE.match(part)
+    if m is None:
+      return None
+    try:
+      speed = float(m.group(1).replace(',', '.'))
+    except ValueError:
+      return None
+    if 'mph' in value.lower():
+      speed *= MILES_TO_KM
+    speeds.append(speed)
+  return float(np.mean(speeds))
+
+
+def _speed_of(value):
+  # valor bruto de maxspeed (str, número ou tupla de uma aresta simplificada) -> km/h ou NaN
+  if value is None:
+    return math.nan
+  if isinstance(value, tuple):
+    # como o osmnx: média das velocidades válidas da lista, truncada para inteiro
+    speeds = [s for s in (parse_maxspeed(str(v)) for v in value) if s is not None]
+    if not speeds:
+      return math.nan
+    value = int(np.mean(speeds))
+  speed = parse_maxspeed(str(value))
+  return math.nan if speed is None else speed
+
+
+def _codes(values):
+  # valores -> (códigos inteiros, tabela dos valores únicos na ordem do código)
+  table = {}
+  codes = np.fromiter((table.setdefault(v, len(table)) for v in values), dtype=np.int64, count=len(values))
+  return codes, list(table)
+
+
+def add_speeds(G, hwy_speeds=None, fallback=None):
+  """Preenche speed_kph e travel_time de todas as arestas numa passada vetorizada.
+
+  Mesmas regras do ox.add_edge_speeds + ox.add_edge_travel_times: maxspeed é interpretado uma
+  vez por valor distinto (tabela memoizada), arestas sem maxspeed recebem a média do seu tipo
+  de via (ou hwy_speeds[tipo]), tipos sem nenhum dado recebem fallback ou a média dos tipos.
+  Marca G.graph['speeds_imputed'] para que ensure_speeds não repita o trabalho.
+  """
+  data = [d for _, _, d in G.edges(data=True)]
+  G.graph['speeds_imputed'] = True
+  if not data:
+    return G
+  length = np.fromiter((d.get('length', 0.0) for d in data), dtype=np.float64, count=len(data))
+
+  # colunas categóricas: cada valor distinto de maxspeed é interpretado uma vez só
+  raw = [d.get('maxspeed') for d in data]
+  ms_codes, ms_table = _codes([tuple(v) if isinstance(v, list) else v for v in raw])
+  speed = np.asarray([_speed_of(v) for v in ms_table], dtype=np.float64)[ms_codes]
+
+  # média da velocidade conhecida por tipo de via
+  hw = [d.get('highway') for d in data]
+  hw_codes, hw_table = _codes([v[0] if isinstance(v, list) and v else v for v in hw])
+  known = ~np.isnan(speed)
+  sums = np.bincount(hw_codes[known], weights=speed[known], minlength=len(hw_table))
+  counts = np.bincount(hw_codes[known], minlength=len(hw_table))
+  with np.errstate(invalid='ignore', divide='ignore'):
+    hw_avg = sums / counts
+  for i, name in enumerate(hw_table):
+    if hwy_speeds and hwy_speeds.get(name) is not None:
+      hw_avg[i] = hwy_speeds[name]
+  if fallback is not None:
+    hw_avg[np.isnan(hw_avg)] = fallback
+  if np.isnan(hw_avg).all():
+    hw_avg[:] = DEFAULT_KPH
+  hw_avg[np.isnan(hw_avg)] = np.nanmean(hw_avg)
+
+  speed = np.round(np.where(known, speed, hw_avg[hw_codes]), 1)
+  travel_time = np.round((length / 1000) / (speed / 3600), 1)
+  for d, s, t in zip(data, speed.tolist(), travel_time.tolist()):
+    d['speed_kph'] = s
+    d['travel_time'] = t
+  return G
+
+
+def ensure_speeds(G, hwy_speeds=None, fallback=None):
+  """add_speeds só se o grafo ainda não foi enriquecido (ex.: veio de um snapshot do GraphStore)."""
+  if not G.graph.get('speeds_imputed'):
+    add_speeds(G, hwy_speeds, fallback)
+  return G
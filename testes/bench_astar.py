@@ -0,0 +1,110 @@
+import os
+import sys
+import time
+import random
+import argparse
+
+import osmnx as ox
+import networkx as nx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from compiled_graph import CompiledGraph, astar_path
+from heuristics import great_circle_heuristic, projected_heuristic
+from speeds import add_speeds
+from fixtures import grid_graph
+
+ox.settings.log_console = False
+ox.settings.use_cache = True
+
+
+def _cost(G, path, weight):
+  return sum(min(d.get(weight, 1) for d in G.get_edge_data(u, v).values()) for u, v in zip(path[:-1], path[1:]))
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Compara nx.astar_path com o A* do grafo compilado.")
+  parser.add_argument('--place', help="baixa o grafo de um lugar (ex.: 'Santos, Brazil')")
+  parser.add_argument('--grid', type=int, default=120, help="lado da grade sintética (sem rede)")
+  parser.add_argument('--queries', type=int, default=50)
+  parser.add_argument('--weight', default='length', choices=('length', 'travel_time'))
+  parser.add_argument('--seed', type=int, default=42)
+  args = parser.parse_args()
+
+  if args.place:
+    G = ox.graph_from_place(args.place, network_type='drive')
+    G = add_speeds(G)
+  else:
+    G = grid_graph(args.grid)
+  print(f"Grafo: {len(G)} nós, {G.number_of_edges()} arestas")
+
+  t0 = time.perf_counter()
+  cg = CompiledGraph.from_graph(G)
+  print(f"Compilação: {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+  def heuristic(u, v):
+    y1, x1 = G.nodes[u]['y'], G.nodes[u]['x']
+    y2, x2 = G.nodes[v]['y'], G.nodes[v]['x']
+    return ox.distance.great_circle(y1, x1, y2, x2)
+
+  rnd = random.Random(args.seed)
+  nodes = list(G.nodes)
+  pairs = [(rnd.choice(nodes), rnd.choice(nodes)) for _ in range(args.queries)]
+
+  G_proj = ox.project_graph(G)
+  cg_proj = CompiledGraph.from_graph(G, G_proj)
+
+  t_nx = t_cg = t_pre = t_proj = 0.0
+  mismatches = mismatches_pre = worse_proj = 0
+  for o, d in pairs:
+    if args.weight == 'length':
+      h_nx, h_cg = heuristic, None
+    else:
+      # em segundos a heurística do main.py (metros) não é admissível; usa a versão escalada
+      h_nx = great_circle_heuristic(G, d, weight=args.weight)
+      h_cg = lambda u, v, hv=h_nx.values: hv[u]
+    t0 = time.perf_counter()
+    try:
+      p_nx = nx.astar_path(G, o, d, heuristic=h_nx, weight=args.weight)
+    except nx.NetworkXNoPath:
+      p_nx = None
+    t1 = time.perf_counter()
+    try:
+      p_cg = astar_path(cg, o, d, weight=args.weight, heuristic=h_cg)
+    except nx.NetworkXNoPath:
+      p_cg = None
+    t2 = time.perf_counter()
+    # heurística vetorizada: uma passada NumPy por destino, lida por índice no laço
+    h = great_circle_heuristic(cg, d, weight=args.weight)
+    try:
+      p_pre = astar_path(cg, o, d, weight=args.weight, heuristic=h.value_list)
+    except nx.NetworkXNoPath:
+      p_pre = None
+    t3 = time.perf_counter()
+    h = projected_heuristic(cg_proj, d, weight=args.weight)
+    try:
+      p_proj = astar_path(cg_proj, o, d, weight=args.weight, heuristic=h.value_list)
+    except nx.NetworkXNoPath:
+      p_proj = None
+    t4 = time.perf_counter()
+    t_nx += t1 - t0
+    t_cg += t2 - t1
+    t_pre += t3 - t2
+    t_proj += t4 - t3
+    if p_nx != p_cg:
+      mismatches += 1
+    if p_nx != p_pre:
+      mismatches_pre += 1
+    if p_nx is not None and p_proj is not None and _cost(G, p_proj, args.weight) > _cost(G, p_nx, args.weight) + 1e-6:
+      worse_proj += 1
+
+  n = len(pairs)
+  print(f"nx.astar_path:   {t_nx / n * 1000:8.2f} ms/consulta")
+  print(f"compilado (CSR): {t_cg / n * 1000:8.2f} ms/consulta  ({t_nx / max(t_cg, 1e-9):.1f}x)")
+  print(f"  + heurística pré-calculada: {t_pre / n * 1000:8.2f} ms/consulta  ({t_nx / max(t_pre, 1e-9):.1f}x)")
+  print(f"  + heurística projetada:      {t_proj / n * 1000:8.2f} ms/consulta  ({t_nx / max(t_proj, 1e-9):.1f}x)")
+  print(f"Caminhos diferentes: {mismatches}/{n} (compilado), {mismatches_pre}/{n} (pré-calculada)")
+  print(f"Rotas mais caras com a heurística projetada: {worse_proj}/{n}")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,84 @@
+import os
+import sys
+import time
+import random
+import argparse
+import tracemalloc
+
+import osmnx as ox
+import networkx as nx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from compiled_graph import CompiledGraph
+from contraction import ContractionHierarchy
+from search import shortest_path
+from speeds import add_speeds
+from fixtures import grid_graph
+
+ox.settings.log_console = False
+ox.settings.use_cache = True
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Pré-processamento e consultas da hierarquia de contração vs A*.")
+  parser.add_argument('--place', help="baixa o grafo de um lugar (ex.: 'Santos, Brazil')")
+  parser.add_argument('--grid', type=int, default=60, help="lado da grade sintética (sem rede)")
+  parser.add_argument('--queries', type=int, default=200)
+  parser.add_argument('--weight', default='length', choices=('length', 'travel_time'))
+  parser.add_argument('--seed', type=int, default=42)
+  parser.add_argument('--trace-memory', action='store_true',
+                      help="mede o pico de memória do pré-processamento (tracemalloc deixa o build bem mais lento)")
+  args = parser.parse_args()
+
+  if args.place:
+    G = ox.graph_from_place(args.place, network_type='drive')
+    G = add_speeds(G)
+  else:
+    G = grid_graph(args.grid)
+  cg = CompiledGraph.from_graph(G)
+  print(f"Grafo: {cg.n_nodes} nós, {cg.n_edges} arestas (sem paralelas)")
+
+  t0 = time.perf_counter()
+  ch = ContractionHierarchy.build(cg, args.weight)
+  t_build = time.perf_counter() - t0
+  print(f"Pré-processamento: {t_build:.2f} s")
+  if args.trace_memory:
+    tracemalloc.start()
+    ContractionHierarchy.build(cg, args.weight)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"Pico de memória do pré-processamento: {peak / 1024 ** 2:.1f} MB")
+  n_ch_edges = len(ch.fwd_targets) + len(ch.bwd_sources)
+  print(f"Hierarquia: {n_ch_edges} arestas ({n_ch_edges - cg.n_edges} atalhos), {ch.nbytes() / 1024 ** 2:.2f} MB em arrays")
+
+  rnd = random.Random(args.seed)
+  nodes = list(G.nodes)
+  pairs = [(rnd.choice(nodes), rnd.choice(nodes)) for _ in range(args.queries)]
+  # aquece as listas do laço quente e o índice de atalhos
+  shortest_path(cg, pairs[0][0], pairs[0][1], weight=args.weight, algorithm='ch', hierarchy=ch)
+
+  totals = {'astar': [0.0, 0], 'ch': [0.0, 0]}
+  mismatches = 0
+  for o, d in pairs:
+    costs = {}
+    for algorithm in totals:
+      t0 = time.perf_counter()
+      try:
+        _, stats = shortest_path(cg, o, d, weight=args.weight, algorithm=algorithm, hierarchy=ch)
+        costs[algorithm] = stats['cost']
+        totals[algorithm][1] += stats['settled']
+      except nx.NetworkXNoPath:
+        costs[algorithm] = None
+      totals[algorithm][0] += time.perf_counter() - t0
+    if (costs['astar'] is None) != (costs['ch'] is None) or (
+        costs['astar'] is not None and abs(costs['astar'] - costs['ch']) > 1e-6):
+      mismatches += 1
+
+  n = len(pairs)
+  for algorithm, (t, settled) in totals.items():
+    print(f"{algorithm:6s} {t / n * 1000:8.3f} ms/consulta  {settled / n:8.1f} nós assentados")
+  print(f"Custos diferentes: {mismatches}/{n}")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,231 @@
+import os
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+import tracemalloc
+
+# o render-prep importa o pygame; sem janela
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import numpy as np
+import networkx as nx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from fixtures import available_fixtures, load_fixture
+from heuristics import compiled_for, great_circle_heuristic
+from search import shortest_path
+from snapping import SnapIndex
+from route_metrics import RouteMetrics, metrics_for
+from edge_geometry import EdgeGeometry, route_polyline
+from animation import RouteAnimation
+from renderer import StreetRenderer
+from drawing import edge_styles
+
+PERCENTILES = (50, 90, 99)
+# Rotas/pontos usados na passada de memória (tracemalloc deixa tudo bem mais lento)
+MEMORY_SAMPLE = 10
+
+
+def _time_each(fn, items):
+  # latência (ms) de fn(item) para cada item
+  samples = []
+  for item in items:
+    t0 = time.perf_counter()
+    fn(item)
+    samples.append((time.perf_counter() - t0) * 1000)
+  return samples
+
+
+def _peak_mb(fn, items):
+  tracemalloc.start()
+  try:
+    for item in items:
+      fn(item)
+    _, peak = tracemalloc.get_traced_memory()
+  finally:
+    tracemalloc.stop()
+  return peak / 1024 ** 2
+
+
+def summarize(samples):
+  """Percentis, média e total (ms) de uma lista de latências."""
+  arr = np.asarray(samples, dtype=np.float64)
+  summary = {f"p{q}": float(np.percentile(arr, q)) for q in PERCENTILES}
+  summary.update({'mean': float(arr.mean()), 'total': float(arr.sum()), 'n': len(samples)})
+  return summary
+
+
+def _stages(G, G_proj, weight):
+  """Estágio -> função de uma consulta (par O-D, ponto ou repetição)."""
+  cg = compiled_for(G)
+  snap_index = SnapIndex.from_graph(G)
+  metrics = metrics_for(G)
+
+  def astar_nx(pair):
+    # caminho do main.py com USE_COMPILED_GRAPH = False
+    o, d = pair
+    heuristic = great_circle_heuristic(G, d, weight=weight)
+    try:
+      return nx.astar_path(G, o, d, heuristic=heuristic, weight=weight)
+    except nx.NetworkXNoPath:
+      return None
+
+  def astar(pair):
+    o, d = pair
+    heuristic = great_circle_heuristic(cg, d, weight=weight)
+    try:
+      return shortest_path(cg, o, d, weight=weight, heuristic=heuristic.value_list)[0]
+    except nx.NetworkXNoPath:
+      return None
+
+  def route_prep(path):
+    RouteAnimation.from_route(G_proj, path)
+    return route_polyline(G_proj, path)
+
+  def render_prep(_):
+    widths, highways = edge_styles(G_proj)
+    return StreetRenderer(EdgeGeometry.from_graph(G_proj), widths, highways)
+
+  return {
+    'astar_nx': astar_nx,
+    'astar': astar,
+    'snap': lambda point: snap_index.snap_edges([point]),
+    'route_stats': metrics.metrics,
+    'route_prep': route_prep,
+    'render_prep': render_prep,
+    # montagem do índice de métricas (o cache de metrics_for esconderia o custo)
+    'route_stats_index': lambda _: RouteMetrics.from_graph(G),
+  }
+
+
+def run_fixture(name, queries=50, repeat=5, weight='length', seed=42, memory=True):
+  """Mede todos os estágios numa fixture; devolve {'graph', 'stages', 'check'}."""
+  t0 = time.perf_counter()
+  G, G_proj = load_fixture(name)
+  load_ms = (time.perf_counter() - t0) * 1000
+  rnd = random.Random(seed)
+  nodes = list(G.nodes)
+  pairs = [(rnd.choice(nodes), rnd.choice(nodes)) for _ in range(queries)]
+  lat = [d['y'] for _, d in G.nodes(data=True)]
+  lon = [d['x'] for _, d in G.nodes(data=True)]
+  points = [(rnd.uniform(min(lat), max(lat)), rnd.uniform(min(lon), max(lon))) for _ in range(queries)]
+
+  fns = _stages(G, G_proj, weight)
+  # rotas de referência (também aquecem o grafo compilado e as listas do laço quente)
+  paths = [fns['astar'](p) for p in pairs]
+  routes = [p for p in paths if p is not None and len(p) > 1] or [[pairs[0][0]]]
+  inputs = {
+    'astar_nx': pairs, 'astar': pairs, 'snap': points, 'route_stats': routes, 'route_prep': routes,
+    'render_prep': range(repeat), 'route_stats_index': range(repeat),
+  }
+  stages = {'load': {'p50': load_ms, 'mean': load_ms, 'total': load_ms, 'n': 1}}
+  for stage, fn in fns.items():
+    stages[stage] = summarize(_time_each(fn, inputs[stage]))
+    if memory:
+      stages[stage]['peak_mb'] = _peak_mb(fn, list(inputs[stage])[:MEMORY_SAMPLE])
+
+  # resultados para comparar com o baseline: mesmas rotas, mesmo custo total
+  paths_nx = [fns['astar_nx'](p) for p in pairs]
+  metrics = metrics_for(G)
+  cost_key = 'length_m' if weight == 'length' else 'travel_time_s'
+  cost = float(sum(metrics.metrics_many(routes)[cost_key])) if routes[0][1:] else 0.0
+  check = {
+    'routes': len([p for p in paths if p is not None]),
+    'cost': round(cost, 3),
+    'nx_mismatches': sum(1 for a, b in zip(paths_nx, paths) if a != b),
+  }
+  graph = {'nodes': G.number_of_nodes(), 'edges': G.number_of_edges()}
+  return {'graph': graph, 'stages': stages, 'check': check}
+
+
+def compare(results, baseline, tolerance=0.5, min_ms=0.05):
+  """Lista de regressões: p50 mais lento que (1 + tolerance) x baseline, mais memória ou resultados diferentes."""
+  problems = []
+  for name, res in results['fixtures'].items():
+    base = baseline.get('fixtures', {}).get(name)
+    if base is None:
+      continue
+    for key, value in res['check'].items():
+      if key in base['check'] and base['check'][key] != value:
+        problems.append(f"{name}: {key} = {value} (baseline {base['check'][key]})")
+    for stage, s in res['stages'].items():
+      b = base['stages'].get(stage)
+      if b is None or stage == 'load':
+        continue
+      if s['p50'] > max(b['p50'], min_ms) * (1 + tolerance):
+        problems.append(f"{name}/{stage}: p50 {s['p50']:.3f} ms (baseline {b['p50']:.3f} ms, {s['p50'] / max(b['p50'], 1e-9):.2f}x)")
+      if 'peak_mb' in s and 'peak_mb' in b and s['peak_mb'] > b['peak_mb'] * (1 + tolerance) + 0.1:
+        problems.append(f"{name}/{stage}: pico {s['peak_mb']:.2f} MB (baseline {b['peak_mb']:.2f} MB)")
+  return problems
+
+
+def _print_fixture(name, res, baseline=None):
+  g = res['graph']
+  print(f"\n== {name}: {g['nodes']} nós, {g['edges']} arestas ==")
+  base = (baseline or {}).get('fixtures', {}).get(name, {}).get('stages', {})
+  print(f"{'estágio':18s} {'n':>5s} {'p50':>9s} {'p90':>9s} {'p99':>9s} {'pico MB':>8s}  vs baseline")
+  for stage, s in res['stages'].items():
+    cols = ' '.join(f"{s[k]:9.3f}" if k in s else f"{'':9s}" for k in ('p50', 'p90', 'p99'))
+    peak = f"{s['peak_mb']:8.2f}" if 'peak_mb' in s else f"{'':8s}"
+    ratio = f"{s['p50'] / base[stage]['p50']:.2f}x" if stage in base and base[stage]['p50'] > 0 else ''
+    print(f"{stage:18s} {s['n']:5d} {cols} {peak}  {ratio}")
+  c = res['check']
+  print(f"rotas: {c['routes']}  custo total: {c['cost']:.1f}  caminhos diferentes do nx: {c['nx_mismatches']}")
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Benchmarks offline (sem rede) de busca, snapping, estatísticas e render-prep.")
+  parser.add_argument('--fixtures', help="lista separada por vírgula (padrão: todas as sintéticas + snapshots gravados)")
+  parser.add_argument('--queries', type=int, default=50, help="pares O-D / pontos por fixture")
+  parser.add_argument('--repeat', type=int, default=5, help="repetições dos estágios por grafo (render-prep)")
+  parser.add_argument('--weight', default='length', choices=('length', 'travel_time'))
+  parser.add_argument('--seed', type=int, default=42)
+  parser.add_argument('--no-memory', action='store_true', help="pula a passada de pico de memória (tracemalloc)")
+  parser.add_argument('-o', '--output', help="grava os resultados em JSON (serve de baseline depois)")
+  parser.add_argument('--baseline', help="JSON de uma execução anterior para comparar")
+  parser.add_argument('--tolerance', type=float, default=0.5, help="folga relativa antes de acusar regressão")
+  args = parser.parse_args()
+
+  names = args.fixtures.split(',') if args.fixtures else available_fixtures()
+  baseline = None
+  if args.baseline:
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+      baseline = json.load(f)
+    if baseline.get('params', {}).get('weight') not in (None, args.weight):
+      raise SystemExit(f"Erro: baseline medido com weight={baseline['params']['weight']}")
+
+  results = {
+    'params': {'queries': args.queries, 'repeat': args.repeat, 'weight': args.weight, 'seed': args.seed},
+    'env': {'python': platform.python_version(), 'numpy': np.__version__, 'networkx': nx.__version__,
+            'machine': platform.machine(), 'platform': platform.platform()},
+    'fixtures': {},
+  }
+  for name in names:
+    try:
+      res = run_fixture(name, args.queries, args.repeat, args.weight, args.seed, memory=not args.no_memory)
+    except FileNotFoundError as e:
+      print(f"[bench_suite] {name}: {e}")
+      continue
+    results['fixtures'][name] = res
+    _print_fixture(name, res, baseline)
+
+  if args.output:
+    with open(args.output, 'w', encoding='utf-8') as f:
+      json.dump(results, f, indent=1)
+    print(f"\nResultados em {args.output}")
+  if baseline is not None:
+    problems = compare(results, baseline, args.tolerance)
+    if problems:
+      print("\nRegressões em relação ao baseline:")
+      for p in problems:
+        print(f"  {p}")
+      raise SystemExit(1)
+    print(f"\nSem regressões em relação a {args.baseline} (tolerância {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+  main()
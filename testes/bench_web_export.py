@@ -0,0 +1,77 @@
+import os
+import sys
+import time
+import random
+import tempfile
+import argparse
+
+import folium
+import networkx as nx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from fixtures import grid_graph
+from edge_geometry import route_polyline
+from web_export import RouteCollection, decode_polyline, encode_polyline
+
+
+def _dir_size(path):
+  return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+
+def per_route_folium(G, routes, directory):
+  # como o plot_route do map_making.py: um folium.Map + map.save por rota, com as coordenadas cruas
+  for i, path in enumerate(routes):
+    route_coords = [(lat, lon) for lon, lat in route_polyline(G, path)]
+    m = folium.Map(location=route_coords[len(route_coords) // 2], zoom_start=14)
+    folium.Marker(route_coords[0], popup="Origem", icon=folium.Icon(color='green')).add_to(m)
+    folium.Marker(route_coords[-1], popup="Destino", icon=folium.Icon(color='red')).add_to(m)
+    folium.PolyLine(route_coords, color="blue", weight=5, opacity=0.8).add_to(m)
+    m.save(os.path.join(directory, f"route_{i}.html"))
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Compara o map.save por rota com a exportação em lote (web_export).")
+  parser.add_argument('--grid', type=int, default=120, help="lado da grade sintética")
+  parser.add_argument('--routes', type=int, default=1000)
+  parser.add_argument('--tolerance', type=float, default=3.0, help="tolerância da simplificação (m)")
+  parser.add_argument('--seed', type=int, default=42)
+  args = parser.parse_args()
+
+  G = grid_graph(args.grid)
+  rnd = random.Random(args.seed)
+  nodes = list(G.nodes)
+  routes = [nx.shortest_path(G, rnd.choice(nodes), rnd.choice(nodes), weight='length') for _ in range(args.routes)]
+  n_points = sum(len(r) for r in routes)
+  print(f"Grafo: {len(G)} nós; {len(routes)} rotas, {n_points} pontos")
+
+  with tempfile.TemporaryDirectory() as tmp:
+    folium_dir = os.path.join(tmp, 'folium')
+    os.makedirs(folium_dir)
+    t0 = time.perf_counter()
+    per_route_folium(G, routes, folium_dir)
+    t_folium = time.perf_counter() - t0
+    size_folium = _dir_size(folium_dir)
+
+    results = [('folium (1 arquivo por rota)', t_folium, size_folium)]
+    for name, filename in (('HTML em lote (encoded polyline)', 'rotas.html'), ('GeoJSON em lote', 'rotas.geojson')):
+      out = os.path.join(tmp, filename)
+      t0 = time.perf_counter()
+      web = RouteCollection(tolerance_m=args.tolerance)
+      for i, path in enumerate(routes):
+        web.add_path(G, path, i)
+      web.save(out)
+      results.append((name, time.perf_counter() - t0, os.path.getsize(out)))
+
+    # a codificação é sem perdas na precisão escolhida
+    line = web.simplified()[0]
+    assert all(abs(a - b) < 1e-5 for p, q in zip(decode_polyline(encode_polyline(line)), line) for a, b in zip(p, q))
+
+  print(f"{'formato':<34}{'tempo (s)':>12}{'tamanho (KB)':>16}")
+  for name, t, size in results:
+    print(f"{name:<34}{t:>12.3f}{size / 1024:>16.1f}")
+  print(f"HTML em lote: {t_folium / results[1][1]:.0f}x mais rápido, {size_folium / results[1][2]:.0f}x menor")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,143 @@
+import os
+import sys
+import math
+import random
+import argparse
+
+import osmnx as ox
+import networkx as nx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from graph_store import build_graph, graph_to_arrays, arrays_to_graphs, write_npz, read_npz
+
+ox.settings.log_console = False
+ox.settings.use_cache = True
+
+# Snapshots de grafos reais do OSM (mesmo formato do graph_cache/), gravados uma vez com --record
+SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'snapshots')
+
+# Regiões dos endereços de debug do main.py: (centro (lat, lon), raio em metros)
+RECORDED = {
+  'santos': ((-23.9650, -46.3300), 3000),  # Rua Visconde de Faria / Rua Bolívia
+  'tampa': ((27.9780, -82.5100), 4500),    # George J. Bean Pkwy / W Dr Martin Luther King Jr Blvd
+}
+
+
+def grid_graph(n, lat0=-23.96, lon0=-46.33, step_deg=0.001, seed=0):
+  """Grade n x n sintética no formato do osmnx (x/y em graus, 'length' e 'travel_time')."""
+  rnd = random.Random(seed)
+  G = nx.MultiDiGraph(crs='epsg:4326')
+  for i in range(n):
+    for j in range(n):
+      G.add_node(i * n + j, y=lat0 + i * step_deg, x=lon0 + j * step_deg)
+  for i in range(n):
+    for j in range(n):
+      u = i * n + j
+      for di, dj in ((0, 1), (1, 0)):
+        if i + di >= n or j + dj >= n:
+          continue
+        v = (i + di) * n + (j + dj)
+        du, dv = G.nodes[u], G.nodes[v]
+        # comprimento >= distância geodésica, mantendo a heurística admissível
+        base = float(ox.distance.great_circle(du['y'], du['x'], dv['y'], dv['x']))
+        length = base * rnd.uniform(1.0, 1.3)
+        speed = rnd.choice((30.0, 40.0, 60.0))
+        for a, b in ((u, v), (v, u)):
+          G.add_edge(a, b, length=length, speed_kph=speed, travel_time=length * 3.6 / speed)
+  return G
+
+
+def radial_graph(rings, spokes, lat0=-23.96, lon0=-46.33, ring_m=250.0, seed=0):
+  """Anéis concêntricos ligados por avenidas radiais (cidade "radioconcêntrica"), no formato do osmnx.
+
+  As radiais são 'primary' (mais rápidas) e os anéis 'residential', então rotas em travel_time e em
+  length tendem a divergir, como num grafo real.
+  """
+  rnd = random.Random(seed)
+  G = nx.MultiDiGraph(crs='epsg:4326')
+  m_per_deg = 111_320.0
+  G.add_node(0, y=lat0, x=lon0)
+  for r in range(1, rings + 1):
+    for s in range(spokes):
+      a = 2 * math.pi * s / spokes
+      dy = r * ring_m * math.sin(a) / m_per_deg
+      dx = r * ring_m * math.cos(a) / (m_per_deg * math.cos(math.radians(lat0)))
+      G.add_node(r * spokes + s, y=lat0 + dy, x=lon0 + dx)
+
+  def connect(u, v, highway, speed):
+    du, dv = G.nodes[u], G.nodes[v]
+    length = float(ox.distance.great_circle(du['y'], du['x'], dv['y'], dv['x'])) * rnd.uniform(1.0, 1.15)
+    for a, b in ((u, v), (v, u)):
+      G.add_edge(a, b, length=length, highway=highway, speed_kph=speed, travel_time=length * 3.6 / speed)
+
+  for s in range(spokes):
+    connect(0, spokes + s, 'primary', 60.0)
+    for r in range(1, rings + 1):
+      # arco do anel até a próxima radial e trecho da radial até o anel seguinte
+      connect(r * spokes + s, r * spokes + (s + 1) % spokes, 'residential', rnd.choice((30.0, 40.0)))
+      if r < rings:
+        connect(r * spokes + s, (r + 1) * spokes + s, 'primary', 60.0)
+  return G
+
+
+# Grafos sintéticos em vários tamanhos: nome -> (construtor, argumentos)
+SYNTHETIC = {
+  'grid-30': (grid_graph, {'n': 30}),
+  'grid-60': (grid_graph, {'n': 60}),
+  'grid-120': (grid_graph, {'n': 120}),
+  'radial-12x24': (radial_graph, {'rings': 12, 'spokes': 24}),
+  'radial-40x64': (radial_graph, {'rings': 40, 'spokes': 64}),
+}
+
+
+def snapshot_path(name):
+  return os.path.join(SNAPSHOT_DIR, f"{name}.npz")
+
+
+def available_fixtures():
+  """Nomes das fixtures que dá para carregar sem rede: todas as sintéticas e os snapshots já gravados."""
+  return list(SYNTHETIC) + [name for name in RECORDED if os.path.exists(snapshot_path(name))]
+
+
+def load_fixture(name):
+  """(G, G_proj) da fixture; snapshots reais não gravados levantam FileNotFoundError."""
+  if name in SYNTHETIC:
+    build, kwargs = SYNTHETIC[name]
+    G = build(**kwargs)
+    G.graph['simplified'] = True
+    G.graph['speeds_imputed'] = True
+    return G, ox.project_graph(G)
+  if name not in RECORDED:
+    raise KeyError(f"Fixture desconhecida: {name} (use uma de {list(SYNTHETIC) + list(RECORDED)})")
+  path = snapshot_path(name)
+  if not os.path.exists(path):
+    raise FileNotFoundError(f"Snapshot {path} não existe; grave com: python testes/fixtures.py --record {name}")
+  return arrays_to_graphs(*read_npz(path))
+
+
+def record_fixture(name, network_type='drive'):
+  """Baixa a região de RECORDED[name] (precisa de rede) e grava o snapshot em testes/snapshots/."""
+  center, dist = RECORDED[name]
+  G, G_proj = build_graph(center, dist, network_type)
+  arrays, header = graph_to_arrays(G, G_proj)
+  header.update({'center': list(center), 'dist': dist, 'network_type': network_type, 'fixture': name})
+  os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+  write_npz(snapshot_path(name), arrays, header)
+  return snapshot_path(name)
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Fixtures de grafos para os benchmarks offline.")
+  parser.add_argument('--record', nargs='+', choices=list(RECORDED), help="baixa e grava snapshots reais (precisa de rede)")
+  args = parser.parse_args()
+  if args.record:
+    for name in args.record:
+      print(f"[fixtures] {name}: gravado em {record_fixture(name)}")
+    return
+  for name in list(SYNTHETIC) + list(RECORDED):
+    status = 'sintética' if name in SYNTHETIC else ('gravada' if os.path.exists(snapshot_path(name)) else 'não gravada')
+    print(f"{name:14s} {status}")
+
+
+if __name__ == "__main__":
+  main()
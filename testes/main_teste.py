@@ -1,4 +1,4 @@
-from map_making import create_graph, Astar_route, plot_route
+from map_making import create_graph, plot_route
 
 def main():
   # orig_address = input("Digite o endereço de origem: ")
@@ -12,8 +12,7 @@ def main():
     print("Tipo de rota inválido. Usando 'drive' como padrão.")
     route_type = 'drive'
   
-  graph, orig, dest, center = create_graph(orig_address, dest_address, route_type)
-  best_route = Astar_route(graph, orig, dest)
+  graph, best_route, orig, dest, center = create_graph(orig_address, dest_address, route_type)
   
   plot_route(graph, best_route, orig, dest, center)
 
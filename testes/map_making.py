@@ -1,12 +1,25 @@
 import osmnx as ox
 import networkx as nx
-from geopy.geocoders import Nominatim
-from geopy.extra.rate_limiter import RateLimiter
 import folium
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from geocoding import GeocodingService
+from graph_store import GraphStore
+from snapping import SnapIndex, snap_index_for
+from speeds import ensure_speeds
+from route_metrics import metrics_for
+from corridor import corridor_route
 
 ox.settings.log_console = False
 ox.settings.use_cache = True
 
+# Geocodificador compartilhado (cache em disco e no máximo 1 requisição/s ao Nominatim)
+geocoder = GeocodingService()
+# Snapshots dos grafos (graph_cache/) e, junto de cada um, o índice de snapping
+graph_store = GraphStore()
+
 def heuristic(u, v, Graph):
   # Usa distância geodésica (metros) entre os nodos u e v
   y1 = Graph.nodes[u]['y']; x1 = Graph.nodes[u]['x']
@@ -14,22 +27,10 @@ def heuristic(u, v, Graph):
   
   return ox.distance.great_circle_vec(y1, x1, y2, x2)
 
-def safe_geocode(address, geolocator, geocode_fn, timeout=10):
-  """Tenta geocodificar: primeiro geopy (RateLimiter), depois fallback para osmnx.geocode."""
-  try:
-    # geopy RateLimiter - evita 429 Too Many Requests
-    geocode_rate_limited = RateLimiter(geocode_fn, min_delay_seconds=1, max_retries=2, error_wait_seconds=2.0)
-    res = geocode_rate_limited(address, timeout=timeout)
-    if res:
-      # geopy retorna um objeto com latitude/longitude
-      if hasattr(res, 'latitude') and hasattr(res, 'longitude'):
-        return (res.latitude, res.longitude)
-      # osmnx.geocode (quando passada diretamente) pode retornar (lat, lon) tuple
-      if isinstance(res, (tuple, list)) and len(res) >= 2:
-        return (float(res[0]), float(res[1]))
-  except Exception as e:
-    print(f"[safe_geocode] geopy falhou para '{address}': {e}")
-  
+def safe_geocode(address, point=None):
+  """Ponto já geocodificado pelo GeocodingService ou, se ele não achou, fallback para osmnx.geocode."""
+  if point:
+    return point
   # fallback para osmnx.geocode (usa o provedor interno — também pode levantar exceção)
   try:
     print(f"[safe_geocode] Tentando fallback osmnx.geocode para '{address}'")
@@ -43,11 +44,11 @@ def safe_geocode(address, geolocator, geocode_fn, timeout=10):
 
 def create_graph(orig_address, dest_address, route_type):
   # Cria o grafo da área entre os dois endereços
-  geolocator = Nominatim(user_agent="app_rotas")
   
-  # Busca as coordenadas dos endereços requeridos
-  orig_coords = safe_geocode(orig_address, geolocator, geolocator.geocode)
-  dest_coords = safe_geocode(dest_address, geolocator, geolocator.geocode)
+  # Busca as coordenadas dos endereços requeridos (um lote só: repetidos e os já em cache não vão à rede)
+  orig_point, dest_point = geocoder.geocode_many([orig_address, dest_address])
+  orig_coords = safe_geocode(orig_address, orig_point)
+  dest_coords = safe_geocode(dest_address, dest_point)
   
   # print(f"Origem: {local_orig}, Destino: {local_dest}")
   
@@ -63,17 +64,24 @@ def create_graph(orig_address, dest_address, route_type):
   # Pelas coordenadas, fazemos a média para encontrar o ponto central
   center = ((orig_coords[0] + dest_coords[0]) / 2, (orig_coords[1] + dest_coords[1]) / 2)
   
-  # Cria o grafo da área ao redor do ponto central
-  # A distância (dist) é em metros
-  graph = ox.graph_from_point(center, dist=10000, network_type=route_type, simplify=True)
+  # Cria o grafo do corredor entre os dois endereços (elipse com focos na origem e no destino),
+  # ampliado automaticamente se a rota não existir nele ou encostar na borda (ver corridor.py)
+  # A rota sai junto com o grafo: é a busca que decide se o corredor precisa crescer.
+  # O índice de snapping de cada corredor é montado uma vez e salvo junto do snapshot
+  graph, _, _, route, _ = corridor_route(
+    orig_coords, dest_coords,
+    lambda G, G_proj, key: Astar_route(G, orig_coords, dest_coords, snap_index_for(G, graph_store, key)),
+    network_type=route_type, store=graph_store)
   
-  return graph, orig_coords, dest_coords, center
+  return graph, route, orig_coords, dest_coords, center
 
-def Astar_route(graph, orig_coords, dest_coords):
+def Astar_route(graph, orig_coords, dest_coords, snap_index=None):
 
-  # Encontra o nó mais próximo das coordenadas de origem e destino
-  orig_node = ox.distance.nearest_nodes(graph, orig_coords[1], orig_coords[0])
-  dest_node = ox.distance.nearest_nodes(graph, dest_coords[1], dest_coords[0])
+  # Encaixa origem e destino na aresta mais próxima e usa a ponta mais próxima de cada uma
+  # (snap_index: índice já montado para este grafo, ver snapping.snap_index_for)
+  if snap_index is None:
+    snap_index = SnapIndex.from_graph(graph)
+  orig_node, dest_node = snap_index.snap_edges([orig_coords, dest_coords])['node'].tolist()
   
   # Calcula a rota usando o algoritmo A* da biblioteca NetworkX
   # "route" é uma lista de nós que compõem o caminho mais curto por meio do grafo
@@ -83,65 +91,13 @@ def Astar_route(graph, orig_coords, dest_coords):
   return route
 
 def plot_route(graph, route, orig_coords, dest_coords, center):
-  try:
-    graph = ox.add_edge_speeds(graph)         # adiciona 'speed_kph' (quando possível)
-  except Exception as e:
-    print("add_edge_speeds falhou:", e)
+  # speed_kph/travel_time de todas as arestas numa passada vetorizada (não repete se o grafo já tem)
+  graph = ensure_speeds(graph)
   
-  # criar travel_time se possível
-  try:
-    graph = ox.add_edge_travel_times(graph)   # adiciona 'travel_time' quando tem 'length' e 'speed_kph'
-  except Exception as e:
-    print("add_edge_travel_times falhou:", e)
-
-  # Como reforço: garanta que todas as arestas tenham 'speed_kph' e 'travel_time'
-  DEFAULT_KPH = 30.0
-  for u, v, k, data in graph.edges(keys=True, data=True):
-    if 'speed_kph' not in data or data.get('speed_kph') in (None, 0):
-      # tente extrair de maxspeed
-      maxs = data.get('maxspeed')
-      if isinstance(maxs, str):
-        import re
-        m = re.search(r'(\d+(\.\d+)?)', maxs)
-        if m:
-          data['speed_kph'] = float(m.group(1))
-        else:
-          data['speed_kph'] = DEFAULT_KPH
-      elif isinstance(maxs, (int, float)):
-        data['speed_kph'] = float(maxs)
-      else:
-        data['speed_kph'] = DEFAULT_KPH
-    
-    if 'travel_time' not in data or data.get('travel_time') in (None, 0):
-      length_m = data.get('length', 0.0)
-      sp = data.get('speed_kph', DEFAULT_KPH)
-      data['travel_time'] = float(length_m * 3.6 / float(sp))
-  
-  # Helper local para obter atributos das arestas da rota (substitui utils_graph.get_route_edge_attributes)
-  def get_route_edge_attributes(G, route_nodes, attr):
-    valores = []
-    for u, v in zip(route_nodes[:-1], route_nodes[1:]):
-      # Pode haver múltiplas arestas paralelas (multidigraph)
-      if G.has_edge(u, v):
-        edge_data = G.get_edge_data(u, v)
-        # edge_data é um dict (key->data) em MultiDiGraph
-        if isinstance(edge_data, dict):
-          # pega a primeira variante que tiver o atributo
-            # garante ordem estável
-          for k in sorted(edge_data.keys()):
-            data = edge_data[k]
-            if attr in data:
-              valores.append(data[attr])
-              break
-        else:
-          # Graph simples
-          if attr in edge_data:
-            valores.append(edge_data[attr])
-    return valores
-
-  # Calcula o comprimento total da rota (em metros) e o tempo estimado de viagem (em segundos)
-  route_length = sum(get_route_edge_attributes(graph, route, 'length'))
-  route_time = sum(get_route_edge_attributes(graph, route, 'travel_time'))
+  # Comprimento total da rota (em metros) e tempo estimado de viagem (em segundos), numa passada só
+  stats = metrics_for(graph).metrics(route)
+  route_length = stats['length_m']
+  route_time = stats['travel_time_s']
   
   # Gera uma lista de coordenadas (latitude, longitude) para cada nó na rota
   route_coords = [(graph.nodes[node]['y'], graph.nodes[node]['x']) for node in route]
@@ -3,13 +3,21 @@ import geopandas as gpd
 import pandas as pd
 import networkx as nx
 from shapely.geometry import Point
-from geopy.geocoders import Nominatim
-from geopy.extra.rate_limiter import RateLimiter
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from geocoding import GeocodingService
+from address_index import address_index_for
+from snapping import SnapIndex
 
 # Configurações globais do osmnx
 ox.settings.use_cache = True
 ox.settings.log_console = False
 
+# Geocodificador compartilhado (cache em disco e no máximo 1 requisição/s ao Nominatim)
+geocoder = GeocodingService()
+
 
 # -----------------------------
 # Funções auxiliares
@@ -45,69 +53,24 @@ def ensure_gdf(x):
 
 
 def geocode_candidates(address, country_codes='br', max_candidates=5):
-    """Usa Nominatim para pegar candidatos de geocodificação."""
-    geolocator = Nominatim(user_agent="meu_app_endereco")
-    geocode_rl = RateLimiter(geolocator.geocode, min_delay_seconds=1, max_retries=2)
-    try:
-        results = geocode_rl(address, exactly_one=False, limit=max_candidates, addressdetails=True, country_codes=country_codes)
-    except Exception as e:
-        print("geopy erro:", e)
-        results = None
-    candidates = []
-    if results:
-        for r in results:
-            raw = getattr(r, 'raw', {}) or {}
-            candidates.append({
-                'lat': float(getattr(r, 'latitude', raw.get('lat', None)) or 0.0),
-                'lon': float(getattr(r, 'longitude', raw.get('lon', None)) or 0.0),
-                'display_name': raw.get('display_name') or str(r),
-                'raw': raw
-            })
-    return candidates
+    """Usa Nominatim (via GeocodingService, com cache em disco) para pegar candidatos de geocodificação."""
+    return geocoder.candidates(address, limit=max_candidates, country_codes=country_codes)
 
 
 def find_exact_address_point(place_name, street_name, housenumber):
-    """Busca no OSM por features com addr:housenumber e addr:street."""
-    tags = {'addr:housenumber': housenumber, 'addr:street': street_name}
+    """Busca no índice local de endereços (addr:housenumber e addr:street) do lugar."""
     try:
-        gdf = ox.geometries_from_place(place_name, tags)
+        index = address_index_for(place_name)
     except Exception as e:
         print("Erro ao consultar Overpass:", e)
         return []
-    
-    if gdf is None or gdf.empty:
-        return []
-    
-    results = []
-    for idx, row in gdf.iterrows():
-        geometry = row.geometry
-        if geometry is None:
-            continue
-        if geometry.geom_type == 'Point':
-            lon = float(geometry.x)
-            lat = float(geometry.y)
-        else:
-            c = geometry.centroid
-            lon = float(c.x)
-            lat = float(c.y)
-        housenum = row.get('addr:housenumber') if 'addr:housenumber' in row.index else None
-        street = row.get('addr:street') if 'addr:street' in row.index else row.get('name')
-        results.append({
-            'lat': lat,
-            'lon': lon,
-            'housenumber': housenum,
-            'street': street,
-            'geom_type': geometry.geom_type
-        })
-    return results
+    return index.lookup(street_name, housenumber)
 
 
 def find_addresses_by_street(place_name, street_name):
-    """Procura todas as geometrias que contenham addr:street=<street_name>."""
-    tags = {'addr:street': street_name}
+    """GeoDataFrame (pontos em EPSG:4326) dos endereços do índice local com addr:street=<street_name>."""
     try:
-        gdf = ox.geometries_from_place(place_name, tags)
-        return gdf
+        return ensure_gdf(address_index_for(place_name).by_street(street_name))
     except Exception as e:
         print("Erro Overpass/osmnx:", e)
         return gpd.GeoDataFrame()
@@ -119,8 +82,7 @@ def find_addresses_by_street(place_name, street_name):
 def get_route_graph(place, orig_point, dest_point):
     """Baixa o grafo da cidade e retorna rota mais curta."""
     G = ox.graph_from_place(place, network_type="drive")
-    orig_node = ox.distance.nearest_nodes(G, orig_point[1], orig_point[0])  # (lon, lat)
-    dest_node = ox.distance.nearest_nodes(G, dest_point[1], dest_point[0])
+    orig_node, dest_node = SnapIndex.from_graph(G).snap_edges([orig_point, dest_point])['node'].tolist()
     route = nx.shortest_path(G, orig_node, dest_node, weight="length")
     return G, route
 
@@ -0,0 +1,169 @@
+import json
+import math
+
+import numpy as np
+
+from edge_geometry import route_polyline, simplify_polylines
+from snapping import local_xy, EARTH_RADIUS_M
+
+# Desvio máximo (metros) aceito ao simplificar as rotas para a web
+SIMPLIFY_TOLERANCE_M = 3.0
+# Casas decimais das coordenadas (5 ~ 1,1 m; é a precisão padrão do "encoded polyline")
+PRECISION = 5
+LEAFLET_VERSION = '1.9.4'
+
+_HTML = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<meta name="viewport" content="width=device-width, initial-scale=1.0">
+<link rel="stylesheet" href="https://unpkg.com/leaflet@{leaflet}/dist/leaflet.css">
+<script src="https://unpkg.com/leaflet@{leaflet}/dist/leaflet.js"></script>
+<style>html, body, #map {{ height: 100%; margin: 0; }}</style>
+</head>
+<body>
+<div id="map"></div>
+<script>
+var ROUTES = {routes};
+var PRECISION = {precision};
+function decode(str) {{
+  var factor = Math.pow(10, PRECISION), pts = [], i = 0, lat = 0, lon = 0;
+  while (i < str.length) {{
+    for (var k = 0; k < 2; k++) {{
+      var shift = 0, result = 0, b;
+      do {{ b = str.charCodeAt(i++) - 63; result |= (b & 31) << shift; shift += 5; }} while (b >= 32);
+      var d = (result & 1) ? ~(result >> 1) : (result >> 1);
+      if (k === 0) {{ lat += d; }} else {{ lon += d; }}
+    }}
+    pts.push([lat / factor, lon / factor]);
+  }}
+  return pts;
+}}
+var map = L.map('map', {{preferCanvas: true}});
+L.tileLayer('https://{{s}}.tile.openstreetmap.org/{{z}}/{{x}}/{{y}}.png', {{
+  maxZoom: 19, attribution: '&copy; OpenStreetMap contributors'
+}}).addTo(map);
+var bounds = L.latLngBounds([]);
+ROUTES.forEach(function (r) {{
+  var pts = decode(r.p);
+  var line = L.polyline(pts, {{color: 'blue', weight: 5, opacity: 0.8}}).addTo(map);
+  var info = '<b>' + r.id + '</b>';
+  if (r.length_m !== undefined) {{ info += '<br>Dist: ' + Math.round(r.length_m) + ' m'; }}
+  if (r.travel_time_s !== undefined) {{ info += ' &bull; Tempo: ' + (r.travel_time_s / 60).toFixed(1) + ' min'; }}
+  line.bindPopup(info);
+  bounds.extend(line.getBounds());
+}});
+if (bounds.isValid()) {{ map.fitBounds(bounds); }} else {{ map.setView([0, 0], 2); }}
+</script>
+</body>
+</html>
+"""
+
+
+def encode_polyline(latlon, precision=PRECISION):
+  """Codifica pontos (lat, lon) no formato "encoded polyline" do Google, vetorizado com NumPy."""
+  q = np.round(np.asarray(latlon, dtype=np.float64).reshape(-1, 2) * 10 ** precision).astype(np.int64)
+  if len(q) == 0:
+    return ''
+  delta = np.diff(q, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+  value = np.where(delta < 0, ~(delta << 1), delta << 1)
+  # blocos de 5 bits (até 7 por valor), do menos significativo; todos menos o último têm o bit 0x20
+  i = np.arange(7)
+  n_chunks = 1 + ((value[:, None] >> (5 * i[1:])) > 0).sum(axis=1)
+  chunks = (value[:, None] >> (5 * i)) & 31
+  chunks |= np.where(i < n_chunks[:, None] - 1, 0x20, 0)
+  return (chunks[i < n_chunks[:, None]] + 63).astype(np.uint8).tobytes().decode('ascii')
+
+
+def decode_polyline(text, precision=PRECISION):
+  """Inverso de encode_polyline: lista de (lat, lon)."""
+  values = []
+  result = shift = 0
+  for ch in text:
+    b = ord(ch) - 63
+    result |= (b & 31) << shift
+    shift += 5
+    if b < 32:
+      values.append(~(result >> 1) if result & 1 else result >> 1)
+      result = shift = 0
+  coords = np.cumsum(np.asarray(values, dtype=np.int64).reshape(-1, 2), axis=0) / 10 ** precision
+  return [tuple(p) for p in coords.tolist()]
+
+
+class RouteCollection:
+  """Várias rotas para a web num arquivo só (HTML com Leaflet ou GeoJSON).
+
+  As rotas são simplificadas juntas (Douglas–Peucker vetorizado, tolerância em metros) e as
+  coordenadas quantizadas em `precision` casas decimais: no HTML cada rota vira uma string
+  "encoded polyline" e os assets (Leaflet, decodificador) aparecem uma vez só.
+  """
+
+  def __init__(self, tolerance_m=SIMPLIFY_TOLERANCE_M, precision=PRECISION):
+    self.tolerance_m = tolerance_m
+    self.precision = precision
+    self.ids = []
+    self.props = []
+    self._lines = []  # arrays (N, 2) de (lat, lon)
+
+  def __len__(self):
+    return len(self.ids)
+
+  def add(self, route_id, latlon, **props):
+    line = np.asarray(latlon, dtype=np.float64).reshape(-1, 2)
+    if len(line) == 1:
+      line = np.repeat(line, 2, axis=0)
+    self.ids.append(route_id)
+    self.props.append(props)
+    self._lines.append(line)
+
+  def add_path(self, G, path, route_id, **props):
+    """Rota de G (não projetado) pela geometria das arestas."""
+    xy = np.asarray(route_polyline(G, path), dtype=np.float64)
+    self.add(route_id, xy[:, ::-1], **props)
+
+  def simplified(self):
+    """Linhas (lat, lon) simplificadas com desvio de até tolerance_m metros."""
+    if not self._lines or self.tolerance_m <= 0:
+      return list(self._lines)
+    counts = [len(line) for line in self._lines]
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    latlon = np.concatenate(self._lines)
+    lat0 = float(latlon[:, 0].mean())
+    coords, offsets = simplify_polylines(local_xy(latlon[:, 0], latlon[:, 1], lat0), offsets, self.tolerance_m)
+    lat = np.degrees(coords[:, 1] / EARTH_RADIUS_M)
+    lon = np.degrees(coords[:, 0] / (EARTH_RADIUS_M * math.cos(math.radians(lat0))))
+    out = np.column_stack((lat, lon))
+    return [out[a:b] for a, b in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+
+  def to_geojson(self):
+    features = []
+    for route_id, props, line in zip(self.ids, self.props, self.simplified()):
+      # GeoJSON é (lon, lat)
+      coords = np.round(line[:, ::-1], self.precision).tolist()
+      features.append({
+        'type': 'Feature', 'properties': dict(props, id=route_id),
+        'geometry': {'type': 'LineString', 'coordinates': coords},
+      })
+    return {'type': 'FeatureCollection', 'features': features}
+
+  def write_geojson(self, filename):
+    with open(filename, 'w', encoding='utf-8') as f:
+      json.dump(self.to_geojson(), f, separators=(',', ':'))
+    return filename
+
+  def write_html(self, filename, title="Rotas"):
+    routes = [dict(props, id=route_id, p=encode_polyline(line, self.precision))
+              for route_id, props, line in zip(self.ids, self.props, self.simplified())]
+    # "</" dentro do <script> fecharia a tag antes da hora
+    payload = json.dumps(routes, separators=(',', ':')).replace('</', '<\\/')
+    with open(filename, 'w', encoding='utf-8') as f:
+      f.write(_HTML.format(title=title, leaflet=LEAFLET_VERSION, routes=payload, precision=self.precision))
+    return filename
+
+  def save(self, filename, title="Rotas"):
+    """Grava em HTML (.html/.htm) ou GeoJSON (qualquer outra extensão)."""
+    if filename.endswith(('.html', '.htm')):
+      return self.write_html(filename, title)
+    return self.write_geojson(filename)